@@ -5,18 +5,25 @@ import os
 
 # Core Flask imports
 from flask import Flask
+from flask.helpers import get_debug_flag
 from flask_login import LoginManager
 
 # Third-party imports
+import click
+from werkzeug.serving import is_running_from_reloader
 
 # App imports
+from app.audit_sink import AuditSink
 from app.database import DatabaseManager
 from config import config_manager
+import propscreen.scanners as scanners
+import propscreen.sicheck as sicheck
 
 
 # Load extensions
 login_manager = LoginManager()
 db_manager = DatabaseManager()
+audit_sink = AuditSink()
 
 
 def load_logs(app):
@@ -43,6 +50,78 @@ def load_logs(app):
     return
 
 
+def load_scanners(app):
+    scanners.configure_sensitive_scanner(
+        redact=app.config["SENSITIVE_SCANNER_REDACT"],
+        threshold=app.config["SENSITIVE_SCANNER_THRESHOLD"],
+        entity_types=app.config["SENSITIVE_SCANNER_ENTITY_TYPES"],
+        use_onnx=app.config["SENSITIVE_SCANNER_USE_ONNX"],
+    )
+    scanners.configure_batching(
+        app.config["NER_BATCH_SIZE"], app.config["NER_BATCH_MAX_WAIT_MS"]
+    )
+    scanners.configure_segment_cache(
+        app.config["NER_SEGMENT_CACHE_SIZE"],
+        app.config["NER_SEGMENT_CACHE_TTL"],
+        app.config["NER_SEGMENT_CACHE_MAX_BYTES"],
+    )
+    return
+
+
+def serves_requests():
+    """
+    Description
+    -----------
+    Tells whether this process serves requests. The `flask` CLI commands load
+    the app too, only `flask run` serves it, and with the reloader only in the
+    child process the reloader starts.
+
+    Returns
+    -------
+    serving : bool
+        False for the `flask` CLI commands other than `flask run`
+    """
+    context = click.get_current_context(silent=True)
+    if context is None:
+        # Imported by a WSGI server, or loaded in the background by `flask run`
+        return True
+    if context.info_name != "run":
+        return False
+    reload = context.params.get("reload")
+    if reload is None:
+        reload = get_debug_flag()
+    return not reload or is_running_from_reloader()
+
+
+def start_serving(app):
+    # Load the models and run a first scan before the worker accepts traffic
+    if app.config["WARM_UP_SCANNERS"]:
+        scanners.warm_up()
+    audit_sink.start()
+    return
+
+
+def load_llm_backend(app):
+    backend_options = {
+        "http": {
+            "url": app.config["LLM_HTTP_URL"],
+            "model": app.config["LLM_HTTP_MODEL"],
+            "api_key": app.config["LLM_HTTP_API_KEY"],
+            "timeout": app.config["LLM_HTTP_TIMEOUT"],
+        },
+        "stub": {
+            "corpus_path": app.config["LLM_STUB_CORPUS"],
+            "latency_ms": app.config["LLM_STUB_LATENCY_MS"],
+            "chunk_latency_ms": app.config["LLM_STUB_CHUNK_LATENCY_MS"],
+        },
+    }
+    backend_name = app.config["LLM_BACKEND"]
+    sicheck.configure_llm_backend(
+        backend_name, **backend_options.get(backend_name, {})
+    )
+    return
+
+
 def create_app(config_name):
     app = Flask(__name__)
     app.config.from_object(config_manager[config_name])
@@ -53,10 +132,18 @@ def create_app(config_name):
     login_manager.init_app(app)
 
     db_manager.init_app(app)
+    audit_sink.init_app(app, db_manager)
+
+    load_scanners(app)
+    load_llm_backend(app)
 
     from . import routes
     app.register_blueprint(routes.bp)
 
+    from .commands import audit_log_cli, hash_index_cli
+    app.cli.add_command(hash_index_cli)
+    app.cli.add_command(audit_log_cli)
+
     if not app.debug and not app.testing:
         load_logs(app)
 
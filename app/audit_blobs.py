@@ -0,0 +1,119 @@
+# Standard Library imports
+import hashlib
+
+# Core Flask imports
+
+# Third-party imports
+from sqlalchemy import select, text
+from sqlalchemy.dialects.postgresql import insert
+
+# App imports
+
+
+# The prompts and responses of the audit log are stored once in audit_blob,
+# keyed by the SHA-256 digest of their UTF-8 text, and audit_log rows reference
+# them by digest. Postgres compresses the large contents itself (TOAST)
+
+# Number of unreferenced blobs deleted in one transaction
+DELETE_BATCH_SIZE = 10000
+
+
+def content_digest(content):
+    """
+    Returns the digest an audit_blob is keyed by, the same as
+    sha256(convert_to(content, 'UTF8')) in SQL.
+    """
+    return hashlib.sha256(content.encode("utf-8")).digest()
+
+
+def insert_blobs(connection, table, contents):
+    """
+    Description
+    -----------
+    Stores the contents that are not stored yet. The digests that are already
+    in the table are looked up first, so a repeated prompt or response is
+    neither written nor sent to the database again. The blobs found are locked
+    FOR KEY SHARE until the end of the transaction, so
+    delete_unreferenced_blobs cannot delete them before the audit_log rows
+    that reference them are inserted.
+
+    Parameters
+    ----------
+    connection : sqlalchemy.engine.Connection or sqlalchemy.orm.Session
+        The connection or session of the transaction
+    table : sqlalchemy.Table
+        The audit_blob table
+    contents : dict
+        The contents by digest, see content_digest
+    """
+    if not contents:
+        return
+    # Locked in digest order, so concurrent writers cannot deadlock
+    stored = set(
+        connection.execute(
+            select(table.c.digest)
+            .where(table.c.digest.in_(list(contents)))
+            .order_by(table.c.digest)
+            .with_for_update(read=True, key_share=True)
+        ).scalars()
+    )
+    # Inserted in digest order, so concurrent writers cannot deadlock
+    missing = [
+        {
+            "digest": digest,
+            "content": contents[digest],
+            "size": len(contents[digest].encode("utf-8")),
+        }
+        for digest in sorted(contents)
+        if digest not in stored
+    ]
+    if missing:
+        connection.execute(
+            insert(table)
+            .values(missing)
+            .on_conflict_do_nothing(index_elements=["digest"])
+        )
+
+
+def delete_unreferenced_blobs(engine, created_before):
+    """
+    Description
+    -----------
+    Deletes the blobs created before created_before that no audit_log row
+    references any more, once their partitions were dropped.
+    DELETE_BATCH_SIZE blobs are deleted per transaction. The blobs locked by a
+    writer that is about to reference them again, see insert_blobs, are
+    skipped, and newer blobs are never deleted, so a blob cannot disappear
+    between its insert and the insert of the row that references it.
+
+    Parameters
+    ----------
+    engine : sqlalchemy.engine.Engine
+        The engine of the database
+    created_before : datetime.datetime
+        Only the blobs created before this time are deleted
+
+    Returns
+    -------
+    deleted : int
+        The number of blobs deleted
+    """
+    deleted = 0
+    while True:
+        with engine.begin() as connection:
+            result = connection.execute(
+                text(
+                    "DELETE FROM audit_blob WHERE digest IN ("
+                    "SELECT digest FROM audit_blob blob "
+                    "WHERE blob.created_at < :created_before "
+                    "AND NOT EXISTS (SELECT 1 FROM audit_log "
+                    "WHERE audit_log.prompt_digest = blob.digest) "
+                    "AND NOT EXISTS (SELECT 1 FROM audit_log "
+                    "WHERE audit_log.llm_response_digest = blob.digest) "
+                    "LIMIT :batch_size FOR UPDATE SKIP LOCKED)"
+                ),
+                {"created_before": created_before, "batch_size": DELETE_BATCH_SIZE},
+            )
+        deleted += result.rowcount
+        if result.rowcount < DELETE_BATCH_SIZE:
+            return deleted
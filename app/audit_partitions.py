@@ -0,0 +1,336 @@
+# Standard Library imports
+import datetime
+import gzip
+import json
+import os
+import re
+import tempfile
+
+# Core Flask imports
+
+# Third-party imports
+from sqlalchemy import text
+
+# App imports
+import propscreen.awsinterface as awsinterface
+
+
+# audit_log is range partitioned on created_at by calendar month, the partition
+# of a month is named after it, e.g. audit_log_p202610. Rows outside of every
+# monthly partition land in audit_log_default
+PARTITION_NAME = re.compile(r"^audit_log_p(\d{4})(\d{2})$")
+DEFAULT_PARTITION = "audit_log_default"
+
+# The rows written before audit_log was partitioned stay in the table they were
+# written to, attached as the partition of every month before its upper bound
+LEGACY_PARTITION = "audit_log_legacy"
+PARTITION_UPPER_BOUND = re.compile(r"TO \('(\d{4})-(\d{2})-01")
+
+# The columns of audit_log, the prompts and responses are in audit_blob
+AUDIT_LOG_COLUMNS = (
+    "audit_log_id, created_at, decision, prompt_digest, llm_response_digest"
+)
+
+# Number of rows fetched at a time while a partition is archived
+ARCHIVE_FETCH_SIZE = 10000
+
+
+def month_start(value):
+    """Returns the first day of the month of a date or datetime."""
+    return datetime.date(value.year, value.month, 1)
+
+
+def add_months(month, months):
+    """Returns the first day of the month months after month."""
+    index = month.year * 12 + month.month - 1 + months
+    return datetime.date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month):
+    """Returns the name of the partition of a month."""
+    return f"audit_log_p{month.year:04d}{month.month:02d}"
+
+
+def partition_month(name):
+    """Returns the month of a partition, None if it is not a monthly partition."""
+    match = PARTITION_NAME.match(name)
+    if match is None:
+        return None
+    return datetime.date(int(match.group(1)), int(match.group(2)), 1)
+
+
+def create_partition_sql(month):
+    """Returns the statement that creates the partition of a month."""
+    return (
+        f"CREATE TABLE IF NOT EXISTS {partition_name(month)} PARTITION OF audit_log "
+        f"FOR VALUES FROM ('{month.isoformat()}') "
+        f"TO ('{add_months(month, 1).isoformat()}')"
+    )
+
+
+def list_partitions(connection):
+    """
+    Description
+    -----------
+    Returns the monthly partitions attached to audit_log, and the legacy
+    partition if it is still attached. The month of the legacy partition is the
+    last one it holds.
+
+    Parameters
+    ----------
+    connection : sqlalchemy.engine.Connection
+        The connection to the database
+
+    Returns
+    -------
+    partitions : list
+        The (month, name) of the partitions, oldest first
+    """
+    rows = connection.execute(
+        text(
+            "SELECT child.relname, pg_get_expr(child.relpartbound, child.oid) "
+            "FROM pg_inherits "
+            "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+            "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+            "WHERE parent.relname = 'audit_log'"
+        )
+    )
+    partitions = []
+    for name, bound in rows:
+        if name == LEGACY_PARTITION:
+            match = PARTITION_UPPER_BOUND.search(bound)
+            upper = datetime.date(int(match.group(1)), int(match.group(2)), 1)
+            partitions.append((add_months(upper, -1), name))
+            continue
+        month = partition_month(name)
+        if month is not None:
+            partitions.append((month, name))
+    return sorted(partitions)
+
+
+def create_future_partitions(engine, months_ahead, today=None):
+    """
+    Description
+    -----------
+    Creates the partitions of the current month and of the months_ahead
+    following months that do not exist yet, and are not held by the legacy
+    partition.
+
+    Parameters
+    ----------
+    engine : sqlalchemy.engine.Engine
+        The engine of the database
+    months_ahead : int
+        The number of months after the current one to create partitions for
+    today : datetime.date
+        The current date, today by default
+
+    Returns
+    -------
+    created : list
+        The names of the partitions that were created
+    """
+    current_month = month_start(today or datetime.date.today())
+    with engine.begin() as connection:
+        partitions = list_partitions(connection)
+        existing = {month for month, _ in partitions}
+        legacy_months = [
+            month for month, name in partitions if name == LEGACY_PARTITION
+        ]
+        created = []
+        for months in range(months_ahead + 1):
+            month = add_months(current_month, months)
+            if month in existing or (legacy_months and month <= legacy_months[0]):
+                continue
+            create_partition(connection, month)
+            created.append(partition_name(month))
+    return created
+
+
+def create_partition(connection, month):
+    """
+    Description
+    -----------
+    Creates the partition of a month. Rows of the month that already landed in
+    the default partition, because the partition was not created in time, are
+    moved to the new partition.
+
+    Parameters
+    ----------
+    connection : sqlalchemy.engine.Connection
+        The connection to the database, in a transaction
+    month : datetime.date
+        The first day of the month
+    """
+    bounds = {"start": month, "end": add_months(month, 1)}
+    in_month = "created_at >= :start AND created_at < :end"
+    stray_rows = connection.execute(
+        text(f"SELECT 1 FROM {DEFAULT_PARTITION} WHERE {in_month} LIMIT 1"), bounds
+    ).first()
+    if stray_rows is None:
+        connection.execute(text(create_partition_sql(month)))
+        return
+
+    name = partition_name(month)
+    connection.execute(
+        text(f"ALTER TABLE audit_log DETACH PARTITION {DEFAULT_PARTITION}")
+    )
+    connection.execute(text(create_partition_sql(month)))
+    connection.execute(
+        text(
+            f"INSERT INTO {name} ({AUDIT_LOG_COLUMNS}) SELECT {AUDIT_LOG_COLUMNS} "
+            f"FROM {DEFAULT_PARTITION} WHERE {in_month}"
+        ),
+        bounds,
+    )
+    connection.execute(
+        text(f"DELETE FROM {DEFAULT_PARTITION} WHERE {in_month}"), bounds
+    )
+    connection.execute(
+        text(f"ALTER TABLE audit_log ATTACH PARTITION {DEFAULT_PARTITION} DEFAULT")
+    )
+
+
+def retention_cutoff(retention_months, today=None):
+    """Returns the first day of the oldest month that is kept in the database."""
+    return add_months(month_start(today or datetime.date.today()), -retention_months)
+
+
+def expired_partitions(engine, retention_months, today=None):
+    """
+    Description
+    -----------
+    Returns the monthly partitions that only hold rows older than the
+    retention period, the partition of a month expires once the whole month is
+    more than retention_months months old.
+
+    Parameters
+    ----------
+    engine : sqlalchemy.engine.Engine
+        The engine of the database
+    retention_months : int
+        The number of months the rows are kept in the database
+    today : datetime.date
+        The current date, today by default
+
+    Returns
+    -------
+    partitions : list
+        The (month, name) of the expired partitions, oldest first
+    """
+    cutoff = retention_cutoff(retention_months, today)
+    with engine.connect() as connection:
+        partitions = list_partitions(connection)
+    return [(month, name) for month, name in partitions if month < cutoff]
+
+
+def export_partition(connection, name, path):
+    """
+    Description
+    -----------
+    Writes every row of a partition, with the text of its prompt and response,
+    to a gzip compressed JSON lines file. The rows are streamed with a server
+    side cursor, so the partition is never held in memory.
+
+    Parameters
+    ----------
+    connection : sqlalchemy.engine.Connection
+        The connection to the database
+    name : str
+        The name of the partition
+    path : str
+        The path of the archive file
+
+    Returns
+    -------
+    rows : int
+        The number of rows written
+    """
+    rows = 0
+    result = connection.execution_options(
+        stream_results=True, max_row_buffer=ARCHIVE_FETCH_SIZE
+    ).execute(
+        text(
+            f"SELECT log.audit_log_id, log.created_at, "
+            f"prompt_blob.content AS prompt, "
+            f"llm_response_blob.content AS llm_response, log.decision "
+            f"FROM {name} log "
+            f"JOIN audit_blob prompt_blob ON prompt_blob.digest = log.prompt_digest "
+            f"JOIN audit_blob llm_response_blob "
+            f"ON llm_response_blob.digest = log.llm_response_digest "
+            f"ORDER BY log.created_at"
+        )
+    )
+    with gzip.open(path, "wt", encoding="utf-8") as f:
+        for row in result.mappings():
+            f.write(
+                json.dumps(
+                    {
+                        "audit_log_id": str(row["audit_log_id"]),
+                        "created_at": row["created_at"].isoformat(),
+                        "prompt": row["prompt"],
+                        "llm_response": row["llm_response"],
+                        "decision": row["decision"],
+                    }
+                )
+                + "\n"
+            )
+            rows += 1
+    return rows
+
+
+def archive_partition(engine, name, bucket_name=None, prefix="", archive_dir=None):
+    """
+    Description
+    -----------
+    Archives a partition and then detaches and drops it. The rows are exported
+    to a gzip compressed JSON lines file that is uploaded to the S3 bucket
+    and/or kept in archive_dir. Everything runs in one transaction that holds a
+    lock blocking the writes to the partition, so a row inserted late cannot be
+    dropped without being archived, and the partition is kept when the export
+    or the upload fails.
+
+    Parameters
+    ----------
+    engine : sqlalchemy.engine.Engine
+        The engine of the database
+    name : str
+        The name of the partition
+    bucket_name : str
+        The S3 bucket the archive is uploaded to
+    prefix : str
+        The prefix of the key of the archive in the bucket
+    archive_dir : str
+        The local directory the archive is kept in
+
+    Returns
+    -------
+    archive : dict
+        The number of rows and the locations of the archive
+    """
+    if not bucket_name and not archive_dir:
+        raise ValueError("An S3 bucket or an archive directory is required")
+
+    file_name = f"{name}.jsonl.gz"
+    with tempfile.TemporaryDirectory() as temp_dir:
+        if archive_dir:
+            os.makedirs(archive_dir, exist_ok=True)
+            path = os.path.join(archive_dir, file_name)
+        else:
+            path = os.path.join(temp_dir, file_name)
+
+        with engine.begin() as connection:
+            connection.execute(text(f"LOCK TABLE {name} IN SHARE MODE"))
+            rows = export_partition(connection, name, path)
+
+            archive = {"partition": name, "rows": rows}
+            if archive_dir:
+                archive["path"] = path
+            if bucket_name:
+                object_key = f"{prefix}{file_name}"
+                awsinterface.upload_file_to_s3_bucket(bucket_name, object_key, path)
+                archive["s3"] = f"s3://{bucket_name}/{object_key}"
+
+            connection.execute(text(f"ALTER TABLE audit_log DETACH PARTITION {name}"))
+            connection.execute(text(f"DROP TABLE {name}"))
+    return archive
@@ -0,0 +1,141 @@
+# Standard Library imports
+import datetime
+
+# Core Flask imports
+
+# Third-party imports
+from sqlalchemy import text
+from sqlalchemy.dialects.postgresql import insert
+
+# App imports
+
+
+# The audit log is counted per hour and decision in audit_decision_rollup, so
+# the dashboard reads a few rows per hour instead of scanning audit_log
+BUCKET_SIZE = datetime.timedelta(hours=1)
+
+# Number of hours of audit_log that are aggregated in one transaction by the
+# backfill
+BACKFILL_CHUNK_HOURS = 24
+
+
+def bucket_start(created_at):
+    """Returns the start of the hour bucket of a creation time."""
+    return created_at.replace(minute=0, second=0, microsecond=0)
+
+
+def aggregate_rows(rows):
+    """
+    Description
+    -----------
+    Aggregates audit log records per hour bucket and decision.
+
+    Parameters
+    ----------
+    rows : iterable
+        The records, mappings with created_at, decision and size (the bytes of
+        the prompt and the response)
+
+    Returns
+    -------
+    rollups : list
+        The dicts of the AuditDecisionRollup columns, one per bucket and
+        decision, ordered by bucket and decision
+    """
+    rollups = {}
+    for row in rows:
+        key = (bucket_start(row["created_at"]), row["decision"])
+        rollup = rollups.setdefault(
+            key,
+            {"bucket_start": key[0], "decision": key[1], "count": 0, "total_bytes": 0},
+        )
+        rollup["count"] += 1
+        rollup["total_bytes"] += row["size"]
+    # Concurrent writers update the buckets in the same order, so their row
+    # locks cannot deadlock
+    return [rollups[key] for key in sorted(rollups)]
+
+
+def increment_rollups(connection, table, rollups):
+    """
+    Description
+    -----------
+    Adds counts to the rollups, creating the buckets that do not exist yet. Run
+    it in the transaction that inserts the counted records, so the rollups
+    never drift from audit_log.
+
+    Parameters
+    ----------
+    connection : sqlalchemy.engine.Connection or sqlalchemy.orm.Session
+        The connection or session of the transaction
+    table : sqlalchemy.Table
+        The audit_decision_rollup table
+    rollups : list
+        The counts to add, see aggregate_rows
+    """
+    if not rollups:
+        return
+    statement = insert(table).values(rollups)
+    connection.execute(
+        statement.on_conflict_do_update(
+            index_elements=["bucket_start", "decision"],
+            set_={
+                "count": table.c.count + statement.excluded.count,
+                "total_bytes": table.c.total_bytes + statement.excluded.total_bytes,
+            },
+        )
+    )
+
+
+def backfill_rollups(engine, start, end):
+    """
+    Description
+    -----------
+    Recomputes the rollups of the hours from start to end from audit_log, one
+    BACKFILL_CHUNK_HOURS chunk per transaction. The rollups of those hours are
+    replaced, so end must not be later than the moment the audit write path
+    started maintaining the rollups.
+
+    Parameters
+    ----------
+    engine : sqlalchemy.engine.Engine
+        The engine of the database
+    start : datetime.datetime
+        The start of the first hour, rounded down to the hour
+    end : datetime.datetime
+        The end of the last hour, rounded down to the hour
+
+    Returns
+    -------
+    buckets : int
+        The number of rollup rows written
+    """
+    chunk_start = bucket_start(start)
+    end = bucket_start(end)
+    buckets = 0
+    while chunk_start < end:
+        chunk_end = min(chunk_start + BACKFILL_CHUNK_HOURS * BUCKET_SIZE, end)
+        with engine.begin() as connection:
+            result = connection.execute(
+                text(
+                    "INSERT INTO audit_decision_rollup "
+                    "(bucket_start, decision, count, total_bytes) "
+                    "SELECT date_trunc('hour', audit_log.created_at), "
+                    "audit_log.decision, count(*), "
+                    "sum(prompt_blob.size + llm_response_blob.size) "
+                    "FROM audit_log "
+                    "JOIN audit_blob prompt_blob "
+                    "ON prompt_blob.digest = audit_log.prompt_digest "
+                    "JOIN audit_blob llm_response_blob "
+                    "ON llm_response_blob.digest = audit_log.llm_response_digest "
+                    "WHERE audit_log.created_at >= :start "
+                    "AND audit_log.created_at < :end "
+                    "GROUP BY 1, 2 "
+                    "ON CONFLICT (bucket_start, decision) DO UPDATE SET "
+                    "count = EXCLUDED.count, total_bytes = EXCLUDED.total_bytes"
+                ),
+                {"start": chunk_start, "end": chunk_end},
+            )
+            buckets += result.rowcount
+        chunk_start = chunk_end
+    return buckets
@@ -0,0 +1,511 @@
+# Standard Library imports
+import atexit
+import datetime
+import glob
+import json
+import os
+import queue
+import threading
+import time
+
+# Core Flask imports
+
+# Third-party imports
+from sqlalchemy import Text, column, table as sql_table
+from sqlalchemy.dialects.postgresql import insert
+
+# App imports
+import app.audit_blobs as audit_blobs
+import app.audit_rollups as audit_rollups
+
+
+# The fields of a spooled audit log record, see AuditSink._make_row
+SPOOL_FIELDS = frozenset(
+    ("audit_log_id", "created_at", "prompt", "llm_response", "decision")
+)
+
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class AuditSink:
+    """
+    Description
+    -----------
+    Writes the audit log records. With AUDIT_ASYNC the records are queued and
+    a background worker writes them in bulk inserts, a batch is flushed once
+    AUDIT_BATCH_SIZE records are queued or AUDIT_FLUSH_INTERVAL_MS after its
+    first record, so the requests do not wait for the database. The records of
+    a batch that cannot be written, and the records still queued when the
+    process exits, are appended to the spool file AUDIT_SPOOL_PATH and
+    written again later. When the queue stays full for AUDIT_ENQUEUE_TIMEOUT_MS
+    the record is spooled, and when the worker is not running the record is
+    written on the request's thread, so a request never waits on the worker.
+    Without AUDIT_ASYNC every record is committed with the request's session,
+    as before.
+    """
+
+    def __init__(self, app=None):
+        self.app = app
+        self.db_manager = None
+        self.model = None
+        self.blob_model = None
+        self.rollup_model = None
+        self.asynchronous = False
+        self.batch_size = 500
+        self.flush_interval = 0.2
+        self.enqueue_timeout = 0.1
+        self.spool_path = None
+        self.spool_retry_interval = 30.0
+        self.write_text_columns = False
+
+        self._queue = None
+        self._worker = None
+        self._stopping = threading.Event()
+        self._spool_lock = threading.Lock()
+        self._last_spool_retry = 0.0
+
+        # Metrics, see stats()
+        self._stats_lock = threading.Lock()
+        self._enqueued = 0
+        self._written = 0
+        self._flushes = 0
+        self._failed_flushes = 0
+        self._spooled = 0
+        self._overflowed = 0
+        self._quarantined = 0
+        self._lost = 0
+        self._flush_time_total = 0.0
+        self._flush_time_max = 0.0
+
+    def init_app(self, app, db_manager):
+        from app.models import AuditBlob, AuditDecisionRollup, AuditLog
+
+        self.db_manager = db_manager
+        self.model = AuditLog
+        self.blob_model = AuditBlob
+        self.rollup_model = AuditDecisionRollup
+        self.asynchronous = app.config["AUDIT_ASYNC"]
+        self.batch_size = max(1, app.config["AUDIT_BATCH_SIZE"])
+        self.flush_interval = app.config["AUDIT_FLUSH_INTERVAL_MS"] / 1000
+        self.enqueue_timeout = app.config["AUDIT_ENQUEUE_TIMEOUT_MS"] / 1000
+        self.spool_path = app.config["AUDIT_SPOOL_PATH"]
+        self.spool_retry_interval = app.config["AUDIT_SPOOL_RETRY_S"]
+        self.queue_size = app.config["AUDIT_QUEUE_SIZE"]
+        self.write_text_columns = app.config["AUDIT_WRITE_TEXT_COLUMNS"]
+
+    def start(self):
+        """
+        Description
+        -----------
+        Starts the background worker of the asynchronous sink. It is started
+        by the processes that serve requests, see app.start_serving, so that
+        the CLI commands do not run it.
+        """
+        if self.asynchronous and self._worker is None:
+            self._queue = queue.Queue(maxsize=self.queue_size)
+            self._worker = threading.Thread(
+                target=self._run, name="audit-sink", daemon=True
+            )
+            self._worker.start()
+            atexit.register(self.close)
+
+    def record(self, prompt, llm_response, decision, audit_log_id):
+        """
+        Description
+        -----------
+        Records the scan of a response in the audit log.
+
+        Parameters
+        ----------
+        prompt : str
+            The prompt that was sent to the LLM
+        llm_response : str
+            The response that was scanned
+        decision : str
+            The decision of the scan
+        audit_log_id : str
+            The id of the audit log record
+        """
+        row = self._make_row(prompt, llm_response, decision, audit_log_id)
+        if not self.asynchronous:
+            self.insert_rows(self.db_manager.session, [row])
+            self.db_manager.session.commit()
+            return
+
+        if self._worker is None or not self._worker.is_alive():
+            print("Error: audit sink worker is not running, writing the record \
+synchronously", flush=True)
+            self._flush([row])
+            return
+
+        # The queue is bounded, a request only waits here when the database has
+        # fallen behind by more than AUDIT_QUEUE_SIZE records
+        try:
+            self._queue.put(row, timeout=self.enqueue_timeout)
+        except queue.Full:
+            with self._stats_lock:
+                self._overflowed += 1
+            self._spool([row])
+            return
+        with self._stats_lock:
+            self._enqueued += 1
+
+    def record_many(self, records: list):
+        """
+        Description
+        -----------
+        Records the scans of a batch of responses in the audit log, in one
+        transaction written on the calling thread, so the records are stored
+        once this returns. Records that cannot be written are spooled like the
+        batches of the worker.
+
+        Parameters
+        ----------
+        records : list
+            The dicts of the arguments of record(): prompt, llm_response,
+            decision and audit_log_id
+        """
+        rows = [self._make_row(**record) for record in records]
+        if not rows:
+            return
+        if not self.asynchronous:
+            self.insert_rows(self.db_manager.session, rows)
+            self.db_manager.session.commit()
+            return
+
+        with self._stats_lock:
+            self._enqueued += len(rows)
+        self._flush(rows)
+
+    @staticmethod
+    def _make_row(prompt, llm_response, decision, audit_log_id) -> dict:
+        return {
+            "audit_log_id": audit_log_id,
+            "created_at": datetime.datetime.now(),
+            "prompt": str(prompt),
+            "llm_response": str(llm_response),
+            "decision": str(decision),
+        }
+
+    def _collect_batch(self) -> list:
+        try:
+            batch = [self._queue.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0:
+                    batch.append(self._queue.get(timeout=remaining))
+                else:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while not self._stopping.is_set():
+            # An error must not stop the worker, the requests would then block
+            # on the full queue
+            try:
+                batch = self._collect_batch()
+                if batch:
+                    self._flush(batch)
+                self._retry_spool()
+            except Exception as e:
+                print(f"Error: audit sink worker: {str(e)}", flush=True)
+                self._stopping.wait(self.flush_interval)
+
+    def _flush(self, batch: list) -> bool:
+        started_at = time.monotonic()
+        try:
+            self.write_rows(batch)
+        except Exception as e:
+            print(f"Error: audit log flush of {len(batch)} records failed: \
+{str(e)}", flush=True)
+            with self._stats_lock:
+                self._failed_flushes += 1
+            self._spool(batch)
+            return False
+        flush_time = time.monotonic() - started_at
+        with self._stats_lock:
+            self._flushes += 1
+            self._written += len(batch)
+            self._flush_time_total += flush_time
+            self._flush_time_max = max(self._flush_time_max, flush_time)
+        return True
+
+    def write_rows(self, rows: list):
+        """
+        Description
+        -----------
+        Inserts audit log rows with multi-row INSERTs of up to AUDIT_BATCH_SIZE
+        rows in one transaction. Rows whose id and creation time are already in
+        the table are skipped, so writing a spooled batch again is harmless.
+
+        Parameters
+        ----------
+        rows : list
+            The dicts of the audit log records, see record()
+        """
+        with self.db_manager.engine.begin() as connection:
+            self.insert_rows(connection, rows)
+
+    def insert_rows(self, connection, rows: list):
+        """
+        Description
+        -----------
+        Inserts audit log rows and adds the rows that were actually inserted to
+        the decision rollups, in the caller's transaction. The prompts and
+        responses are stored in audit_blob, once per distinct text, and the
+        rows reference them by digest. With AUDIT_WRITE_TEXT_COLUMNS the text
+        is also written to audit_log, for the previous release.
+
+        Parameters
+        ----------
+        connection : sqlalchemy.engine.Connection or sqlalchemy.orm.Session
+            The connection or session of the transaction
+        rows : list
+            The dicts of the audit log records, see record()
+        """
+        # Bounds the number of parameters of a statement
+        for start in range(0, len(rows), self.batch_size):
+            self._insert_chunk(connection, rows[start : start + self.batch_size])
+
+    def _insert_chunk(self, connection, rows: list):
+        contents = {}
+        log_rows = []
+        sizes = {}
+        for row in rows:
+            prompt_digest = audit_blobs.content_digest(row["prompt"])
+            llm_response_digest = audit_blobs.content_digest(row["llm_response"])
+            contents[prompt_digest] = row["prompt"]
+            contents[llm_response_digest] = row["llm_response"]
+            log_row = {
+                "audit_log_id": row["audit_log_id"],
+                "created_at": row["created_at"],
+                "decision": row["decision"],
+                "prompt_digest": prompt_digest,
+                "llm_response_digest": llm_response_digest,
+            }
+            if self.write_text_columns:
+                log_row["prompt"] = row["prompt"]
+                log_row["llm_response"] = row["llm_response"]
+            log_rows.append(log_row)
+            sizes[row["audit_log_id"]] = len(row["prompt"].encode("utf-8")) + len(
+                row["llm_response"].encode("utf-8")
+            )
+        audit_blobs.insert_blobs(connection, self.blob_model.__table__, contents)
+
+        table = self._log_table()
+        inserted = connection.execute(
+            insert(table)
+            .values(log_rows)
+            .on_conflict_do_nothing(index_elements=["audit_log_id", "created_at"])
+            .returning(table.c.audit_log_id, table.c.created_at, table.c.decision)
+        )
+        audit_rollups.increment_rollups(
+            connection,
+            self.rollup_model.__table__,
+            audit_rollups.aggregate_rows(
+                {
+                    "created_at": row.created_at,
+                    "decision": row.decision,
+                    "size": sizes[str(row.audit_log_id)],
+                }
+                for row in inserted
+            ),
+        )
+
+    def _log_table(self):
+        table = self.model.__table__
+        if not self.write_text_columns:
+            return table
+        # The text columns are not mapped, they are dropped by the
+        # 20261018_audit_blob_contract revision
+        return sql_table(
+            table.name,
+            *(column(table_column.name, table_column.type) for table_column in table.c),
+            column("prompt", Text()),
+            column("llm_response", Text()),
+        )
+
+    def _spool(self, rows: list):
+        if not self.spool_path:
+            print(f"Error: {len(rows)} audit log records were lost, no \
+AUDIT_SPOOL_PATH is set", flush=True)
+            with self._stats_lock:
+                self._lost += len(rows)
+            return
+        lines = [
+            json.dumps(dict(row, created_at=row["created_at"].isoformat())) + "\n"
+            for row in rows
+        ]
+        try:
+            self._append_lines(self.spool_path, lines)
+        except OSError as e:
+            print(f"Error: {len(rows)} audit log records were lost, the spool \
+could not be written: {str(e)}", flush=True)
+            with self._stats_lock:
+                self._lost += len(rows)
+            return
+        with self._stats_lock:
+            self._spooled += len(rows)
+
+    def _append_lines(self, path, lines: list):
+        with self._spool_lock:
+            spool_dir = os.path.dirname(path)
+            if spool_dir:
+                os.makedirs(spool_dir, exist_ok=True)
+            with open(path, "a", encoding="utf-8") as f:
+                f.writelines(lines)
+                f.flush()
+                os.fsync(f.fileno())
+
+    def _quarantine(self, lines: list):
+        # The lines are kept for inspection, they are never written again
+        path = f"{self.spool_path}.quarantine"
+        print(f"Error: {len(lines)} unreadable audit spool lines were moved to \
+{path}", flush=True)
+        try:
+            self._append_lines(
+                path, [line if line.endswith("\n") else line + "\n" for line in lines]
+            )
+        except OSError as e:
+            print(f"Error: the unreadable audit spool lines were lost: {str(e)}",
+                  flush=True)
+        with self._stats_lock:
+            self._quarantined += len(lines)
+
+    @staticmethod
+    def _parse_spool_line(line) -> dict:
+        # Raises ValueError for a line that is not a complete record, e.g. the
+        # partial last line left by a crash
+        row = json.loads(line)
+        if not isinstance(row, dict) or not SPOOL_FIELDS.issubset(row):
+            raise ValueError("not an audit log record")
+        for field in SPOOL_FIELDS:
+            if not isinstance(row[field], str):
+                raise ValueError(f"{field} is not a string")
+        row["created_at"] = datetime.datetime.fromisoformat(row["created_at"])
+        return row
+
+    def _orphaned_replays(self) -> list:
+        # The replay files of processes that died while replaying, and the one
+        # of this process if its last replay failed
+        orphans = []
+        for path in glob.glob(f"{glob.escape(self.spool_path)}.*.replay"):
+            pid = path[len(self.spool_path) + 1 : -len(".replay")]
+            if not pid.isdigit():
+                continue
+            if int(pid) == os.getpid() or not _process_alive(int(pid)):
+                orphans.append(path)
+        return sorted(orphans)
+
+    def _retry_spool(self):
+        if not self.spool_path:
+            return
+        now = time.monotonic()
+        if now - self._last_spool_retry < self.spool_retry_interval:
+            return
+        self._last_spool_retry = now
+
+        for orphan_path in self._orphaned_replays():
+            self._replay(orphan_path)
+
+        # The spool is renamed before it is read, so that the records are only
+        # taken by one worker process
+        replay_path = f"{self.spool_path}.{os.getpid()}.replay"
+        with self._spool_lock:
+            try:
+                os.replace(self.spool_path, replay_path)
+            except FileNotFoundError:
+                return
+        self._replay(replay_path)
+
+    def _replay(self, replay_path):
+        rows = []
+        unreadable = []
+        # Bytes that are not UTF-8 make their line unreadable, not the file
+        with open(replay_path, encoding="utf-8", errors="replace") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    rows.append(self._parse_spool_line(line))
+                except (ValueError, TypeError) as e:
+                    print(f"Error: unreadable audit spool line: {str(e)}", flush=True)
+                    unreadable.append(line)
+        if unreadable:
+            self._quarantine(unreadable)
+        print(f"DEBUG: Writing {len(rows)} spooled audit log records", flush=True)
+
+        # Batches that fail again are spooled again by _flush. Writing a record
+        # twice is harmless, see write_rows
+        for start in range(0, len(rows), self.batch_size):
+            self._flush(rows[start : start + self.batch_size])
+        try:
+            os.remove(replay_path)
+        except FileNotFoundError:
+            pass
+
+    def flush(self):
+        """
+        Writes every queued record now, on the calling thread.
+        """
+        if not self.asynchronous:
+            return
+        rows = []
+        while True:
+            try:
+                rows.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        for start in range(0, len(rows), self.batch_size):
+            self._flush(rows[start : start + self.batch_size])
+
+    def close(self):
+        """
+        Stops the worker and writes the records that are still queued. Records
+        that cannot be written are spooled, so no queued record is lost when
+        the process exits.
+        """
+        if not self.asynchronous or self._stopping.is_set():
+            return
+        self._stopping.set()
+        if self._worker is not None:
+            self._worker.join(timeout=self.flush_interval * 2 + 5)
+        self.flush()
+
+    def stats(self) -> dict:
+        """
+        Returns the metrics of the audit sink
+        """
+        with self._stats_lock:
+            flushes = self._flushes
+            return {
+                "asynchronous": self.asynchronous,
+                "queue_depth": self._queue.qsize() if self._queue else 0,
+                "enqueued": self._enqueued,
+                "written": self._written,
+                "flushes": flushes,
+                "failed_flushes": self._failed_flushes,
+                "spooled": self._spooled,
+                "overflowed": self._overflowed,
+                "quarantined": self._quarantined,
+                "lost": self._lost,
+                "avg_flush_size": self._written / flushes if flushes else 0.0,
+                "avg_flush_latency_ms": (
+                    self._flush_time_total / flushes * 1000 if flushes else 0.0
+                ),
+                "max_flush_latency_ms": self._flush_time_max * 1000,
+            }
@@ -0,0 +1,228 @@
+# Standard Library imports
+import datetime
+import json
+
+# Core Flask imports
+from flask import current_app
+from flask.cli import AppGroup
+
+# Third-party imports
+import click
+from pydantic import ValidationError
+
+# App imports
+from app import db_manager
+import app.audit_blobs as audit_blobs
+import app.audit_partitions as audit_partitions
+import app.audit_rollups as audit_rollups
+from app.services import audit_log_services
+import propscreen.hashindexbuilder as hashindexbuilder
+import propscreen.sihasher as sihasher
+
+
+hash_index_cli = AppGroup(
+    "hash-index", help="Build the hash index of the organizational SI."
+)
+audit_log_cli = AppGroup(
+    "audit-log", help="Manage the monthly partitions of the audit log."
+)
+
+
+@hash_index_cli.command("build")
+@click.argument("output_path", type=click.Path(dir_okay=False))
+@click.option(
+    "--plaintext",
+    "plaintext_paths",
+    multiple=True,
+    type=click.Path(exists=True, dir_okay=False),
+    help="Plaintext file of sensitive information, one entry per line.",
+)
+@click.option(
+    "--hashes",
+    "hash_csv_paths",
+    multiple=True,
+    type=click.Path(exists=True, dir_okay=False),
+    help="CSV file of hex encoded SHA-256 hashes.",
+)
+@click.option(
+    "--fp-rate",
+    type=float,
+    default=sihasher.SI_HASH_BLOOM_FP_RATE,
+    show_default=True,
+    help="Target false positive rate of the Bloom filter, 0 for no filter.",
+)
+@click.option(
+    "--run-size",
+    type=int,
+    default=500000,
+    show_default=True,
+    help="Maximum number of hashes held in memory while sorting.",
+)
+@click.option(
+    "--max-phrase-tokens",
+    type=int,
+    default=sihasher.SI_MAX_PHRASE_TOKENS,
+    show_default=True,
+    help="Number of tokens of the longest phrase that is matched.",
+)
+@click.option(
+    "--temp-dir",
+    type=click.Path(file_okay=False),
+    help="Directory of the temporary sorted runs.",
+)
+def build_hash_index(
+    output_path,
+    plaintext_paths,
+    hash_csv_paths,
+    fp_rate,
+    run_size,
+    max_phrase_tokens,
+    temp_dir,
+):
+    """Build OUTPUT_PATH, its Bloom filter and its manifest from the inputs."""
+    if not plaintext_paths and not hash_csv_paths:
+        raise click.UsageError("Pass at least one --plaintext or --hashes input.")
+
+    manifest = hashindexbuilder.build_hash_index(
+        output_path,
+        plaintext_paths=plaintext_paths,
+        hash_csv_paths=hash_csv_paths,
+        fp_rate=fp_rate,
+        run_size=run_size,
+        temp_dir=temp_dir,
+        max_phrase_tokens=max_phrase_tokens,
+    )
+    click.echo(json.dumps(manifest, indent=2))
+
+
+@audit_log_cli.command("maintain")
+@click.option(
+    "--months-ahead",
+    type=int,
+    help="Months after the current one to create partitions for "
+    "[default: AUDIT_PARTITION_MONTHS_AHEAD].",
+)
+@click.option(
+    "--retention-months",
+    type=int,
+    help="Months the rows are kept before they are archived and dropped "
+    "[default: AUDIT_RETENTION_MONTHS].",
+)
+@click.option(
+    "--archive-dir",
+    type=click.Path(file_okay=False),
+    help="Keep the archives in this directory, in addition to "
+    "AUDIT_ARCHIVE_BUCKET when it is set.",
+)
+@click.option(
+    "--dry-run",
+    is_flag=True,
+    help="Only list the partitions that would be archived.",
+)
+def maintain_audit_log(months_ahead, retention_months, archive_dir, dry_run):
+    """Create the future partitions and archive the expired ones.
+
+    The prompts and responses that were only referenced by the archived
+    partitions are deleted afterwards.
+    """
+    config = current_app.config
+    if months_ahead is None:
+        months_ahead = config["AUDIT_PARTITION_MONTHS_AHEAD"]
+    if retention_months is None:
+        retention_months = config["AUDIT_RETENTION_MONTHS"]
+    bucket_name = config["AUDIT_ARCHIVE_BUCKET"]
+    engine = db_manager.engine
+
+    expired = audit_partitions.expired_partitions(engine, retention_months)
+    if dry_run:
+        for _, name in expired:
+            click.echo(f"Would archive and drop {name}")
+        return
+    if expired and not bucket_name and not archive_dir:
+        raise click.UsageError(
+            "Set AUDIT_ARCHIVE_BUCKET or pass --archive-dir, expired partitions "
+            "are never dropped without an archive."
+        )
+
+    for name in audit_partitions.create_future_partitions(engine, months_ahead):
+        click.echo(f"Created {name}")
+    for _, name in expired:
+        archive = audit_partitions.archive_partition(
+            engine,
+            name,
+            bucket_name=bucket_name,
+            prefix=config["AUDIT_ARCHIVE_PREFIX"],
+            archive_dir=archive_dir,
+        )
+        click.echo(json.dumps(archive))
+
+    cutoff = audit_partitions.retention_cutoff(retention_months)
+    deleted = audit_blobs.delete_unreferenced_blobs(
+        engine, datetime.datetime.combine(cutoff, datetime.time())
+    )
+    click.echo(f"Deleted {deleted} unreferenced prompts and responses")
+
+
+@audit_log_cli.command("backfill-rollups")
+@click.option(
+    "--from",
+    "start",
+    type=click.DateTime(),
+    required=True,
+    help="Start of the first hour to recompute.",
+)
+@click.option(
+    "--to",
+    "end",
+    type=click.DateTime(),
+    required=True,
+    help="End of the last hour to recompute, no later than the deployment of "
+    "the rollups.",
+)
+def backfill_rollups(start, end):
+    """Recompute the decision rollups of existing audit log records."""
+    if end <= start:
+        raise click.UsageError("--to must be later than --from.")
+    buckets = audit_rollups.backfill_rollups(db_manager.engine, start, end)
+    click.echo(f"Wrote {buckets} rollup buckets")
+
+
+@audit_log_cli.command("export")
+@click.argument("output", type=click.File("wb"))
+@click.option(
+    "--from",
+    "start",
+    type=click.DateTime(),
+    required=True,
+    help="Start of the range (inclusive).",
+)
+@click.option(
+    "--to",
+    "end",
+    type=click.DateTime(),
+    required=True,
+    help="End of the range (exclusive).",
+)
+@click.option("--decision", help="Only export the records of this decision.")
+@click.option(
+    "--format",
+    "export_format",
+    type=click.Choice(["ndjson", "csv"]),
+    default="ndjson",
+    show_default=True,
+)
+@click.option("--gzip", "compress", is_flag=True, help="Compress the export.")
+def export_audit_log(output, start, end, decision, export_format, compress):
+    """Stream the audit log records of a time range to OUTPUT ('-' for stdout)."""
+    try:
+        chunks, _, _ = audit_log_services.export_audit_log(
+            created_from=start,
+            created_to=end,
+            decision=decision,
+            format=export_format,
+            compress=compress,
+        )
+    except ValidationError as e:
+        raise click.UsageError(str(e))
+    for chunk in chunks:
+        output.write(chunk)
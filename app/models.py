@@ -6,14 +6,19 @@ from flask_login import UserMixin
 # Third-party imports
 from sqlalchemy import (
     Integer,
+    BigInteger,
+    LargeBinary,
     Column,
     Text,
     String,
     Boolean,
     DateTime,
     ForeignKey,
+    Computed,
+    Index,
     func,
 )
+from sqlalchemy.dialects.postgresql import TSVECTOR, UUID
 from sqlalchemy.orm import relationship
 
 # App imports
@@ -23,13 +28,66 @@ from app import db_manager
 Base = db_manager.base
 
 
+class AuditBlob(Base):
+    """A prompt or response of the audit log, stored once, see app.audit_blobs."""
+
+    __tablename__ = "audit_blob"
+    digest = Column(LargeBinary, primary_key=True)
+    content = Column(Text(), nullable=False)
+    size = Column(Integer, nullable=False)
+    created_at = Column(DateTime, nullable=False, server_default=func.now())
+    search_vector = Column(
+        TSVECTOR, Computed("to_tsvector('english', content)", persisted=True)
+    )
+
+    __table_args__ = (
+        Index("ix_audit_blob_search_vector", search_vector, postgresql_using="gin"),
+    )
+
+
 class AuditLog(Base):
     __tablename__ = "audit_log"
-    audit_log_id = Column(String, primary_key=True)
-    created_at = Column(DateTime, server_default=func.now())
-    prompt = Column(Text(), nullable=False)
-    llm_response = Column(Text(), nullable=False)
+    audit_log_id = Column(UUID(as_uuid=False), primary_key=True)
+    # audit_log is partitioned by month on created_at, see app.audit_partitions
+    created_at = Column(DateTime, primary_key=True, server_default=func.now())
     decision = Column(String(), nullable=False)
+    prompt_digest = Column(
+        LargeBinary, ForeignKey("audit_blob.digest"), nullable=False, index=True
+    )
+    llm_response_digest = Column(
+        LargeBinary, ForeignKey("audit_blob.digest"), nullable=False, index=True
+    )
+    prompt_blob = relationship("AuditBlob", foreign_keys=[prompt_digest])
+    llm_response_blob = relationship("AuditBlob", foreign_keys=[llm_response_digest])
+
+    __table_args__ = (
+        Index(
+            "ix_audit_log_decision_created_at",
+            decision,
+            created_at.desc(),
+            audit_log_id.desc(),
+        ),
+        Index("ix_audit_log_created_at_id", created_at.desc(), audit_log_id.desc()),
+    )
+
+    @property
+    def prompt(self):
+        return self.prompt_blob.content
+
+    @property
+    def llm_response(self):
+        return self.llm_response_blob.content
+
+
+class AuditDecisionRollup(Base):
+    """Number and bytes of the audit log records per hour and decision."""
+
+    __tablename__ = "audit_decision_rollup"
+    bucket_start = Column(DateTime, primary_key=True)
+    decision = Column(String(), primary_key=True)
+    count = Column(BigInteger, nullable=False, server_default="0")
+    total_bytes = Column(BigInteger, nullable=False, server_default="0")
+
 
 class Account(Base):
     __tablename__ = "accounts"
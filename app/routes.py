@@ -11,6 +11,7 @@ from app import login_manager
 from .views import (
     error_views,
     account_management_views,
+    admin_views,
     static_views,
 )
 from .models import User
@@ -78,5 +79,21 @@ bp.add_url_rule(
 bp.add_url_rule("/api/v1/gait-llm-check/",
                 view_func=account_management_views.api_v1_gait_llm_check_outer, methods=["POST"])
 
+bp.add_url_rule("/api/v1/gait-llm-check/stream",
+                view_func=account_management_views.api_v1_gait_llm_check_stream,
+                methods=["POST"])
+
+bp.add_url_rule("/api/v2/gait-llm-check/batch",
+                view_func=account_management_views.api_v2_gait_llm_check_batch,
+                methods=["POST"])
+
 # Admin required
 bp.add_url_rule("/admin", view_func=static_views.admin)
+
+bp.add_url_rule("/api/admin/metrics", view_func=admin_views.metrics)
+
+bp.add_url_rule("/api/admin/audit-log", view_func=admin_views.audit_log_search)
+
+bp.add_url_rule("/api/admin/audit-log/rollups", view_func=admin_views.audit_log_rollups)
+
+bp.add_url_rule("/api/admin/audit-log/export", view_func=admin_views.audit_log_export)
@@ -1,26 +1,33 @@
 # Standard Library imports
+from concurrent.futures import ThreadPoolExecutor
 import datetime
+import json
 import random
-import uuid
+import threading
 
 # Core Flask imports
-from flask import request
+from flask import current_app, request
 # from flask import jsonify
 
 # Third-party imports
 import bcrypt
 
 # App imports
-from app import db_manager as db
-from ..models import User, Account, AuditLog
+from app import audit_sink, db_manager as db
+from ..models import User, Account
 from ..utils import custom_errors
-from ..utils.validators import AccountValidator, EmailValidator
+from ..utils.identifiers import uuid7
+from ..utils.validators import AccountValidator, BatchScanValidator, EmailValidator
 
 #SI Check Import
 import sys
 sys.path.insert(0, '/propscreen/sicheck.py')
 import propscreen.sicheck as sicheck
 
+# Sent instead of the LLM's response when it is a True Positive
+BLOCKED_RESPONSE = "Due to your current level of access, you do not \
+        have the necessary privileges to view some of the data in the response."
+
 def api_v1_gait_llm_check_inner(prompt):
     print("ENTER api_v1_gait_llm_check_inner()")
 
@@ -37,19 +44,15 @@ def api_v1_gait_llm_check_inner(prompt):
     res_prompt, res_llm_response, res_decision = sicheck.sensitive_info_check(prompt, llm_response)
     print(f"Checked response OK")
 
-    audit_log_model = AuditLog(
-        audit_log_id=str(uuid.uuid4()),
-        prompt=str(res_prompt),
-        llm_response=str(res_llm_response),
-        decision=str(res_decision),
+    audit_sink.record(
+        prompt=res_prompt,
+        llm_response=res_llm_response,
+        decision=res_decision,
+        audit_log_id=str(uuid7()),
     )
 
-    db.session.add(audit_log_model)
-    db.session.commit()
-
     if res_decision == "True Positive":
-        res_llm_response = "Due to your current level of access, you do not \
-        have the necessary privileges to view some of the data in the response."
+        res_llm_response = BLOCKED_RESPONSE
     http_response_body = {
         "original_prompt": prompt,
         "timestamp": now,
@@ -60,6 +63,149 @@ def api_v1_gait_llm_check_inner(prompt):
     return http_response_body
 
 
+def api_v1_gait_llm_check_stream_inner(prompt):
+    """Stream the LLM's response as NDJSON events while it is being scanned.
+
+    A "start" event is followed by "chunk" events holding the text that has
+    passed the scan. The stream ends with a "blocked" event when the response
+    is a True Positive (the LLM stream is cut as soon as that is certain) and
+    with a "decision" event holding the final decision.
+    """
+    print("ENTER api_v1_gait_llm_check_stream_inner()")
+
+    now = datetime.datetime.now().isoformat()
+
+    yield json.dumps({
+        "type": "start",
+        "original_prompt": prompt,
+        "timestamp": now,
+        "request_ip": request.remote_addr,
+    }) + "\n"
+
+    stream_scanner = sicheck.create_stream_scanner(prompt)
+    for chunk in sicheck.stream_llm(prompt):
+        released_text = stream_scanner.feed(chunk)
+        if released_text:
+            yield json.dumps({"type": "chunk", "text": released_text}) + "\n"
+        if stream_scanner.blocked:
+            print("DEBUG: True Positive found mid-stream, stream cut", flush=True)
+            break
+
+    if stream_scanner.blocked:
+        res_llm_response = stream_scanner.text
+        res_decision = "True Positive"
+    else:
+        # The final decision is made on the whole response, the same way as
+        # for the non streaming endpoint
+        stream_scanner.finish()
+        _, res_llm_response, res_decision = sicheck.sensitive_info_check(
+            prompt, stream_scanner.text
+        )
+
+    audit_sink.record(
+        prompt=prompt,
+        llm_response=res_llm_response,
+        decision=res_decision,
+        audit_log_id=str(uuid7()),
+    )
+
+    if res_decision == "True Positive":
+        yield json.dumps({"type": "blocked", "bot_response": BLOCKED_RESPONSE}) + "\n"
+    elif res_decision == "Error":
+        yield json.dumps({"type": "blocked", "bot_response": res_llm_response}) + "\n"
+    elif stream_scanner.held_text():
+        yield json.dumps({"type": "chunk", "text": stream_scanner.held_text()}) + "\n"
+
+    yield json.dumps({"type": "decision", "decision": res_decision}) + "\n"
+
+
+# Sent for a batch item that could not be scanned
+BATCH_ITEM_ERROR_RESPONSE = "The item could not be scanned, please retry it."
+
+# Threads that scan the items of the batches, shared by all the requests of the
+# process so that concurrent batches cannot multiply the load
+_batch_executor = None
+_batch_executor_lock = threading.Lock()
+
+
+def get_batch_executor():
+    global _batch_executor
+    if _batch_executor is None:
+        with _batch_executor_lock:
+            if _batch_executor is None:
+                _batch_executor = ThreadPoolExecutor(
+                    max_workers=current_app.config["BATCH_SCAN_CONCURRENCY"],
+                    thread_name_prefix="batch-scan",
+                )
+    return _batch_executor
+
+
+def scan_batch_item(item):
+    """Get the response of a batch item (unless it has one) and scan it."""
+    try:
+        llm_response = item.llm_response
+        if llm_response is None:
+            llm_response = sicheck.call_to_llm(item.prompt)
+        return sicheck.sensitive_info_check(item.prompt, llm_response)
+    except Exception as e:
+        # One item that cannot be scanned does not fail the whole batch
+        print(f"Error: batch item could not be scanned: {str(e)}", flush=True)
+        return item.prompt, BATCH_ITEM_ERROR_RESPONSE, "Error"
+
+
+def api_v2_gait_llm_check_batch_inner(unsafe_items):
+    """Scan the items of a batch concurrently and audit them in one transaction.
+
+    Every item has a prompt and optionally the response to scan, the prompt is
+    sent to the LLM when there is no response. The results are returned in the
+    order of the items.
+    """
+    print("ENTER api_v2_gait_llm_check_batch_inner()")
+
+    # Counted before the items are validated, so that an oversized batch is
+    # rejected without building a model per item
+    if (
+        isinstance(unsafe_items, list)
+        and len(unsafe_items) > current_app.config["BATCH_SCAN_MAX_ITEMS"]
+    ):
+        raise custom_errors.BatchTooLargeError()
+    batch = BatchScanValidator(items=unsafe_items)
+
+    now = datetime.datetime.now().isoformat()
+
+    scans = list(get_batch_executor().map(scan_batch_item, batch.items))
+
+    audit_sink.record_many(
+        [
+            {
+                "prompt": res_prompt,
+                "llm_response": res_llm_response,
+                "decision": res_decision,
+                "audit_log_id": str(uuid7()),
+            }
+            for res_prompt, res_llm_response, res_decision in scans
+        ]
+    )
+
+    results = []
+    for item, (_, res_llm_response, res_decision) in zip(batch.items, scans):
+        if res_decision == "True Positive":
+            res_llm_response = BLOCKED_RESPONSE
+        results.append(
+            {
+                "original_prompt": item.prompt,
+                "bot_response": res_llm_response,
+                "decision": res_decision,
+            }
+        )
+
+    return {
+        "timestamp": now,
+        "request_ip": request.remote_addr,
+        "results": results,
+    }
+
+
 def get_user_profile_from_user_model(user_model):
     user_model_dict = user_model.__dict__
 
@@ -0,0 +1,298 @@
+# Standard Library imports
+import base64
+import csv
+import datetime
+import io
+import json
+import zlib
+
+# Core Flask imports
+
+# Third-party imports
+from sqlalchemy import func, or_, select, tuple_
+from sqlalchemy.orm import aliased
+
+# App imports
+from app import db_manager as db
+from ..models import AuditBlob, AuditDecisionRollup, AuditLog
+from ..utils.validators import (
+    AuditLogExportValidator,
+    AuditLogSearchValidator,
+    AuditRollupValidator,
+)
+
+
+# Range of the rollups served when no range is given
+DEFAULT_ROLLUP_RANGE = datetime.timedelta(hours=24)
+
+# Records fetched at a time from the server side cursor of an export, and the
+# size of the chunks the export is written in
+EXPORT_FETCH_SIZE = 1000
+EXPORT_CHUNK_SIZE = 64 * 1024
+
+EXPORT_COLUMNS = ("audit_log_id", "created_at", "prompt", "llm_response", "decision")
+EXPORT_MIMETYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+def audit_record_query():
+    """
+    Returns the query of the audit log records with the text of their prompt
+    and response, joined from audit_blob
+    """
+    prompt_blob = aliased(AuditBlob)
+    llm_response_blob = aliased(AuditBlob)
+    return (
+        db.session.query(
+            AuditLog.audit_log_id,
+            AuditLog.created_at,
+            prompt_blob.content.label("prompt"),
+            llm_response_blob.content.label("llm_response"),
+            AuditLog.decision,
+        )
+        .join(prompt_blob, prompt_blob.digest == AuditLog.prompt_digest)
+        .join(
+            llm_response_blob,
+            llm_response_blob.digest == AuditLog.llm_response_digest,
+        )
+    )
+
+
+def serialize_audit_record(record):
+    """Returns the JSON serializable dict of an audit log record."""
+    return {
+        "audit_log_id": str(record.audit_log_id),
+        "created_at": record.created_at.isoformat(),
+        "prompt": record.prompt,
+        "llm_response": record.llm_response,
+        "decision": record.decision,
+    }
+
+
+def encode_cursor(created_at, audit_log_id):
+    """Returns the opaque cursor of the page that follows an audit log record."""
+    position = json.dumps([created_at.isoformat(), str(audit_log_id)])
+    return base64.urlsafe_b64encode(position.encode()).decode()
+
+
+def decode_cursor(cursor):
+    """Returns the (created_at, audit_log_id) a cursor points after."""
+    created_at, audit_log_id = json.loads(base64.urlsafe_b64decode(cursor))
+    return datetime.datetime.fromisoformat(created_at), audit_log_id
+
+
+def search_audit_log(**filters):
+    """
+    Description
+    -----------
+    Searches the audit log, newest first. The text query is matched against the
+    search_vector of the prompts and responses in audit_blob, and the pages are
+    keyset paginated on (created_at, audit_log_id): the cursor of a page is the
+    position of its last record, so a page costs the same however deep it is.
+
+    Parameters
+    ----------
+    filters : dict
+        q (web search syntax, e.g. "salary -draft"), decision, created_from,
+        created_to, limit and cursor, see AuditLogSearchValidator
+
+    Returns
+    -------
+    page : dict
+        The records of the page and the cursor of the next page, None on the
+        last page
+    """
+    search = AuditLogSearchValidator(**filters)
+
+    query = audit_record_query()
+    if search.q:
+        # The blobs that match are found through their GIN index, then the
+        # records that reference them through the digest indexes
+        matching_digests = select(AuditBlob.digest).where(
+            AuditBlob.search_vector.op("@@")(
+                func.websearch_to_tsquery("english", search.q)
+            )
+        )
+        query = query.filter(
+            or_(
+                AuditLog.prompt_digest.in_(matching_digests),
+                AuditLog.llm_response_digest.in_(matching_digests),
+            )
+        )
+    if search.decision:
+        query = query.filter(AuditLog.decision == search.decision)
+    # The creation time bounds also prune the monthly partitions
+    if search.created_from:
+        query = query.filter(AuditLog.created_at >= search.created_from)
+    if search.created_to:
+        query = query.filter(AuditLog.created_at < search.created_to)
+    if search.cursor:
+        query = query.filter(
+            tuple_(AuditLog.created_at, AuditLog.audit_log_id)
+            < tuple_(*decode_cursor(search.cursor))
+        )
+
+    # One extra record tells whether there is a next page
+    records = (
+        query.order_by(AuditLog.created_at.desc(), AuditLog.audit_log_id.desc())
+        .limit(search.limit + 1)
+        .all()
+    )
+    next_cursor = None
+    if len(records) > search.limit:
+        records = records[: search.limit]
+        next_cursor = encode_cursor(records[-1].created_at, records[-1].audit_log_id)
+
+    return {
+        "results": [serialize_audit_record(record) for record in records],
+        "next_cursor": next_cursor,
+    }
+
+
+def get_decision_rollups(**filters):
+    """
+    Description
+    -----------
+    Returns the number of audit log records and their bytes per time bucket
+    and decision. The counts are read from audit_decision_rollup, which the
+    audit write path keeps up to date, so the cost depends on the number of
+    buckets and not on the number of records.
+
+    Parameters
+    ----------
+    filters : dict
+        created_from, created_to (the last 24 hours by default), granularity
+        ("hour" or "day") and decision, see AuditRollupValidator
+
+    Returns
+    -------
+    rollups : dict
+        The range and the counts per bucket and decision, oldest first
+    """
+    rollup_filters = AuditRollupValidator(**filters)
+    created_to = rollup_filters.created_to or datetime.datetime.now()
+    created_from = rollup_filters.created_from or created_to - DEFAULT_ROLLUP_RANGE
+
+    bucket = AuditDecisionRollup.bucket_start
+    if rollup_filters.granularity == "day":
+        bucket = func.date_trunc("day", AuditDecisionRollup.bucket_start)
+    bucket = bucket.label("bucket_start")
+
+    query = db.session.query(
+        bucket,
+        AuditDecisionRollup.decision,
+        func.sum(AuditDecisionRollup.count).label("count"),
+        func.sum(AuditDecisionRollup.total_bytes).label("total_bytes"),
+    ).filter(
+        AuditDecisionRollup.bucket_start >= created_from,
+        AuditDecisionRollup.bucket_start < created_to,
+    )
+    if rollup_filters.decision:
+        query = query.filter(AuditDecisionRollup.decision == rollup_filters.decision)
+    rows = query.group_by(bucket, AuditDecisionRollup.decision).order_by(
+        bucket, AuditDecisionRollup.decision
+    )
+
+    return {
+        "from": created_from.isoformat(),
+        "to": created_to.isoformat(),
+        "granularity": rollup_filters.granularity,
+        "buckets": [
+            {
+                "bucket_start": row.bucket_start.isoformat(),
+                "decision": row.decision,
+                "count": int(row.count),
+                "total_bytes": int(row.total_bytes),
+            }
+            for row in rows
+        ],
+    }
+
+
+def export_audit_log(**filters):
+    """
+    Description
+    -----------
+    Exports the audit log records of a time range as NDJSON or CSV, optionally
+    gzip compressed. The filters are validated right away, the records are
+    then read through a server side cursor EXPORT_FETCH_SIZE at a time while
+    the returned chunks are consumed, so the memory used does not depend on
+    the size of the export.
+
+    Parameters
+    ----------
+    filters : dict
+        created_from, created_to, decision, format ("ndjson" or "csv") and
+        compress, see AuditLogExportValidator
+
+    Returns
+    -------
+    chunks, file_name, mimetype : tuple
+        The generator of the bytes of the export, the name of the file and its
+        mimetype
+    """
+    export = AuditLogExportValidator(**filters)
+
+    query = (
+        audit_record_query()
+        .filter(
+            AuditLog.created_at >= export.created_from,
+            AuditLog.created_at < export.created_to,
+        )
+        .order_by(AuditLog.created_at, AuditLog.audit_log_id)
+    )
+    if export.decision:
+        query = query.filter(AuditLog.decision == export.decision)
+
+    if export.format == "csv":
+        chunks = _iter_csv_chunks(query.yield_per(EXPORT_FETCH_SIZE))
+    else:
+        chunks = _iter_ndjson_chunks(query.yield_per(EXPORT_FETCH_SIZE))
+
+    file_name = (
+        f"audit_log_{export.created_from:%Y%m%dT%H%M%S}_"
+        f"{export.created_to:%Y%m%dT%H%M%S}.{export.format}"
+    )
+    mimetype = EXPORT_MIMETYPES[export.format]
+    if export.compress:
+        chunks = _iter_gzip_chunks(chunks)
+        file_name += ".gz"
+        mimetype = "application/gzip"
+    return chunks, file_name, mimetype
+
+
+def _iter_ndjson_chunks(records):
+    buffer = io.StringIO()
+    for record in records:
+        buffer.write(json.dumps(serialize_audit_record(record)) + "\n")
+        if buffer.tell() >= EXPORT_CHUNK_SIZE:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+def _iter_csv_chunks(records):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    for record in records:
+        row = serialize_audit_record(record)
+        writer.writerow([row[column] for column in EXPORT_COLUMNS])
+        if buffer.tell() >= EXPORT_CHUNK_SIZE:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+def _iter_gzip_chunks(chunks):
+    # A gzip stream compressed as the chunks come, nothing is buffered beyond
+    # the compressor's window
+    compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
@@ -34,3 +34,8 @@ class CouldNotVerifyLogin(Error):
 class PermissionsDeniedError(Error):
     message = "Sorry, you don't have the necessary permissions. Please contact your admin or customer support."  # noqa: E501
     internal_error_code = 40301
+
+
+class BatchTooLargeError(Error):
+    message = "Sorry, that batch is too large. Please split it into smaller batches."  # noqa: E501
+    internal_error_code = 41301
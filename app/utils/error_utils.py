@@ -1,4 +1,5 @@
 # Standard Library imports
+import json
 
 # Core Flask imports
 
@@ -11,7 +12,9 @@ def get_validation_error_response(validation_error, http_status_code, display_er
     resp = {
         "errors": {
             "display_error": display_error,
-            "field_errors": validation_error.errors()
+            # The errors of custom validators hold the raised exception, the
+            # JSON of the errors has its message instead
+            "field_errors": json.loads(validation_error.json())
         }
     }
     return resp, http_status_code
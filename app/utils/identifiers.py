@@ -0,0 +1,56 @@
+# Standard Library imports
+import os
+import threading
+import time
+import uuid
+
+# Core Flask imports
+
+# Third-party imports
+
+# App imports
+
+
+_last_timestamp = 0
+_counter = 0
+_lock = threading.Lock()
+
+
+def uuid7():
+    """
+    Description
+    -----------
+    Returns a version 7 UUID (RFC 9562): a 48 bit Unix timestamp in
+    milliseconds followed by random bits. The ids sort by creation time, so new
+    rows are appended at the end of the primary key index instead of at a
+    random page. Ids created in the same millisecond by this process keep their
+    order through a 12 bit counter seeded at random.
+
+    Returns
+    -------
+    id : uuid.UUID
+        The new id
+    """
+    global _last_timestamp, _counter
+
+    with _lock:
+        timestamp = time.time_ns() // 1_000_000
+        if timestamp > _last_timestamp:
+            _last_timestamp = timestamp
+            _counter = int.from_bytes(os.urandom(2), "big") & 0x7FF
+        else:
+            # Same millisecond or the clock went back, keep counting on the
+            # last timestamp
+            _counter += 1
+            if _counter > 0xFFF:
+                _last_timestamp += 1
+                _counter = 0
+            timestamp = _last_timestamp
+        counter = _counter
+
+    value = timestamp << 80
+    value |= 0x7 << 76
+    value |= counter << 64
+    value |= 0b10 << 62
+    value |= int.from_bytes(os.urandom(8), "big") & ((1 << 62) - 1)
+    return uuid.UUID(int=value)
@@ -1,9 +1,14 @@
 # Standard Library imports
+import base64
+import datetime
+import json
+import uuid
+from typing import List, Literal, Optional
 
 # Core Flask imports
 
 # Third-party imports
-from pydantic import BaseModel, validator, constr, EmailStr
+from pydantic import BaseModel, validator, constr, conint, EmailStr
 
 # App imports
 
@@ -23,3 +28,60 @@ class AccountValidator(BaseModel):
 
 class EmailValidator(BaseModel):
     email: EmailStr
+
+
+class AuditLogSearchValidator(BaseModel):
+    q: Optional[constr(strip_whitespace=True, min_length=1, max_length=256)] = None
+    decision: Optional[constr(min_length=1, max_length=32)] = None
+    created_from: Optional[datetime.datetime] = None
+    created_to: Optional[datetime.datetime] = None
+    limit: conint(ge=1, le=200) = 50
+    cursor: Optional[str] = None
+
+    @validator('cursor')
+    def cursor_valid(cls, v):
+        if v is None:
+            return v
+        try:
+            created_at, audit_log_id = json.loads(base64.urlsafe_b64decode(v))
+            datetime.datetime.fromisoformat(created_at)
+            uuid.UUID(audit_log_id)
+        except (ValueError, TypeError, AttributeError):
+            raise ValueError('Cursor is not valid')
+        return v
+
+
+class AuditRollupValidator(BaseModel):
+    created_from: Optional[datetime.datetime] = None
+    created_to: Optional[datetime.datetime] = None
+    granularity: Literal['hour', 'day'] = 'hour'
+    decision: Optional[constr(min_length=1, max_length=32)] = None
+
+
+class AuditLogExportValidator(BaseModel):
+    created_from: datetime.datetime = ...
+    created_to: datetime.datetime = ...
+    decision: Optional[constr(min_length=1, max_length=32)] = None
+    format: Literal['ndjson', 'csv'] = 'ndjson'
+    compress: bool = False
+
+    @validator('created_to')
+    def range_valid(cls, v, values):
+        if 'created_from' in values and v <= values['created_from']:
+            raise ValueError('The end of the range must be after its start')
+        return v
+
+
+class BatchScanItemValidator(BaseModel):
+    prompt: constr(min_length=1) = ...
+    llm_response: Optional[str] = None
+
+
+class BatchScanValidator(BaseModel):
+    items: List[BatchScanItemValidator] = ...
+
+    @validator('items')
+    def items_not_empty(cls, v):
+        if not v:
+            raise ValueError('The batch must have at least one item')
+        return v
@@ -1,7 +1,15 @@
 # Standard Library imports
 
 # Core Flask imports
-from flask import request, redirect, url_for, jsonify
+from flask import (
+    current_app,
+    request,
+    redirect,
+    url_for,
+    jsonify,
+    Response,
+    stream_with_context,
+)
 
 # Third-party imports
 from pydantic import ValidationError
@@ -23,6 +31,43 @@ def api_v1_gait_llm_check_outer():
     response = account_management_services.api_v1_gait_llm_check_inner(unsafe_prompt)
     return response, 200
 
+
+@login_required
+def api_v1_gait_llm_check_stream():
+    print("ENTRY api_v1_gait_llm_check_stream()")
+    unsafe_prompt = request.json.get("prompt")
+    events = account_management_services.api_v1_gait_llm_check_stream_inner(
+        unsafe_prompt
+    )
+    return Response(stream_with_context(events), mimetype="application/x-ndjson")
+
+
+@login_required
+def api_v2_gait_llm_check_batch():
+    print("ENTRY api_v2_gait_llm_check_batch()")
+    # Rejected before the body is read and parsed
+    max_bytes = current_app.config["BATCH_SCAN_MAX_BYTES"]
+    if request.content_length is not None and request.content_length > max_bytes:
+        return get_business_requirement_error_response(
+            business_logic_error=custom_errors.BatchTooLargeError(),
+            http_status_code=413,
+        )
+    unsafe_items = request.json.get("items")
+
+    try:
+        response = account_management_services.api_v2_gait_llm_check_batch_inner(
+            unsafe_items
+        )
+    except ValidationError as e:
+        return get_validation_error_response(validation_error=e, http_status_code=422)
+    except custom_errors.BatchTooLargeError as e:
+        return get_business_requirement_error_response(
+            business_logic_error=e, http_status_code=413
+        )
+
+    return response, 200
+
+
 def register_account():
     unsafe_username = request.json.get("username")
     unsafe_email = request.json.get("email")
@@ -0,0 +1,82 @@
+# Standard Library imports
+
+# Core Flask imports
+from flask import request, Response, stream_with_context
+
+# Third-party imports
+from flask_login import login_required
+from pydantic import ValidationError
+
+# App imports
+from app import audit_sink
+from ..permissions import roles_required
+from ..services import audit_log_services
+from ..utils.error_utils import get_validation_error_response
+import propscreen.scanners as scanners
+import propscreen.sicheck as sicheck
+
+
+@login_required
+@roles_required(["admin"])
+def metrics():
+    return {
+        "data": {
+            "ner_batching": scanners.batching_stats(),
+            "ner_segment_cache": scanners.segment_cache_stats(),
+            "hash_index": sicheck.hash_index_stats(),
+            "decision_cache": sicheck.decision_cache_stats(),
+            "audit_sink": audit_sink.stats(),
+        }
+    }
+
+
+@login_required
+@roles_required(["admin"])
+def audit_log_search():
+    try:
+        page = audit_log_services.search_audit_log(
+            q=request.args.get("q") or None,
+            decision=request.args.get("decision") or None,
+            created_from=request.args.get("from") or None,
+            created_to=request.args.get("to") or None,
+            limit=request.args.get("limit", 50),
+            cursor=request.args.get("cursor") or None,
+        )
+    except ValidationError as e:
+        return get_validation_error_response(validation_error=e, http_status_code=422)
+    return {"data": page}
+
+
+@login_required
+@roles_required(["admin"])
+def audit_log_rollups():
+    try:
+        rollups = audit_log_services.get_decision_rollups(
+            created_from=request.args.get("from") or None,
+            created_to=request.args.get("to") or None,
+            granularity=request.args.get("granularity", "hour"),
+            decision=request.args.get("decision") or None,
+        )
+    except ValidationError as e:
+        return get_validation_error_response(validation_error=e, http_status_code=422)
+    return {"data": rollups}
+
+
+@login_required
+@roles_required(["admin"])
+def audit_log_export():
+    try:
+        chunks, file_name, mimetype = audit_log_services.export_audit_log(
+            created_from=request.args.get("from"),
+            created_to=request.args.get("to"),
+            decision=request.args.get("decision") or None,
+            format=request.args.get("format", "ndjson"),
+            compress=request.args.get("gzip", "false"),
+        )
+    except ValidationError as e:
+        return get_validation_error_response(validation_error=e, http_status_code=422)
+    return Response(
+        stream_with_context(chunks),
+        mimetype=mimetype,
+        headers={"Content-Disposition": f"attachment; filename={file_name}"},
+    )
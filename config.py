@@ -11,6 +11,78 @@ class Config(object):
     REMEMBER_COOKIE_HTTPONLY = os.environ.get("REMEMBER_COOKIE_HTTPONLY")
     SESSION_COOKIE_SAMESITE = os.environ.get("SESSION_COOKIE_SAMESITE")
 
+    # LLM Guard Sensitive scanner, built once per process
+    SENSITIVE_SCANNER_REDACT = os.environ.get("SENSITIVE_SCANNER_REDACT") == "True"
+    SENSITIVE_SCANNER_THRESHOLD = float(
+        os.environ.get("SENSITIVE_SCANNER_THRESHOLD", 0.5)
+    )
+    SENSITIVE_SCANNER_ENTITY_TYPES = (
+        os.environ.get("SENSITIVE_SCANNER_ENTITY_TYPES", "").split(",")
+        if os.environ.get("SENSITIVE_SCANNER_ENTITY_TYPES")
+        else None
+    )
+    SENSITIVE_SCANNER_USE_ONNX = os.environ.get("SENSITIVE_SCANNER_USE_ONNX") == "True"
+    WARM_UP_SCANNERS = True
+
+    # Micro-batching of the Sensitive scans of concurrent requests, a batch size
+    # of 1 disables it. The scanner has no batched inference, so it is disabled
+    # by default, see propscreen.scanners.scan_batch
+    NER_BATCH_SIZE = int(os.environ.get("NER_BATCH_SIZE", 1))
+    NER_BATCH_MAX_WAIT_MS = float(os.environ.get("NER_BATCH_MAX_WAIT_MS", 5))
+
+    # Cache of the Sensitive scans of the sentences of the responses, a size of
+    # 0 disables it
+    NER_SEGMENT_CACHE_SIZE = int(os.environ.get("NER_SEGMENT_CACHE_SIZE", 50000))
+    NER_SEGMENT_CACHE_TTL = float(os.environ.get("NER_SEGMENT_CACHE_TTL", 3600))
+    NER_SEGMENT_CACHE_MAX_BYTES = int(
+        os.environ.get("NER_SEGMENT_CACHE_MAX_BYTES", 64 * 1024 * 1024)
+    )
+
+    # Audit log records are written in bulk by a background worker, a batch is
+    # flushed once it has AUDIT_BATCH_SIZE records or AUDIT_FLUSH_INTERVAL_MS
+    # after its first record. Records that cannot be written are spooled to
+    # AUDIT_SPOOL_PATH and retried every AUDIT_SPOOL_RETRY_S seconds, as are the
+    # records that wait more than AUDIT_ENQUEUE_TIMEOUT_MS for the full queue.
+    AUDIT_ASYNC = os.environ.get("AUDIT_ASYNC", "True") == "True"
+    AUDIT_BATCH_SIZE = int(os.environ.get("AUDIT_BATCH_SIZE", 500))
+    AUDIT_FLUSH_INTERVAL_MS = float(os.environ.get("AUDIT_FLUSH_INTERVAL_MS", 200))
+    AUDIT_QUEUE_SIZE = int(os.environ.get("AUDIT_QUEUE_SIZE", 10000))
+    AUDIT_ENQUEUE_TIMEOUT_MS = float(os.environ.get("AUDIT_ENQUEUE_TIMEOUT_MS", 100))
+    AUDIT_SPOOL_PATH = os.environ.get("AUDIT_SPOOL_PATH", "logs/audit_spool.jsonl")
+    AUDIT_SPOOL_RETRY_S = float(os.environ.get("AUDIT_SPOOL_RETRY_S", 30))
+    # Also writes the prompt and response text to audit_log, for the previous
+    # release while both run on the 20261018_audit_blob revision. Turn it off
+    # before upgrading to head, which drops the text columns
+    AUDIT_WRITE_TEXT_COLUMNS = os.environ.get("AUDIT_WRITE_TEXT_COLUMNS") == "True"
+
+    # audit_log is partitioned by month, `flask audit-log maintain` creates the
+    # partitions AUDIT_PARTITION_MONTHS_AHEAD months ahead and archives the
+    # partitions older than AUDIT_RETENTION_MONTHS to AUDIT_ARCHIVE_BUCKET
+    # before dropping them
+    AUDIT_PARTITION_MONTHS_AHEAD = int(
+        os.environ.get("AUDIT_PARTITION_MONTHS_AHEAD", 3)
+    )
+    AUDIT_RETENTION_MONTHS = int(os.environ.get("AUDIT_RETENTION_MONTHS", 12))
+    AUDIT_ARCHIVE_BUCKET = os.environ.get("AUDIT_ARCHIVE_BUCKET")
+    AUDIT_ARCHIVE_PREFIX = os.environ.get("AUDIT_ARCHIVE_PREFIX", "audit_log/")
+
+    # /api/v2/gait-llm-check/batch accepts up to BATCH_SCAN_MAX_ITEMS items in a
+    # body of up to BATCH_SCAN_MAX_BYTES and scans BATCH_SCAN_CONCURRENCY of them
+    # at a time per process
+    BATCH_SCAN_MAX_ITEMS = int(os.environ.get("BATCH_SCAN_MAX_ITEMS", 500))
+    BATCH_SCAN_MAX_BYTES = int(os.environ.get("BATCH_SCAN_MAX_BYTES", 10485760))
+    BATCH_SCAN_CONCURRENCY = int(os.environ.get("BATCH_SCAN_CONCURRENCY", 8))
+
+    # LLM backend the prompts are sent to: "gradio", "http" or "stub"
+    LLM_BACKEND = os.environ.get("LLM_BACKEND", "gradio")
+    LLM_HTTP_URL = os.environ.get("LLM_HTTP_URL")
+    LLM_HTTP_MODEL = os.environ.get("LLM_HTTP_MODEL")
+    LLM_HTTP_API_KEY = os.environ.get("LLM_HTTP_API_KEY")
+    LLM_HTTP_TIMEOUT = float(os.environ.get("LLM_HTTP_TIMEOUT", 60))
+    LLM_STUB_CORPUS = os.environ.get("LLM_STUB_CORPUS")
+    LLM_STUB_LATENCY_MS = float(os.environ.get("LLM_STUB_LATENCY_MS", 0))
+    LLM_STUB_CHUNK_LATENCY_MS = float(os.environ.get("LLM_STUB_CHUNK_LATENCY_MS", 0))
+
     @staticmethod
     def init_app(app):
         pass
@@ -22,6 +94,9 @@ class DevelopmentConfig(Config):
 
 class TestingConfig(Config):
     TESTING = True
+    WARM_UP_SCANNERS = False
+    AUDIT_ASYNC = False
+    LLM_BACKEND = os.environ.get("LLM_BACKEND", "stub")
     SQLALCHEMY_DATABASE_URI = os.environ.get("TEST_DATABASE_URI")
 
 
@@ -7,7 +7,7 @@ from dotenv import load_dotenv
 # Third-party imports
 
 # App imports
-from app import create_app, db_manager
+from app import create_app, db_manager, serves_requests, start_serving
 from app.models import Account, User, Role, UserRole, AuditLog
 
 
@@ -19,6 +19,11 @@ if os.path.exists(dotenv_path):
 
 app = create_app(os.getenv("FLASK_CONFIG") or "dev")
 
+# The flask CLI commands load this module too, they do not warm up the scanners
+# or start the audit worker
+if serves_requests():
+    start_serving(app)
+
 
 @app.shell_context_processor
 def make_shell_context():
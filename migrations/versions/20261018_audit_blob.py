@@ -0,0 +1,211 @@
+"""audit_log prompts and responses in audit_blob
+
+The expand step: audit_log keeps prompt and llm_response next to the digests,
+so that the previous release still reads and writes them while the new release
+is rolled out. 20261018_audit_blob_contract drops them once no instance of the
+previous release is left, see "Upgrading the database" in the README.
+
+Revision ID: 20261018_audit_blob
+Revises: 20261018_audit_decision_rollup
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = "20261018_audit_blob"
+down_revision = "20261018_audit_decision_rollup"
+branch_labels = None
+depends_on = None
+
+# Number of audit_log rows backfilled per transaction
+BACKFILL_BATCH_SIZE = 10000
+
+DIGEST_COLUMNS = {"prompt": "prompt_digest", "llm_response": "llm_response_digest"}
+
+# Stores the text the previous release inserts in audit_blob and sets its
+# digest. The rows the new release inserts already have their digests
+CREATE_BLOB_SYNC = """
+CREATE FUNCTION audit_log_blob_sync() RETURNS trigger AS $$
+BEGIN
+    IF NEW.prompt_digest IS NULL AND NEW.prompt IS NOT NULL THEN
+        NEW.prompt_digest := sha256(convert_to(NEW.prompt, 'UTF8'));
+        INSERT INTO audit_blob (digest, content, size)
+        VALUES (NEW.prompt_digest, NEW.prompt, octet_length(NEW.prompt))
+        ON CONFLICT (digest) DO NOTHING;
+    END IF;
+    IF NEW.llm_response_digest IS NULL AND NEW.llm_response IS NOT NULL THEN
+        NEW.llm_response_digest := sha256(convert_to(NEW.llm_response, 'UTF8'));
+        INSERT INTO audit_blob (digest, content, size)
+        VALUES (
+            NEW.llm_response_digest, NEW.llm_response, octet_length(NEW.llm_response)
+        )
+        ON CONFLICT (digest) DO NOTHING;
+    END IF;
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER audit_log_blob_sync BEFORE INSERT ON audit_log
+FOR EACH ROW EXECUTE FUNCTION audit_log_blob_sync();
+"""
+
+
+def partitions(connection):
+    return connection.execute(
+        sa.text(
+            "SELECT child.relname FROM pg_inherits "
+            "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+            "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+            "WHERE parent.relname = 'audit_log' ORDER BY child.relname"
+        )
+    ).scalars().all()
+
+
+def backfill_partition(connection, partition):
+    # One short transaction per batch, walking the primary key. The texts of
+    # the batch are stored in audit_blob in the statement that sets their
+    # digests, so the foreign keys validate
+    last_id = "00000000-0000-0000-0000-000000000000"
+    while last_id is not None:
+        last_id = connection.execute(
+            sa.text(
+                f"WITH batch AS (SELECT audit_log_id, created_at, prompt, "
+                f"llm_response, prompt_digest, llm_response_digest FROM {partition} "
+                f"WHERE audit_log_id > CAST(:last_id AS uuid) "
+                f"ORDER BY audit_log_id LIMIT :batch_size), "
+                f"todo AS (SELECT * FROM batch WHERE prompt_digest IS NULL "
+                f"OR llm_response_digest IS NULL), "
+                f"blobs AS (INSERT INTO audit_blob (digest, content, size) "
+                f"SELECT sha256(convert_to(content, 'UTF8')), content, "
+                f"octet_length(content) FROM (SELECT prompt AS content FROM todo "
+                f"UNION SELECT llm_response FROM todo) contents "
+                f"ON CONFLICT (digest) DO NOTHING), "
+                f"updated AS (UPDATE {partition} log SET "
+                f"prompt_digest = sha256(convert_to(todo.prompt, 'UTF8')), "
+                f"llm_response_digest = sha256(convert_to(todo.llm_response, 'UTF8')) "
+                f"FROM todo WHERE log.audit_log_id = todo.audit_log_id "
+                f"AND log.created_at = todo.created_at) "
+                f"SELECT max(audit_log_id::text) FROM batch"
+            ),
+            {"last_id": last_id, "batch_size": BACKFILL_BATCH_SIZE},
+        ).scalar()
+
+
+def upgrade():
+    # Every distinct prompt and response once, keyed by the SHA-256 of its
+    # UTF-8 text (app.audit_blobs.content_digest)
+    op.create_table(
+        "audit_blob",
+        sa.Column("digest", sa.LargeBinary(), nullable=False),
+        sa.Column("content", sa.Text(), nullable=False),
+        sa.Column("size", sa.Integer(), nullable=False),
+        sa.Column(
+            "created_at", sa.DateTime(), server_default=sa.text("now()"), nullable=False
+        ),
+        sa.Column(
+            "search_vector",
+            postgresql.TSVECTOR(),
+            sa.Computed("to_tsvector('english', content)", persisted=True),
+        ),
+        sa.PrimaryKeyConstraint("digest"),
+    )
+    op.create_index(
+        "ix_audit_blob_search_vector",
+        "audit_blob",
+        ["search_vector"],
+        postgresql_using="gin",
+    )
+
+    # Only catalog changes on audit_log, the new release does not write the
+    # text when AUDIT_WRITE_TEXT_COLUMNS is off
+    for digest_column in DIGEST_COLUMNS.values():
+        op.add_column("audit_log", sa.Column(digest_column, sa.LargeBinary()))
+    for text_column in DIGEST_COLUMNS:
+        op.alter_column("audit_log", text_column, nullable=True)
+    op.execute(CREATE_BLOB_SYNC)
+
+    # The partitions are backfilled and their constraints validated and
+    # indexes built without blocking the reads and writes. The rows inserted
+    # meanwhile get their digests from the trigger or from the app
+    connection = op.get_bind()
+    with op.get_context().autocommit_block():
+        names = partitions(connection)
+        for partition in names:
+            backfill_partition(connection, partition)
+        for partition in names:
+            op.execute(
+                f"ALTER TABLE {partition} ADD CONSTRAINT {partition}_digests_not_null "
+                f"CHECK (prompt_digest IS NOT NULL "
+                f"AND llm_response_digest IS NOT NULL) NOT VALID"
+            )
+            op.execute(
+                f"ALTER TABLE {partition} "
+                f"VALIDATE CONSTRAINT {partition}_digests_not_null"
+            )
+            for digest_column in DIGEST_COLUMNS.values():
+                op.execute(
+                    f"ALTER TABLE {partition} ADD CONSTRAINT "
+                    f"{partition}_{digest_column}_fkey FOREIGN KEY ({digest_column}) "
+                    f"REFERENCES audit_blob (digest) NOT VALID"
+                )
+                op.execute(
+                    f"ALTER TABLE {partition} "
+                    f"VALIDATE CONSTRAINT {partition}_{digest_column}_fkey"
+                )
+                op.create_index(
+                    f"{partition}_{digest_column}_idx",
+                    partition,
+                    [digest_column],
+                    postgresql_concurrently=True,
+                )
+
+    # In one short transaction, without scanning: SET NOT NULL uses the
+    # validated checks, and the constraints and indexes of audit_log take over
+    # the validated ones of the partitions
+    for digest_column in DIGEST_COLUMNS.values():
+        op.execute(
+            f"CREATE INDEX ix_audit_log_{digest_column} "
+            f"ON ONLY audit_log ({digest_column})"
+        )
+        for partition in names:
+            op.execute(
+                f"ALTER INDEX ix_audit_log_{digest_column} "
+                f"ATTACH PARTITION {partition}_{digest_column}_idx"
+            )
+        op.alter_column("audit_log", digest_column, nullable=False)
+        op.create_foreign_key(
+            f"audit_log_{digest_column}_fkey",
+            "audit_log",
+            "audit_blob",
+            [digest_column],
+            ["digest"],
+        )
+    for partition in names:
+        op.drop_constraint(f"{partition}_digests_not_null", partition)
+
+
+def downgrade():
+    op.execute("DROP TRIGGER audit_log_blob_sync ON audit_log")
+    op.execute("DROP FUNCTION audit_log_blob_sync()")
+    # The rows the new release inserted without their text
+    op.execute(
+        "UPDATE audit_log SET prompt = prompt_blob.content, "
+        "llm_response = llm_response_blob.content "
+        "FROM audit_blob prompt_blob, audit_blob llm_response_blob "
+        "WHERE prompt_blob.digest = audit_log.prompt_digest "
+        "AND llm_response_blob.digest = audit_log.llm_response_digest "
+        "AND (audit_log.prompt IS NULL OR audit_log.llm_response IS NULL)"
+    )
+    for text_column in DIGEST_COLUMNS:
+        op.alter_column("audit_log", text_column, nullable=False)
+
+    for digest_column in reversed(list(DIGEST_COLUMNS.values())):
+        op.drop_constraint(f"audit_log_{digest_column}_fkey", "audit_log")
+        # Drops the indexes of the partitions with it
+        op.drop_index(f"ix_audit_log_{digest_column}", table_name="audit_log")
+        op.drop_column("audit_log", digest_column)
+    op.drop_table("audit_blob")
@@ -0,0 +1,82 @@
+"""audit_log drop the prompt and response text
+
+The contract step of 20261018_audit_blob, applied with
+20261018_audit_log_uuid_contract once no instance of the previous release is
+left and AUDIT_WRITE_TEXT_COLUMNS is off. See "Upgrading the database" in the
+README.
+
+Revision ID: 20261018_audit_blob_contract
+Revises: 20261018_audit_log_uuid_contract
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "20261018_audit_blob_contract"
+down_revision = "20261018_audit_log_uuid_contract"
+branch_labels = None
+depends_on = None
+
+# See 20261018_audit_blob
+CREATE_BLOB_SYNC = """
+CREATE FUNCTION audit_log_blob_sync() RETURNS trigger AS $$
+BEGIN
+    IF NEW.prompt_digest IS NULL AND NEW.prompt IS NOT NULL THEN
+        NEW.prompt_digest := sha256(convert_to(NEW.prompt, 'UTF8'));
+        INSERT INTO audit_blob (digest, content, size)
+        VALUES (NEW.prompt_digest, NEW.prompt, octet_length(NEW.prompt))
+        ON CONFLICT (digest) DO NOTHING;
+    END IF;
+    IF NEW.llm_response_digest IS NULL AND NEW.llm_response IS NOT NULL THEN
+        NEW.llm_response_digest := sha256(convert_to(NEW.llm_response, 'UTF8'));
+        INSERT INTO audit_blob (digest, content, size)
+        VALUES (
+            NEW.llm_response_digest, NEW.llm_response, octet_length(NEW.llm_response)
+        )
+        ON CONFLICT (digest) DO NOTHING;
+    END IF;
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER audit_log_blob_sync BEFORE INSERT ON audit_log
+FOR EACH ROW EXECUTE FUNCTION audit_log_blob_sync();
+"""
+
+
+def upgrade():
+    # The text is only kept in audit_blob, and so is its search vector. The
+    # columns are only dropped from the catalog
+    op.execute("DROP TRIGGER audit_log_blob_sync ON audit_log")
+    op.execute("DROP FUNCTION audit_log_blob_sync()")
+    op.drop_index("ix_audit_log_search_vector", table_name="audit_log")
+    op.drop_column("audit_log", "search_vector")
+    op.drop_column("audit_log", "prompt")
+    op.drop_column("audit_log", "llm_response")
+
+
+def downgrade():
+    op.add_column("audit_log", sa.Column("prompt", sa.Text()))
+    op.add_column("audit_log", sa.Column("llm_response", sa.Text()))
+    op.execute(
+        "UPDATE audit_log SET prompt = prompt_blob.content, "
+        "llm_response = llm_response_blob.content "
+        "FROM audit_blob prompt_blob, audit_blob llm_response_blob "
+        "WHERE prompt_blob.digest = audit_log.prompt_digest "
+        "AND llm_response_blob.digest = audit_log.llm_response_digest"
+    )
+    op.execute(
+        "ALTER TABLE audit_log ADD COLUMN search_vector tsvector GENERATED ALWAYS AS "
+        "(setweight(to_tsvector('english', prompt), 'A') || "
+        "setweight(to_tsvector('english', llm_response), 'B')) STORED"
+    )
+    op.create_index(
+        "ix_audit_log_search_vector",
+        "audit_log",
+        ["search_vector"],
+        postgresql_using="gin",
+    )
+    op.execute(CREATE_BLOB_SYNC)
@@ -0,0 +1,33 @@
+"""audit_log decision rollups
+
+Revision ID: 20261018_audit_decision_rollup
+Revises: 20261018_audit_log_search
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "20261018_audit_decision_rollup"
+down_revision = "20261018_audit_log_search"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Filled by the audit write path from now on, run
+    # `flask audit-log backfill-rollups` for the existing records
+    op.create_table(
+        "audit_decision_rollup",
+        sa.Column("bucket_start", sa.DateTime(), nullable=False),
+        sa.Column("decision", sa.String(), nullable=False),
+        sa.Column("count", sa.BigInteger(), server_default="0", nullable=False),
+        sa.Column("total_bytes", sa.BigInteger(), server_default="0", nullable=False),
+        sa.PrimaryKeyConstraint("bucket_start", "decision"),
+    )
+
+
+def downgrade():
+    op.drop_table("audit_decision_rollup")
@@ -0,0 +1,164 @@
+"""audit_log monthly partitions
+
+Revision ID: 20261018_audit_log_partitions
+Revises: 20261018_audit_log_uuid
+Create Date: 2026-10-18
+
+"""
+import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "20261018_audit_log_partitions"
+down_revision = "20261018_audit_log_uuid"
+branch_labels = None
+depends_on = None
+
+# The existing table, attached as the partition of every month before
+# LEGACY_MONTHS months after the current one
+LEGACY_PARTITION = "audit_log_legacy"
+LEGACY_MONTHS = 2
+
+# Partitions created ahead of the current month, `flask audit-log maintain`
+# keeps creating them afterwards
+MONTHS_AHEAD = 3
+
+# Number of rows updated per transaction by the created_at backfill
+BACKFILL_BATCH_SIZE = 10000
+
+
+def add_months(month, months):
+    index = month.year * 12 + month.month - 1 + months
+    return datetime.date(index // 12, index % 12 + 1, 1)
+
+
+def upgrade():
+    # The rows are not copied: the existing table becomes the partition of the
+    # months up to legacy_end, so the migration only holds short locks, and the
+    # monthly partitions take the rows from legacy_end on. legacy_end is at
+    # least a month after the next one, so that the rows the app inserts while
+    # the constraint below is validated are still in range
+    today = datetime.date.today()
+    legacy_end = add_months(datetime.date(today.year, today.month, 1), LEGACY_MONTHS)
+    newest = op.get_bind().execute(
+        sa.text("SELECT max(created_at) FROM audit_log")
+    ).scalar()
+    if newest is not None:
+        legacy_end = max(
+            legacy_end, add_months(datetime.date(newest.year, newest.month, 1), 1)
+        )
+
+    with op.get_context().autocommit_block():
+        # The partition key cannot be null, one short transaction per batch,
+        # walking the primary key
+        last_id = "00000000-0000-0000-0000-000000000000"
+        while last_id is not None:
+            last_id = op.get_bind().execute(
+                sa.text(
+                    "WITH batch AS (SELECT audit_log_id FROM audit_log "
+                    "WHERE audit_log_id > CAST(:last_id AS uuid) "
+                    "ORDER BY audit_log_id LIMIT :batch_size), "
+                    "updated AS (UPDATE audit_log SET created_at = now() "
+                    "FROM batch WHERE audit_log.audit_log_id = batch.audit_log_id "
+                    "AND audit_log.created_at IS NULL) "
+                    "SELECT max(audit_log_id::text) FROM batch"
+                ),
+                {"last_id": last_id, "batch_size": BACKFILL_BATCH_SIZE},
+            ).scalar()
+
+        # The partition key has to be part of the primary key. The index is
+        # built, and the range of the rows validated, without blocking the
+        # reads and writes, so that attaching the table does not scan it
+        op.create_index(
+            f"{LEGACY_PARTITION}_pkey",
+            "audit_log",
+            ["audit_log_id", "created_at"],
+            unique=True,
+            postgresql_concurrently=True,
+        )
+        op.execute(
+            f"ALTER TABLE audit_log ADD CONSTRAINT {LEGACY_PARTITION}_range "
+            f"CHECK (created_at IS NOT NULL AND created_at < '{legacy_end}') "
+            f"NOT VALID"
+        )
+        op.execute(
+            f"ALTER TABLE audit_log VALIDATE CONSTRAINT {LEGACY_PARTITION}_range"
+        )
+
+    # The swap, in one short transaction. SET NOT NULL and ATTACH PARTITION use
+    # the validated check instead of scanning the table
+    op.alter_column("audit_log", "created_at", nullable=False)
+    op.rename_table("audit_log", LEGACY_PARTITION)
+    op.drop_constraint("audit_log_pkey", LEGACY_PARTITION)
+    op.execute(
+        f"ALTER TABLE {LEGACY_PARTITION} ADD CONSTRAINT {LEGACY_PARTITION}_pkey "
+        f"PRIMARY KEY USING INDEX {LEGACY_PARTITION}_pkey"
+    )
+    op.execute(
+        f"ALTER INDEX ix_audit_log_created_at "
+        f"RENAME TO {LEGACY_PARTITION}_created_at_idx"
+    )
+    op.execute(
+        f"CREATE TABLE audit_log (LIKE {LEGACY_PARTITION} INCLUDING DEFAULTS) "
+        f"PARTITION BY RANGE (created_at)"
+    )
+    op.create_primary_key("audit_log_pkey", "audit_log", ["audit_log_id", "created_at"])
+    op.create_index("ix_audit_log_created_at", "audit_log", ["created_at"])
+    # The indexes of the table are attached to those of audit_log
+    op.execute(
+        f"ALTER TABLE audit_log ATTACH PARTITION {LEGACY_PARTITION} "
+        f"FOR VALUES FROM (MINVALUE) TO ('{legacy_end}')"
+    )
+    op.drop_constraint(f"{LEGACY_PARTITION}_range", LEGACY_PARTITION)
+
+    op.execute("CREATE TABLE audit_log_default PARTITION OF audit_log DEFAULT")
+    month = legacy_end
+    last_month = add_months(datetime.date(today.year, today.month, 1), MONTHS_AHEAD)
+    while month <= last_month:
+        op.execute(
+            f"CREATE TABLE audit_log_p{month.year:04d}{month.month:02d} "
+            f"PARTITION OF audit_log FOR VALUES FROM ('{month.isoformat()}') "
+            f"TO ('{add_months(month, 1).isoformat()}')"
+        )
+        month = add_months(month, 1)
+
+
+def downgrade():
+    # The rows written to the other partitions since are moved back to the
+    # table, unless it was archived
+    legacy_attached = op.get_bind().execute(
+        sa.text(
+            "SELECT 1 FROM pg_inherits "
+            "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+            "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+            "WHERE parent.relname = 'audit_log' AND child.relname = :name"
+        ),
+        {"name": LEGACY_PARTITION},
+    ).first()
+    if legacy_attached:
+        op.execute(f"ALTER TABLE audit_log DETACH PARTITION {LEGACY_PARTITION}")
+    else:
+        op.execute(
+            f"CREATE TABLE {LEGACY_PARTITION} (LIKE audit_log INCLUDING DEFAULTS)"
+        )
+        op.create_primary_key(
+            f"{LEGACY_PARTITION}_pkey", LEGACY_PARTITION, ["audit_log_id", "created_at"]
+        )
+        op.create_index(
+            f"{LEGACY_PARTITION}_created_at_idx", LEGACY_PARTITION, ["created_at"]
+        )
+    op.execute(f"INSERT INTO {LEGACY_PARTITION} SELECT * FROM audit_log")
+    # Drops the partitions with the table
+    op.drop_table("audit_log")
+
+    op.rename_table(LEGACY_PARTITION, "audit_log")
+    op.drop_constraint(f"{LEGACY_PARTITION}_pkey", "audit_log")
+    op.create_primary_key("audit_log_pkey", "audit_log", ["audit_log_id"])
+    op.execute(
+        f"ALTER INDEX {LEGACY_PARTITION}_created_at_idx "
+        f"RENAME TO ix_audit_log_created_at"
+    )
+    op.alter_column("audit_log", "created_at", nullable=True)
@@ -0,0 +1,52 @@
+"""audit_log full text search
+
+Revision ID: 20261018_audit_log_search
+Revises: 20261018_audit_log_partitions
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "20261018_audit_log_search"
+down_revision = "20261018_audit_log_partitions"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Computed by Postgres on insert, the matches in the prompt rank above
+    # those in the response
+    op.execute(
+        "ALTER TABLE audit_log ADD COLUMN search_vector tsvector GENERATED ALWAYS AS "
+        "(setweight(to_tsvector('english', prompt), 'A') || "
+        "setweight(to_tsvector('english', llm_response), 'B')) STORED"
+    )
+    op.create_index(
+        "ix_audit_log_search_vector",
+        "audit_log",
+        ["search_vector"],
+        postgresql_using="gin",
+    )
+    # Serves the keyset pagination (newest first) with and without a decision
+    op.create_index(
+        "ix_audit_log_decision_created_at",
+        "audit_log",
+        ["decision", sa.text("created_at DESC"), sa.text("audit_log_id DESC")],
+    )
+    op.create_index(
+        "ix_audit_log_created_at_id",
+        "audit_log",
+        [sa.text("created_at DESC"), sa.text("audit_log_id DESC")],
+    )
+    op.drop_index("ix_audit_log_created_at", table_name="audit_log")
+
+
+def downgrade():
+    op.create_index("ix_audit_log_created_at", "audit_log", ["created_at"])
+    op.drop_index("ix_audit_log_created_at_id", table_name="audit_log")
+    op.drop_index("ix_audit_log_decision_created_at", table_name="audit_log")
+    op.drop_index("ix_audit_log_search_vector", table_name="audit_log")
+    op.drop_column("audit_log", "search_vector")
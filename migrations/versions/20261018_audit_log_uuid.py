@@ -0,0 +1,123 @@
+"""audit_log uuid primary key
+
+Revision ID: 20261018_audit_log_uuid
+Revises: 1_init
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = "20261018_audit_log_uuid"
+down_revision = "1_init"
+branch_labels = None
+depends_on = None
+
+# Number of rows converted per transaction by the backfill
+BACKFILL_BATCH_SIZE = 10000
+
+
+def upgrade():
+    # The ids written so far are uuid4 strings. They are copied to a native
+    # uuid column that replaces the text column once it is filled, so the table
+    # is never rewritten under an exclusive lock and the existing ids stay
+    # readable throughout. New ids are UUIDv7s (app.utils.identifiers.uuid7),
+    # which sort by creation time. The text column is dropped by
+    # 20261018_audit_log_uuid_contract, the last revisions, once no instance of
+    # the previous release is left
+    op.add_column(
+        "audit_log",
+        sa.Column("audit_log_uuid", postgresql.UUID(as_uuid=False)),
+    )
+    # Fills the new column for the rows the running app inserts meanwhile
+    op.execute(
+        "CREATE FUNCTION audit_log_uuid_sync() RETURNS trigger AS $$ "
+        "BEGIN NEW.audit_log_uuid := NEW.audit_log_id::uuid; RETURN NEW; END "
+        "$$ LANGUAGE plpgsql"
+    )
+    op.execute(
+        "CREATE TRIGGER audit_log_uuid_sync BEFORE INSERT OR UPDATE OF "
+        "audit_log_id ON audit_log FOR EACH ROW EXECUTE FUNCTION "
+        "audit_log_uuid_sync()"
+    )
+
+    with op.get_context().autocommit_block():
+        # One short transaction per batch, walking the primary key
+        last_id = ""
+        while last_id is not None:
+            last_id = op.get_bind().execute(
+                sa.text(
+                    "WITH batch AS (SELECT audit_log_id FROM audit_log "
+                    "WHERE audit_log_id > :last_id ORDER BY audit_log_id "
+                    "LIMIT :batch_size), updated AS (UPDATE audit_log "
+                    "SET audit_log_uuid = audit_log.audit_log_id::uuid FROM batch "
+                    "WHERE audit_log.audit_log_id = batch.audit_log_id "
+                    "RETURNING audit_log.audit_log_id) "
+                    "SELECT max(audit_log_id) FROM updated"
+                ),
+                {"last_id": last_id, "batch_size": BACKFILL_BATCH_SIZE},
+            ).scalar()
+
+        # Built and validated without blocking the reads and writes, so that
+        # the swap below only changes the catalog
+        op.create_index(
+            "ix_audit_log_uuid",
+            "audit_log",
+            ["audit_log_uuid"],
+            unique=True,
+            postgresql_concurrently=True,
+        )
+        op.execute(
+            "ALTER TABLE audit_log ADD CONSTRAINT audit_log_uuid_not_null "
+            "CHECK (audit_log_uuid IS NOT NULL) NOT VALID"
+        )
+        op.execute("ALTER TABLE audit_log VALIDATE CONSTRAINT audit_log_uuid_not_null")
+
+    # The swap, in one short transaction. SET NOT NULL uses the validated check
+    # instead of scanning the table
+    op.alter_column("audit_log", "audit_log_uuid", nullable=False)
+    op.drop_constraint("audit_log_uuid_not_null", "audit_log")
+    op.execute("DROP TRIGGER audit_log_uuid_sync ON audit_log")
+    op.execute("DROP FUNCTION audit_log_uuid_sync()")
+    op.drop_constraint("audit_log_pkey", "audit_log")
+    op.alter_column("audit_log", "audit_log_id", new_column_name="audit_log_id_text")
+    op.alter_column("audit_log", "audit_log_id_text", nullable=True)
+    op.alter_column("audit_log", "audit_log_uuid", new_column_name="audit_log_id")
+    op.execute(
+        "ALTER TABLE audit_log ADD CONSTRAINT audit_log_pkey "
+        "PRIMARY KEY USING INDEX ix_audit_log_uuid"
+    )
+
+    # Built without blocking the inserts of the running app
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_audit_log_created_at",
+            "audit_log",
+            ["created_at"],
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "ix_audit_log_created_at",
+            table_name="audit_log",
+            postgresql_concurrently=True,
+        )
+    op.execute(
+        "UPDATE audit_log SET audit_log_id_text = audit_log_id::text "
+        "WHERE audit_log_id_text IS NULL"
+    )
+    op.drop_constraint("audit_log_pkey", "audit_log")
+    op.drop_column("audit_log", "audit_log_id")
+    op.alter_column(
+        "audit_log",
+        "audit_log_id_text",
+        new_column_name="audit_log_id",
+        nullable=False,
+    )
+    op.create_primary_key("audit_log_pkey", "audit_log", ["audit_log_id"])
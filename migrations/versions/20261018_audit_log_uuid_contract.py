@@ -0,0 +1,32 @@
+"""audit_log drop the text ids
+
+The contract step of 20261018_audit_log_uuid, applied separately: upgrade to
+20261018_audit_blob (the last expand revision) while the previous release still
+runs, deploy, and upgrade to head once no instance of the previous release is
+left. See "Upgrading the database" in the README.
+
+Revision ID: 20261018_audit_log_uuid_contract
+Revises: 20261018_audit_blob
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "20261018_audit_log_uuid_contract"
+down_revision = "20261018_audit_blob"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Run once no instance of the app reads audit_log_id_text any more, the
+    # column is only dropped from the catalog
+    op.drop_column("audit_log", "audit_log_id_text")
+
+
+def downgrade():
+    op.add_column("audit_log", sa.Column("audit_log_id_text", sa.String()))
+    op.execute("UPDATE audit_log SET audit_log_id_text = audit_log_id::text")
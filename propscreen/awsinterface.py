@@ -1,13 +1,129 @@
 import boto3
 from botocore.exceptions import ClientError
+import os
+import threading
+import time
 
-def get_s3_object_contents(bucket_name, object_key) -> list:
+# Number of seconds a cached S3 object is used before it is revalidated
+S3_CACHE_TTL = float(os.environ.get('S3_CACHE_TTL', 60))
+
+class CachedS3Object:
     """
     Description
     -----------
-    
-    Gets the entries in an S3 object, decodes them, and formats them into a list
-    that is returned
+    An entry of the S3ObjectCache, it holds the parsed contents of an S3 object
+    together with the ETag of the version that was parsed.
+
+    Parameters
+    ----------
+    value : object
+        The parsed contents of the S3 object
+    etag : str
+        The ETag of the S3 object the value was parsed from
+    checked_at : float
+        The time.monotonic() timestamp of the last (re)validation
+    """
+
+    def __init__(self, value, etag: str, checked_at: float):
+        self.value = value
+        self.etag = etag
+        self.checked_at = checked_at
+
+class S3ObjectCache:
+    """
+    Description
+    -----------
+    Keeps the parsed contents of S3 objects in memory. An entry is used as is 
+    for ttl seconds, after that a conditional GET (IfNoneMatch with the cached 
+    ETag) is sent and the object is only downloaded and parsed again when it 
+    has actually changed. If the revalidation fails the cached value keeps being
+    used until the next attempt.
+
+    Parameters
+    ----------
+    ttl : float
+        The number of seconds an entry is used before it is revalidated
+    """
+
+    def __init__(self, ttl: float = S3_CACHE_TTL):
+        self.ttl = ttl
+        self._entries = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def get(self, bucket_name, object_key, parser) -> CachedS3Object:
+        """
+        Description
+        -----------
+        Returns the cache entry of an S3 object, downloading or revalidating it
+        when needed.
+
+        Parameters
+        ----------
+        bucket_name : str
+            The name of the AWS S3 Bucket that the target object resides in
+        object_key : str
+            The name of the particular object that is going to be read 
+        parser : callable
+            The function that turns the bytes of the object into the value that
+            is cached, the same object read with another parser is cached 
+            separately
+
+        Returns
+        -------
+        entry : CachedS3Object
+            The cached entry, entry.value is shared and must not be modified
+        """
+        key = (bucket_name, object_key, parser)
+        entry = self._entries.get(key)
+        if entry is not None and time.monotonic() - entry.checked_at < self.ttl:
+            return entry
+
+        with self._lock:
+            key_lock = self._locks.setdefault(key, threading.Lock())
+
+        with key_lock:
+            # Another thread may have refreshed the entry while this one waited
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry.checked_at < self.ttl:
+                return entry
+
+            try:
+                body, etag = download_s3_object(bucket_name, object_key,
+                                                entry.etag if entry else None)
+            except Exception as e:
+                if entry is None:
+                    raise
+                print(f"Error: revalidation of {bucket_name}/{object_key} \
+failed, using the cached version: {str(e)}", flush=True)
+                entry.checked_at = time.monotonic()
+                return entry
+
+            if body is None:
+                entry.checked_at = time.monotonic()
+            else:
+                entry = CachedS3Object(parser(body), etag, time.monotonic())
+                self._entries[key] = entry
+            return entry
+
+    def invalidate(self, bucket_name, object_key):
+        """
+        Drops every cached entry of an S3 object, the next get downloads it again.
+        """
+        with self._lock:
+            for key in list(self._entries):
+                if key[:2] == (bucket_name, object_key):
+                    del self._entries[key]
+
+# The cache shared by every request in the process
+s3_object_cache = S3ObjectCache()
+
+def download_s3_object(bucket_name, object_key, etag=None) -> tuple:
+    """
+    Description
+    -----------
+    Downloads an S3 object, when an ETag is given the download is conditional 
+    and nothing is downloaded if the object still has that ETag.
 
     Parameters
     ----------
@@ -15,29 +131,73 @@ def get_s3_object_contents(bucket_name, object_key) -> list:
         The name of the AWS S3 Bucket that the target object resides in
     object_key : str
         The name of the particular object that is going to be read 
+    etag : str
+        The ETag of the version of the object that is already known
 
     Returns
     -------
-    entires : list
-        The list of all the individual elements of the S3 object
+    body, etag : tuple
+        The bytes of the object and its ETag, the bytes are None if the object
+        has not been modified
     """
-    # Initialize the S3 client
     s3 = boto3.client('s3')
 
-    # Get the object
-    response = s3.get_object(Bucket=bucket_name, Key=object_key)
+    try:
+        if etag:
+            response = s3.get_object(Bucket=bucket_name, Key=object_key,
+                                     IfNoneMatch=etag)
+        else:
+            response = s3.get_object(Bucket=bucket_name, Key=object_key)
+    except ClientError as e:
+        status_code = e.response.get('ResponseMetadata', {}).get('HTTPStatusCode')
+        if etag and (status_code == 304 or e.response.get('Error', {})\
+                .get('Code') in ('304', 'NotModified')):
+            return None, etag
+        raise
 
-    # The entries of the object are in the 'Body' of the response
-    entries_in_bytes = response['Body'].read()
+    return response['Body'].read(), response.get('ETag')
 
-    # Decode the bytes to string and split it into a list
-    entries = entries_in_bytes.decode('utf-8').split('\n')
+def parse_s3_object_entries(body: bytes) -> list:
+    """
+    Decodes the bytes of an S3 object and splits them into a list of lines
+    """
+    return body.decode('utf-8').split('\n')
 
-    return entries
+def parse_csv_entries(body: bytes) -> list:
+    """
+    Decodes the bytes of a CSV S3 object and splits them into the list of its 
+    non empty items, line breaks and commas both separate items
+    """
+    items = body.decode('utf-8').replace('\r', '\n').replace(',', '\n')
+    return list(filter(None, items.split('\n')))
+
+def get_s3_object_contents(bucket_name, object_key) -> list:
+    """
+    Description
+    -----------
+    
+    Gets the entries in an S3 object, decodes them, and formats them into a list
+    that is returned. The entries are served from the S3ObjectCache.
+
+    Parameters
+    ----------
+    bucket_name : str
+        The name of the AWS S3 Bucket that the target object resides in
+    object_key : str
+        The name of the particular object that is going to be read 
+
+    Returns
+    -------
+    entires : list
+        The list of all the individual elements of the S3 object
+    """
+    entry = s3_object_cache.get(bucket_name, object_key, parse_s3_object_entries)
+    return list(entry.value)
 
 def clean_s3_object_contents(bucket_name, object_key):    
     """
-    Cleans and formats the data of a CSV S3 object to be read 
+    Cleans and formats the data of a CSV S3 object to be read, the parsed data
+    is served from the S3ObjectCache
 
     Parameters
     ----------
@@ -47,35 +207,11 @@ def clean_s3_object_contents(bucket_name, object_key):
         The name of the S3 object that is going to be accessed
     Returns
     -------
-    really_the_final_list : list
+    entries : list
         The of the items of the S3 bucket
     """
-    entries = get_s3_object_contents(bucket_name, object_key)
-
-    divided_data = []
-
-    for item in entries:
-        temp = item.split(',')
-        temp = item.split('\r')
-        divided_data.append(temp)
-
-    final_list = []
-    for inner_list in divided_data:
-        final_list.extend(inner_list)
-
-
-    true_final_list = []
-    for item in final_list:
-        temp = item.split(',')
-        true_final_list.append(temp)
-
-    really_the_final_list = []
-    for inner_list in true_final_list:
-        really_the_final_list.extend(inner_list)
-
-    really_the_final_list = list(filter(None,really_the_final_list))
-
-    return really_the_final_list
+    entry = s3_object_cache.get(bucket_name, object_key, parse_csv_entries)
+    return list(entry.value)
 
 def add_entry_to_s3_bucket(bucket_name, file_name, data) -> bool:
     """
@@ -109,4 +245,29 @@ def add_entry_to_s3_bucket(bucket_name, file_name, data) -> bool:
         s3.Bucket(bucket_name).put_object(Key=file_name, Body=data)
         return True
     except:
-        return False
\ No newline at end of file
+        return False
+
+
+def upload_file_to_s3_bucket(bucket_name, object_key, path):
+    """
+    Description
+    -----------
+    Uploads a local file to the S3 bucket. Large files are uploaded in parts,
+    so the file is never read into memory at once.
+
+    Parameters
+    ----------
+    bucket_name : str
+        The name of the S3 Bucket that receives the file
+    object_key : str
+        The key of the new object
+    path : str
+        The path of the local file
+
+    Raises
+    ------
+    boto3.exceptions.S3UploadFailedError
+        When the upload fails, the caller must not delete the source data
+    """
+    s3 = boto3.client('s3')
+    s3.upload_file(path, bucket_name, object_key)
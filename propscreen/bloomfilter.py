@@ -0,0 +1,208 @@
+import math
+import mmap
+import numpy as np
+import os
+import struct
+
+###############
+# BLOOMFILTER #
+###############
+"""
+bloomfilter holds the compact, probabilistic filters that are checked before
+the exact store of hashed organizational sensitive information. A filter never
+misses a hash that was added to it, so only the tokens it reports as possible
+hits need the exact lookup, and most tokens of a response are ordinary words
+that stop at the filter.
+"""
+
+# Header of a saved filter: magic, number of bits, number of positions per
+# digest, number of digests, target false positive rate and the build id of the
+# hash index file the filter was built for
+BLOOM_FILTER_MAGIC = b"PSBLOOM1"
+BLOOM_FILTER_HEADER = struct.Struct("<8sQIQd8s")
+
+class BloomFilter:
+    """
+    Description
+    -----------
+    A Bloom filter of raw SHA-256 digests. The digests are already uniformly
+    distributed, so the bit positions are taken from the digest itself with
+    double hashing (the first two 8 byte words of the digest) instead of
+    hashing it again. The number of bits and of positions per digest are sized
+    from the expected number of digests and the target false positive rate.
+
+    Parameters
+    ----------
+    capacity : int
+        The number of digests the filter is sized for
+    fp_rate : float
+        The target rate of digests that were not added but are reported as
+        possible hits, e.g. 0.001 for one in a thousand
+    """
+
+    def __init__(self, capacity: int, fp_rate: float = 0.001):
+        if not 0 < fp_rate < 1:
+            raise ValueError(f"The false positive rate must be between 0 and 1, \
+got {fp_rate}")
+        capacity = max(1, capacity)
+
+        # Optimal sizes: m = -n ln(p) / ln(2)^2 bits and k = m / n ln(2) positions
+        self.num_bits = max(8, math.ceil(-capacity * math.log(fp_rate)
+                                         / math.log(2) ** 2))
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self.capacity = capacity
+        self.fp_rate = fp_rate
+        self.count = 0
+        self.build_id = bytes(8)
+        self._bits = bytearray((self.num_bits + 7) // 8)
+
+    def _positions(self, digest: bytes):
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:16], 'little') | 1
+        num_bits = self.num_bits
+        return [(h1 + i * h2) % num_bits for i in range(self.num_hashes)]
+
+    def add(self, digest: bytes):
+        """
+        Adds a raw SHA-256 digest to the filter
+        """
+        bits = self._bits
+        for position in self._positions(digest):
+            bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, digest: bytes) -> bool:
+        bits = self._bits
+        for position in self._positions(digest):
+            if not bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+    def contains_many(self, digests: list):
+        """
+        Description
+        -----------
+        Probes the filter for a batch of raw SHA-256 digests. The bit positions
+        of the whole batch are computed and tested with numpy, so a batch costs
+        a few array operations instead of num_hashes bit tests per digest in
+        Python. The positions are the same as those of add().
+
+        Parameters
+        ----------
+        digests : list
+            The raw 32 byte digests
+
+        Returns
+        -------
+        passes : numpy.ndarray
+            One boolean per digest, False where the digest was certainly not
+            added to the filter
+        """
+        if not digests:
+            return np.zeros(0, dtype=bool)
+        words = np.frombuffer(b''.join(digests), dtype='<u8').reshape(len(digests), -1)
+        num_bits = np.uint64(self.num_bits)
+        # (h1 + i * h2) % num_bits, computed from h1 % num_bits and h2 % num_bits
+        # so that it cannot overflow 64 bits
+        h1 = words[:, 0] % num_bits
+        h2 = (words[:, 1] | np.uint64(1)) % num_bits
+        steps = np.arange(self.num_hashes, dtype=np.uint64)
+        positions = (h1[:, None] + steps * h2[:, None]) % num_bits
+        bits = np.frombuffer(self._bits, dtype=np.uint8)
+        masks = np.left_shift(np.uint8(1), (positions & np.uint64(7)).astype(np.uint8))
+        return np.all(bits[positions >> np.uint64(3)] & masks, axis=1)
+
+    def __len__(self) -> int:
+        return self.count
+
+    @property
+    def size_in_bytes(self) -> int:
+        """
+        The memory taken by the bits of the filter
+        """
+        return len(self._bits)
+
+    @classmethod
+    def from_digests(cls, digests, fp_rate: float = 0.001):
+        """
+        Description
+        -----------
+        Creates a filter sized for the digests and adds all of them.
+
+        Parameters
+        ----------
+        digests : collection
+            The raw SHA-256 digests, it must support len()
+        fp_rate : float
+            The target false positive rate
+
+        Returns
+        -------
+        bloom_filter : BloomFilter
+            The filter holding the digests
+        """
+        bloom_filter = cls(len(digests), fp_rate)
+        for digest in digests:
+            bloom_filter.add(digest)
+        return bloom_filter
+
+    def save(self, path: str):
+        """
+        Description
+        -----------
+        Writes the filter to a file that load() maps back. The file is written
+        next to the destination and then renamed over it.
+
+        Parameters
+        ----------
+        path : str
+            The path of the filter file
+        """
+        temp_path = f"{path}.tmp{os.getpid()}"
+        with open(temp_path, 'wb') as f:
+            f.write(BLOOM_FILTER_HEADER.pack(BLOOM_FILTER_MAGIC, self.num_bits,
+                                             self.num_hashes, self.count,
+                                             self.fp_rate, self.build_id))
+            f.write(self._bits)
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path: str):
+        """
+        Description
+        -----------
+        Opens a filter written by save(). The bits are memory-mapped read-only,
+        so the workers on a host share one copy of them in the page cache and
+        the filter cannot be added to.
+
+        Parameters
+        ----------
+        path : str
+            The path of the filter file
+
+        Returns
+        -------
+        bloom_filter : BloomFilter
+            The filter
+        """
+        with open(path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size < BLOOM_FILTER_HEADER.size:
+                raise ValueError(f"{path} is not a Bloom filter, it is too short")
+            bits_map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, num_bits, num_hashes, count, fp_rate, build_id = \
+            BLOOM_FILTER_HEADER.unpack_from(bits_map)
+        if magic != BLOOM_FILTER_MAGIC:
+            raise ValueError(f"{path} is not a Bloom filter")
+        if len(bits_map) - BLOOM_FILTER_HEADER.size < (num_bits + 7) // 8:
+            raise ValueError(f"{path} is truncated")
+
+        bloom_filter = cls.__new__(cls)
+        bloom_filter.num_bits = num_bits
+        bloom_filter.num_hashes = num_hashes
+        bloom_filter.capacity = count
+        bloom_filter.fp_rate = fp_rate
+        bloom_filter.count = count
+        bloom_filter.build_id = build_id
+        bloom_filter._bits = memoryview(bits_map)[BLOOM_FILTER_HEADER.size:]
+        return bloom_filter
@@ -0,0 +1,151 @@
+from collections import deque
+
+##################
+# CONTEXTMATCHER #
+##################
+"""
+contextmatcher holds an Aho-Corasick automaton that is built once from the
+context strings and then finds every context string that occurs in an LLM's
+response with a single pass over the response, instead of one substring search
+per context string.
+"""
+
+class ContextMatcher:
+    """
+    Description
+    -----------
+    Case insensitive multi-pattern matcher. The patterns are lowercased and
+    stored in a trie whose nodes are linked with failure links (Aho-Corasick),
+    so scanning a text costs O(length of the text + number of matches) no matter
+    how many patterns there are. A pattern is identified by its position in the
+    list the matcher was built from.
+
+    Parameters
+    ----------
+    patterns : list
+        The context strings to search for
+    """
+
+    def __init__(self, patterns: list):
+        self.patterns = list(patterns)
+
+        # State 0 is the root of the trie, for every state _goto holds its
+        # transitions, _fail its failure link and _out the ids of the patterns
+        # that end at that state (including the ones reached by failure links)
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [[]]
+
+        for pattern_id, pattern in enumerate(self.patterns):
+            state = 0
+            for char in pattern.lower():
+                next_state = self._goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto[state][char] = next_state
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                state = next_state
+            self._out[state].append(pattern_id)
+
+        # Breadth first walk of the trie to set the failure links, the failure
+        # link of a state points to the longest proper suffix of its path that
+        # is also a path in the trie
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail_state = self._fail[state]
+                while fail_state and char not in self._goto[fail_state]:
+                    fail_state = self._fail[fail_state]
+                fail_state = self._goto[fail_state].get(char, 0)
+                if fail_state == next_state:
+                    fail_state = 0
+                self._fail[next_state] = fail_state
+                self._out[next_state] = self._out[next_state] + self._out[fail_state]
+
+    def find(self, text: str) -> list:
+        """
+        Description
+        -----------
+        Scans the text once and returns the ids of the patterns that occur in
+        it.
+
+        Parameters
+        ----------
+        text : str
+            The text to be scanned, usually the LLM's response
+
+        Returns
+        -------
+        pattern_ids : list
+            The sorted ids of the patterns found in the text
+        """
+        # Patterns that are empty strings are found in any text
+        found = set(self._out[0])
+        state, chunk_found = self.scan(text)
+        found.update(chunk_found)
+        return sorted(found)
+
+    def scan(self, text: str, state: int = 0) -> tuple:
+        """
+        Description
+        -----------
+        Resumable version of find, used to scan a text that arrives in chunks.
+        Passing the state returned for one chunk to the scan of the next chunk 
+        finds the patterns that span the boundary between the two chunks.
+
+        Parameters
+        ----------
+        text : str
+            The next chunk of the text to be scanned
+        state : int
+            The state returned by the scan of the previous chunk, 0 for the 
+            first chunk
+
+        Returns
+        -------
+        state, pattern_ids : tuple
+            The state to resume from and the set of ids of the patterns that 
+            end in this chunk (empty patterns are not included)
+        """
+        goto = self._goto
+        fail = self._fail
+        out = self._out
+
+        found = set()
+        for char in text.lower():
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if out[state]:
+                found.update(out[state])
+        return state, found
+
+    def matches(self, text: str) -> list:
+        """
+        Description
+        -----------
+        Returns one boolean per pattern, True where the pattern occurs in the
+        text. This is the same result as checking each pattern with
+        pattern.lower() in text.lower().
+
+        Parameters
+        ----------
+        text : str
+            The text to be scanned, usually the LLM's response
+
+        Returns
+        -------
+        pattern_found : list
+            The list of boolean values, in the same order as the patterns
+        """
+        pattern_found = [False] * len(self.patterns)
+        for pattern_id in self.find(text):
+            pattern_found[pattern_id] = True
+        return pattern_found
+
+    def __len__(self) -> int:
+        return len(self.patterns)
@@ -0,0 +1,166 @@
+from collections import OrderedDict
+import sys
+import threading
+import time
+
+#################
+# DECISIONCACHE #
+#################
+"""
+decisioncache holds the decisions that sensitive_info_check has already made,
+keyed by a digest of the model output, so that an answer the RAG returns again
+is decided with a dictionary lookup instead of running the checks again. The
+cache is tied to the version of the reference data (the hashes and the context
+strings) and is emptied as soon as that version changes. The same cache holds
+the LLM Guard results of the sentences of the responses, see scanners.
+"""
+
+# Estimated memory of an entry on top of its key and value: the OrderedDict
+# node and the (value, expires_at, size) tuple
+ENTRY_OVERHEAD = 200
+
+class DecisionCache:
+    """
+    Description
+    -----------
+    Thread safe LRU cache with a time to live and a memory cap. The least
+    recently used entries are evicted once there are more than max_entries
+    entries or their estimated size is more than max_bytes, and an entry older
+    than ttl seconds is treated as a miss.
+
+    Parameters
+    ----------
+    max_entries : int
+        The maximum number of entries, 0 disables the cache
+    ttl : float
+        The number of seconds an entry is used
+    max_bytes : int
+        The maximum estimated memory of the entries
+    """
+
+    def __init__(self, max_entries: int = 10000, ttl: float = 300,
+                 max_bytes: int = 16 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.version = None
+
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def _check_version(self, version):
+        # Called with the lock held, a new version of the reference data makes
+        # every cached decision stale
+        if version != self.version:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self._bytes = 0
+            self.version = version
+
+    def get(self, key, version):
+        """
+        Description
+        -----------
+        Returns the cached value of the key, or None when it is not cached, has
+        expired or was stored for another version of the reference data.
+
+        Parameters
+        ----------
+        key : hashable
+            The key, usually the digest of the model output
+        version : hashable
+            The current version of the reference data
+        """
+        if not self.max_entries:
+            return None
+        with self._lock:
+            self._check_version(version)
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, expires_at, size = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                self._bytes -= size
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value, version, size: int = None):
+        """
+        Description
+        -----------
+        Stores the value of the key for the version of the reference data and
+        evicts the least recently used entries that do not fit any more.
+
+        Parameters
+        ----------
+        key : hashable
+            The key, usually the digest of the model output
+        value : object
+            The value to cache
+        version : hashable
+            The version of the reference data the value was computed with
+        size : int
+            The estimated memory of the value, sys.getsizeof(value) by default
+        """
+        if not self.max_entries:
+            return
+        if size is None:
+            size = sys.getsizeof(value)
+        size += sys.getsizeof(key) + ENTRY_OVERHEAD
+        with self._lock:
+            self._check_version(version)
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[2]
+            self._entries[key] = (value, time.monotonic() + self.ttl, size)
+            self._bytes += size
+            while self._entries and (len(self._entries) > self.max_entries
+                                     or self._bytes > self.max_bytes):
+                _, (_, _, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    def clear(self):
+        """
+        Empties the cache, the counters are kept
+        """
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        """
+        Returns the counters and the size of the cache
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
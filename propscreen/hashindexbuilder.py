@@ -0,0 +1,295 @@
+from functools import partial
+import datetime
+import hashlib
+import heapq
+import json
+import os
+import tempfile
+
+# Imports for the normalization of the tokens and the hash index format
+import propscreen.sihasher as sihasher
+import propscreen.hashstore as hashstore
+from propscreen.bloomfilter import BloomFilter
+from propscreen.phrasematcher import PhraseFingerprints
+
+####################
+# HASHINDEXBUILDER #
+####################
+"""
+hashindexbuilder builds the runtime artifacts of the hashed organizational
+sensitive information offline: the hash index file of sorted digests, its Bloom
+filter, the fingerprints of the longer phrases and a manifest describing the
+build. The inputs are plaintext sensitive
+information, normalized exactly as check_hashes normalizes the tokens of a
+response, and existing CSVs of hex hashes. The inputs are streamed and sorted
+in runs on disk, so they can be larger than the memory of the machine.
+"""
+
+# Number of bytes read at a time from a CSV of hashes
+READ_SIZE = 1 << 20
+
+def iter_plaintext_digests(path: str, counts: dict,
+                           phrase_fingerprints: PhraseFingerprints = None,
+                           max_phrase_tokens: int = 2):
+    """
+    Description
+    -----------
+    Yields the digest of every piece of sensitive information in a plaintext
+    file, one piece per line. A line is one token or tokens separated by
+    spaces, it is normalized with sihasher.normalize_phrase. Lines that are
+    empty once normalized are skipped, since they would match the empty tokens
+    of any response that contains two spaces in a row. The phrases of three to
+    max_phrase_tokens tokens are added to the phrase fingerprints.
+
+    Parameters
+    ----------
+    path : str
+        The path of the plaintext file
+    counts : dict
+        Updated with the number of entries, skipped entries, phrases and 
+        phrases of more than max_phrase_tokens tokens, that cannot be matched
+    phrase_fingerprints : PhraseFingerprints
+        The fingerprints the phrases of three or more tokens are added to
+    max_phrase_tokens : int
+        The number of tokens of the longest phrase that is matched
+    """
+    with open(path, encoding='utf-8-sig') as f:
+        for line in f:
+            phrase = line.strip()
+            if not phrase:
+                continue
+            counts["entries"] += 1
+            candidate = sihasher.normalize_phrase(phrase)
+            if not candidate:
+                counts["skipped"] += 1
+                continue
+            tokens = phrase.split(' ')
+            if len(tokens) > max_phrase_tokens:
+                counts["long_phrases"] += 1
+            elif len(tokens) > 2 and phrase_fingerprints is not None:
+                phrase_fingerprints.add(tokens)
+                counts["phrases"] += 1
+            yield hashlib.sha256(candidate.encode('utf-8')).digest()
+
+def iter_hash_csv_digests(path: str, counts: dict):
+    """
+    Description
+    -----------
+    Yields the digests of a CSV of hex encoded SHA-256 hashes, separated by
+    commas or line breaks. The file is read in blocks, so it is never held in
+    memory at once.
+
+    Parameters
+    ----------
+    path : str
+        The path of the CSV file
+    counts : dict
+        Updated with the number of entries and of entries that are not valid
+        SHA-256 hashes
+    """
+    remainder = ""
+    with open(path, encoding='utf-8-sig') as f:
+        for block in iter(partial(f.read, READ_SIZE), ""):
+            entries = (remainder + block).replace("\r", "\n").replace("\n", ",")\
+                .replace("\ufeff", "").split(',')
+            remainder = entries.pop()
+            yield from _parse_hash_entries(entries, counts)
+    yield from _parse_hash_entries([remainder], counts)
+
+def _parse_hash_entries(entries: list, counts: dict):
+    for entry in entries:
+        if not entry.strip():
+            continue
+        counts["entries"] += 1
+        digest = sihasher.hex_to_digest(entry)
+        if digest is None:
+            counts["invalid"] += 1
+            continue
+        yield digest
+
+def write_sorted_runs(digests, run_dir: str, run_size: int) -> list:
+    """
+    Description
+    -----------
+    Splits the digests into runs of at most run_size digests, sorts every run
+    in memory and writes it to its own file.
+
+    Parameters
+    ----------
+    digests : iterable
+        The raw 32 byte digests
+    run_dir : str
+        The directory the run files are written to
+    run_size : int
+        The maximum number of digests held in memory
+
+    Returns
+    -------
+    run_paths : list
+        The paths of the run files
+    """
+    run_paths = []
+    run = set()
+
+    def flush():
+        run_path = os.path.join(run_dir, f"run{len(run_paths)}")
+        with open(run_path, 'wb') as f:
+            f.writelines(sorted(run))
+        run_paths.append(run_path)
+        run.clear()
+
+    for digest in digests:
+        run.add(digest)
+        if len(run) >= run_size:
+            flush()
+    if run or not run_paths:
+        flush()
+    return run_paths
+
+def merge_sorted_runs(run_files: list):
+    """
+    Yields the digests of the sorted run files in ascending order, without
+    duplicates
+    """
+    runs = [iter(partial(f.read, hashstore.DIGEST_SIZE), b"") for f in run_files]
+    previous = None
+    for digest in heapq.merge(*runs):
+        if digest != previous:
+            yield digest
+            previous = digest
+
+def file_sha256(path: str) -> str:
+    """
+    Returns the hex SHA-256 checksum of a file, read in blocks
+    """
+    checksum = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(partial(f.read, READ_SIZE), b""):
+            checksum.update(block)
+    return checksum.hexdigest()
+
+def manifest_path(path: str) -> str:
+    """
+    Returns the path of the manifest written next to a hash index file
+    """
+    return os.path.splitext(path)[0] + ".manifest.json"
+
+def build_hash_index(output_path: str, plaintext_paths=(), hash_csv_paths=(),
+                     fp_rate: float = 0.001, run_size: int = 500000,
+                     temp_dir: str = None,
+                     max_phrase_tokens: int = sihasher.SI_MAX_PHRASE_TOKENS) -> dict:
+    """
+    Description
+    -----------
+    Builds the hash index file, its Bloom filter and its manifest from the
+    inputs. The digests are sorted in runs of run_size on disk and the runs are
+    merged into the hash index file. The fingerprints of the plaintext phrases
+    of three to max_phrase_tokens tokens are kept in memory, they are written
+    with the Bloom filter before the hash index file is renamed into place, so
+    a worker that maps the new file finds the companions built for it.
+
+    Parameters
+    ----------
+    output_path : str
+        The path of the hash index file, the filter (.bloom) and the manifest
+        (.manifest.json) are written next to it
+    plaintext_paths : list
+        The paths of plaintext files of sensitive information, one per line
+    hash_csv_paths : list
+        The paths of CSV files of hex encoded SHA-256 hashes
+    fp_rate : float
+        The target false positive rate of the Bloom filter, 0 for no filter
+    run_size : int
+        The maximum number of digests held in memory while sorting
+    temp_dir : str
+        The directory of the run files, the system default when not set
+    max_phrase_tokens : int
+        The number of tokens of the longest phrase that is matched
+
+    Returns
+    -------
+    manifest : dict
+        The manifest that was written
+    """
+    inputs = []
+    sources = []
+    phrase_fingerprints = PhraseFingerprints()
+    for path in plaintext_paths:
+        counts = {"entries": 0, "skipped": 0, "phrases": 0, "long_phrases": 0}
+        inputs.append({"path": path, "type": "plaintext", "counts": counts})
+        sources.append(iter_plaintext_digests(path, counts, phrase_fingerprints,
+                                              max_phrase_tokens))
+    for path in hash_csv_paths:
+        counts = {"entries": 0, "invalid": 0}
+        inputs.append({"path": path, "type": "hashes", "counts": counts})
+        sources.append(iter_hash_csv_digests(path, counts))
+
+    output_dir = os.path.dirname(os.path.abspath(output_path))
+    root, extension = os.path.splitext(output_path)
+    temp_index_path = f"{root}.tmp{os.getpid()}{extension}"
+    build_id = os.urandom(8)
+
+    with tempfile.TemporaryDirectory(dir=temp_dir) as run_dir:
+        run_paths = write_sorted_runs((digest for source in sources
+                                       for digest in source), run_dir, run_size)
+        run_files = [open(run_path, 'rb') for run_path in run_paths]
+        try:
+            count = hashstore.write_sorted_hash_index(
+                temp_index_path, merge_sorted_runs(run_files), build_id)
+        finally:
+            for run_file in run_files:
+                run_file.close()
+
+    bloom_manifest = None
+    if fp_rate:
+        mapped_digests = hashstore.MappedDigests(temp_index_path)
+        bloom_filter = BloomFilter(count, fp_rate)
+        for digest in mapped_digests:
+            bloom_filter.add(digest)
+        mapped_digests.close()
+        bloom_filter.build_id = build_id
+        bloom_path = hashstore.bloom_filter_path(output_path)
+        bloom_filter.save(bloom_path)
+        bloom_manifest = {
+            "path": os.path.relpath(bloom_path, output_dir),
+            "bytes": os.path.getsize(bloom_path),
+            "sha256": file_sha256(bloom_path),
+            "fp_rate": fp_rate,
+            "num_bits": bloom_filter.num_bits,
+            "num_hashes": bloom_filter.num_hashes,
+        }
+
+    phrases_manifest = None
+    if len(phrase_fingerprints):
+        phrase_fingerprints.build_id = build_id
+        phrases_path = hashstore.phrases_path(output_path)
+        phrase_fingerprints.save(phrases_path)
+        phrases_manifest = {
+            "path": os.path.relpath(phrases_path, output_dir),
+            "bytes": os.path.getsize(phrases_path),
+            "sha256": file_sha256(phrases_path),
+            "fingerprints": len(phrase_fingerprints),
+            "lengths": phrase_fingerprints.lengths,
+        }
+
+    index_manifest = {
+        "path": os.path.relpath(output_path, output_dir),
+        "bytes": os.path.getsize(temp_index_path),
+        "sha256": file_sha256(temp_index_path),
+        "format_version": hashstore.HASH_INDEX_FORMAT_VERSION,
+    }
+    os.replace(temp_index_path, output_path)
+
+    manifest = {
+        "build_id": build_id.hex(),
+        "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "hashes": count,
+        "strip_chars": sihasher.STRIP_CHARS,
+        "inputs": inputs,
+        "index": index_manifest,
+        "bloom_filter": bloom_manifest,
+        "phrases": phrases_manifest,
+    }
+    with open(manifest_path(output_path), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
@@ -0,0 +1,261 @@
+import hashlib
+import mmap
+import numpy as np
+import os
+import struct
+import threading
+
+# Imports for the Bloom filter and the phrase fingerprints saved next to a hash
+# index file
+from propscreen.bloomfilter import BloomFilter
+from propscreen.phrasematcher import PhraseFingerprints
+
+#############
+# HASHSTORE #
+#############
+"""
+hashstore holds the on-disk format of the hashed organizational sensitive
+information: a small header followed by the sorted raw 32 byte SHA-256 digests.
+The file is opened with mmap and searched in place, so loading it is instant
+whatever its size, and every worker on a host that opens the same file shares
+one copy of it in the page cache. A Bloom filter of the same digests (.bloom
+extension) and the fingerprints of the phrases of three or more tokens
+(.phrases extension) can be saved next to the file.
+"""
+
+# Header: magic, format version, digest size, number of digests and a random
+# build id that ties the file to its Bloom filter, 32 bytes so that the digests
+# that follow are aligned
+HASH_INDEX_MAGIC = b"PSHASHIX"
+HASH_INDEX_FORMAT_VERSION = 1
+HASH_INDEX_HEADER = struct.Struct("<8sHHIQ8s")
+DIGEST_SIZE = hashlib.sha256().digest_size
+
+class MappedDigests:
+    """
+    Description
+    -----------
+    Read-only, memory-mapped view of a hash index file. Lookups binary search
+    the mapped digests without copying the file into the process. The Bloom
+    filter and the phrase fingerprints saved next to the file are loaded as
+    bloom_filter and phrase_fingerprints when they were built for this file,
+    otherwise they are None.
+
+    Parameters
+    ----------
+    path : str
+        The path of the hash index file
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as f:
+            stat = os.fstat(f.fileno())
+            self.version = f"{stat.st_ino}-{stat.st_mtime_ns}-{stat.st_size}"
+            if stat.st_size < HASH_INDEX_HEADER.size:
+                raise ValueError(f"{path} is not a hash index, it is too short")
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, format_version, digest_size, _, count, self.build_id = \
+            HASH_INDEX_HEADER.unpack_from(self._map)
+        if magic != HASH_INDEX_MAGIC:
+            raise ValueError(f"{path} is not a hash index")
+        if format_version != HASH_INDEX_FORMAT_VERSION or digest_size != DIGEST_SIZE:
+            raise ValueError(f"{path} has the unsupported format version \
+{format_version} (digest size {digest_size})")
+        if HASH_INDEX_HEADER.size + count * DIGEST_SIZE > len(self._map):
+            raise ValueError(f"{path} is truncated")
+        self._count = count
+        self.bloom_filter = self._load_companion(bloom_filter_path(path),
+                                                 BloomFilter.load)
+        self.phrase_fingerprints = self._load_companion(phrases_path(path),
+                                                        PhraseFingerprints.load)
+
+    def _load_companion(self, companion_path: str, load):
+        if not os.path.exists(companion_path):
+            return None
+        companion = load(companion_path)
+        if companion.build_id != self.build_id or self.build_id == bytes(8):
+            print(f"DEBUG: {companion_path} was not built for {self.path}, it is \
+not used", flush=True)
+            return None
+        return companion
+
+    def __contains__(self, digest: bytes) -> bool:
+        data = self._map
+        offset = HASH_INDEX_HEADER.size
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            start = offset + middle * DIGEST_SIZE
+            entry = data[start:start + DIGEST_SIZE]
+            if entry < digest:
+                low = middle + 1
+            elif entry > digest:
+                high = middle
+            else:
+                return True
+        return False
+
+    def contains_many(self, digests: list) -> list:
+        """
+        Returns one boolean per raw SHA-256 digest, True where the digest is in
+        the file, see contains_sorted
+        """
+        return contains_sorted(np.frombuffer(self._map, dtype=f"S{DIGEST_SIZE}",
+                                             count=self._count,
+                                             offset=HASH_INDEX_HEADER.size),
+                               digests)
+
+    def __iter__(self):
+        data = self._map
+        offset = HASH_INDEX_HEADER.size
+        for start in range(offset, offset + self._count * DIGEST_SIZE, DIGEST_SIZE):
+            yield data[start:start + DIGEST_SIZE]
+
+    def __len__(self) -> int:
+        return self._count
+
+    @property
+    def size_in_bytes(self) -> int:
+        return len(self._map)
+
+    def close(self):
+        self._map.close()
+
+def contains_sorted(sorted_digests, digests: list) -> list:
+    """
+    Description
+    -----------
+    Looks a batch of raw SHA-256 digests up in a sorted array of digests with
+    one vectorised binary search, instead of one binary search in Python per
+    digest.
+
+    Parameters
+    ----------
+    sorted_digests : numpy.ndarray
+        The digests in ascending order, of dtype S32
+    digests : list
+        The raw 32 byte digests to look up
+
+    Returns
+    -------
+    hits : list
+        One boolean per digest, True where it is in sorted_digests
+    """
+    if not digests or not len(sorted_digests):
+        return [False] * len(digests)
+    queries = np.array(digests, dtype=f"S{DIGEST_SIZE}")
+    positions = np.searchsorted(sorted_digests, queries)
+    np.minimum(positions, len(sorted_digests) - 1, out=positions)
+    return (sorted_digests[positions] == queries).tolist()
+
+def bloom_filter_path(path: str) -> str:
+    """
+    Returns the path of the Bloom filter saved next to a hash index file
+    """
+    return os.path.splitext(path)[0] + ".bloom"
+
+def phrases_path(path: str) -> str:
+    """
+    Returns the path of the phrase fingerprints saved next to a hash index file
+    """
+    return os.path.splitext(path)[0] + ".phrases"
+
+def write_sorted_hash_index(path: str, sorted_digests, build_id: bytes) -> int:
+    """
+    Description
+    -----------
+    Streams digests that are already sorted and free of duplicates to a new
+    hash index file. The number of digests is written to the header once they
+    have all been written, so they are never held in memory together.
+
+    Parameters
+    ----------
+    path : str
+        The path of the file, it is overwritten
+    sorted_digests : iterable
+        The raw 32 byte digests in ascending order, without duplicates
+    build_id : bytes
+        The 8 byte build id stored in the header
+
+    Returns
+    -------
+    count : int
+        The number of digests written
+    """
+    count = 0
+    with open(path, 'wb') as f:
+        f.write(bytes(HASH_INDEX_HEADER.size))
+        for digest in sorted_digests:
+            if len(digest) != DIGEST_SIZE:
+                raise ValueError(f"Expected {DIGEST_SIZE} byte digests, got \
+{len(digest)}")
+            f.write(digest)
+            count += 1
+        f.seek(0)
+        f.write(HASH_INDEX_HEADER.pack(HASH_INDEX_MAGIC, HASH_INDEX_FORMAT_VERSION,
+                                       DIGEST_SIZE, 0, count, build_id))
+    return count
+
+def write_hash_index(path: str, digests) -> int:
+    """
+    Description
+    -----------
+    Writes the digests to a hash index file. The file is written next to the
+    destination and then renamed over it, so workers that have the old file
+    mapped keep reading it and the new file is picked up by its new version.
+    Use the hashindexbuilder for inputs that do not fit in memory.
+
+    Parameters
+    ----------
+    path : str
+        The path of the hash index file
+    digests : iterable
+        The raw 32 byte digests, they are sorted and duplicates are removed
+
+    Returns
+    -------
+    count : int
+        The number of digests written
+    """
+    temp_path = f"{path}.tmp{os.getpid()}"
+    count = write_sorted_hash_index(temp_path, sorted(set(digests)), os.urandom(8))
+    os.replace(temp_path, path)
+    return count
+
+_mapped_indexes = {}
+_mapped_indexes_lock = threading.Lock()
+
+def open_hash_index(path: str) -> MappedDigests:
+    """
+    Description
+    -----------
+    Returns the process-wide MappedDigests of a hash index file. The file is
+    mapped again when it has been replaced, which is detected from its inode,
+    modification time and size.
+
+    Parameters
+    ----------
+    path : str
+        The path of the hash index file
+
+    Returns
+    -------
+    mapped_digests : MappedDigests
+        The mapped digests of the current file
+    """
+    stat = os.stat(path)
+    version = f"{stat.st_ino}-{stat.st_mtime_ns}-{stat.st_size}"
+    mapped_digests = _mapped_indexes.get(path)
+    if mapped_digests is None or mapped_digests.version != version:
+        with _mapped_indexes_lock:
+            mapped_digests = _mapped_indexes.get(path)
+            if mapped_digests is None or mapped_digests.version != version:
+                # The previous map is left open, lookups running on it finish
+                # and it is closed once it is no longer referenced
+                mapped_digests = MappedDigests(path)
+                _mapped_indexes[path] = mapped_digests
+                print(f"DEBUG: Hash index {path} mapped with \
+{len(mapped_digests)} hashes", flush=True)
+    return mapped_digests
@@ -0,0 +1,375 @@
+import argparse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import hashlib
+import json
+import time
+import requests
+
+# Import for the pool of initialized Gradio sessions
+from propscreen.llmsessions import GradioSessionPool
+
+###############
+# LLMBACKENDS #
+###############
+"""
+llmbackends holds the LLM backends PropScreen can forward prompts to. Every
+backend answers a prompt with generate() and can stream its answer in chunks
+with stream(). The backend in use is selected by configuration, so the scanning
+pipeline can be run against the public Gradio RAG, any HTTP chat endpoint or a
+local stub that needs no network access.
+"""
+
+class LLMBackend:
+    """
+    Description
+    -----------
+    Base class of the LLM backends.
+    """
+
+    name = None
+
+    def generate(self, prompt: str) -> str:
+        """
+        Sends the prompt to the LLM and returns its complete response
+        """
+        raise NotImplementedError
+
+    def stream(self, prompt: str):
+        """
+        Yields the response to the prompt in chunks, backends that cannot
+        stream yield the complete response as a single chunk
+        """
+        yield self.generate(prompt)
+
+class GradioRagBackend(LLMBackend):
+    """
+    Description
+    -----------
+    The publicly hosted RAG reached through the Gradio API. Sessions are taken
+    from a GradioSessionPool, so the documents and the LLM are only initialized
+    when a new session is created.
+
+    Parameters
+    ----------
+    space : str
+        The name of the HuggingFace Space that hosts the RAG
+    documents : tuple
+        The paths of the PDF documents the RAG answers from
+    rag_config : dict
+        The arguments of the /initialize_database call
+    llm_config : dict
+        The arguments of the /initialize_LLM call
+    pool_size : int
+        The maximum number of idle sessions kept in the pool
+    max_age : float
+        The number of seconds a session is reused
+    """
+
+    name = "gradio"
+
+    def __init__(self, space: str, documents: tuple, rag_config: dict,
+                 llm_config: dict, pool_size: int = 4, max_age: float = 3600):
+        self.documents = tuple(documents)
+        self.rag_config = rag_config
+        self.llm_config = llm_config
+        self.session_pool = GradioSessionPool(space, max_idle=pool_size,
+                                              max_age=max_age)
+
+    def generate(self, prompt: str) -> str:
+        # Borrow a session whose vector database and LLM are already initialized
+        with self.session_pool.borrow(self.documents, self.rag_config,
+                                      self.llm_config) as client:
+            resultChat = client.predict(
+                    message=prompt,
+                    history=[],
+                    api_name="/conversation"
+            )
+
+        # This is just some trivial formatting that is used to better format the
+        # LLM's response to the user. It's purpose is to remove the prompt from
+        # the response message that the Gradio API sends, and format the
+        # response for better user readability
+        prompt = "'" + prompt + "',"
+        response = str(resultChat[1])
+        response = remove_substring(response,prompt)
+        response = remove_first_last_three_chars(response)
+        return str(response)
+
+class HttpChatBackend(LLMBackend):
+    """
+    Description
+    -----------
+    A generic HTTP chat endpoint that follows the OpenAI chat completions API,
+    e.g. a self hosted model server or the stub server of this module.
+
+    Parameters
+    ----------
+    url : str
+        The URL of the chat completions endpoint
+    model : str
+        The name of the model sent with every request
+    api_key : str
+        Sent as a bearer token when set
+    timeout : float
+        The number of seconds to wait for the endpoint
+    """
+
+    name = "http"
+
+    def __init__(self, url: str, model: str = None, api_key: str = None,
+                 timeout: float = 60):
+        self.url = url
+        self.model = model
+        self.timeout = timeout
+        self.session = requests.Session()
+        if api_key:
+            self.session.headers["Authorization"] = f"Bearer {api_key}"
+
+    def _request_body(self, prompt: str, stream: bool) -> dict:
+        body = {"messages": [{"role": "user", "content": prompt}], "stream": stream}
+        if self.model:
+            body["model"] = self.model
+        return body
+
+    def generate(self, prompt: str) -> str:
+        response = self.session.post(self.url, json=self._request_body(prompt, False),
+                                     timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()["choices"][0]["message"]["content"]
+
+    def stream(self, prompt: str):
+        with self.session.post(self.url, json=self._request_body(prompt, True),
+                               timeout=self.timeout, stream=True) as response:
+            response.raise_for_status()
+            # Server-sent events, one "data: {json}" line per chunk
+            for line in response.iter_lines(decode_unicode=True):
+                if not line or not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    break
+                chunk = json.loads(data)["choices"][0].get("delta", {})\
+                    .get("content")
+                if chunk:
+                    yield chunk
+
+class StubBackend(LLMBackend):
+    """
+    Description
+    -----------
+    A local, deterministic backend used for load and throughput testing. The
+    response to a prompt is picked from a list of canned responses, or from a
+    corpus file, by the hash of the prompt, so the same prompt always gets the
+    same response. The latency of a real LLM is simulated with sleeps.
+
+    Parameters
+    ----------
+    corpus_path : str
+        Optional path of a text file of responses separated by blank lines, the
+        canned STUB_RESPONSES are used when it is not set. A ValueError is
+        raised if the file has no responses
+    latency_ms : float
+        The number of milliseconds to wait before the response (or the first
+        chunk of a stream)
+    chunk_latency_ms : float
+        The number of milliseconds to wait between two chunks of a stream
+    chunk_words : int
+        The number of words in a chunk of a stream
+    """
+
+    name = "stub"
+
+    def __init__(self, corpus_path: str = None, latency_ms: float = 0,
+                 chunk_latency_ms: float = 0, chunk_words: int = 8):
+        if corpus_path:
+            with open(corpus_path, encoding='utf-8') as f:
+                responses = [response.strip() for response in f.read().split('\n\n')]
+            self.responses = [response for response in responses if response]
+            if not self.responses:
+                raise ValueError(f"The stub corpus {corpus_path} has no responses")
+        else:
+            self.responses = list(STUB_RESPONSES)
+        self.latency = latency_ms / 1000
+        self.chunk_latency = chunk_latency_ms / 1000
+        self.chunk_words = max(1, chunk_words)
+
+    def _response(self, prompt: str) -> str:
+        prompt_hash = hashlib.sha256(prompt.encode('utf-8')).digest()
+        return self.responses[int.from_bytes(prompt_hash[:8], 'big')
+                              % len(self.responses)]
+
+    def generate(self, prompt: str) -> str:
+        time.sleep(self.latency)
+        return self._response(prompt)
+
+    def stream(self, prompt: str):
+        time.sleep(self.latency)
+        words = self._response(prompt).split(' ')
+        for i in range(0, len(words), self.chunk_words):
+            if i:
+                time.sleep(self.chunk_latency)
+            chunk = ' '.join(words[i:i + self.chunk_words])
+            yield chunk if i + self.chunk_words >= len(words) else chunk + ' '
+
+# Canned responses of the StubBackend
+STUB_RESPONSES = (
+    "Lambda is a serverless compute service that runs code in response to events.",
+    "The monthly sales report lists the revenue of every region for the last quarter.",
+    "The project proposal describes the budget, the timeline and the team members.",
+    "I could not find any information about that in the provided documents.",
+)
+
+BACKENDS = {
+    GradioRagBackend.name: GradioRagBackend,
+    HttpChatBackend.name: HttpChatBackend,
+    StubBackend.name: StubBackend,
+}
+
+def create_backend(name: str, **options) -> LLMBackend:
+    """
+    Description
+    -----------
+    Creates the backend registered under the name.
+
+    Parameters
+    ----------
+    name : str
+        One of the names in BACKENDS ("gradio", "http" or "stub")
+    options : dict
+        The keyword arguments of the backend, options with a value of None are
+        left to their default
+
+    Returns
+    -------
+    backend : LLMBackend
+        The new backend
+    """
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown LLM backend {name}, expected one of \
+{', '.join(BACKENDS)}")
+    options = {key: value for key, value in options.items() if value is not None}
+    return BACKENDS[name](**options)
+
+def remove_substring(full_response, prompt):
+    """
+    Description
+    -----------
+    Removes the prompt from the gradio API response so that the only text that
+    will be returned and subsequently scanned is the LLM's response.
+
+    Parameters
+    ----------
+    full_response : str
+        The string containing both the prompt and response that is received from
+        the Gradio API call
+    prompt : str
+        The prompt that was originally sent by the user
+
+    Returns
+    -------
+    full_response : str
+        A modified version of full response that now contains only the model
+        response
+    """
+    if prompt in full_response:
+        print(full_response,"|",prompt)
+        full_response = full_response.replace(prompt, '')
+    return full_response
+
+# NOTE: This formatting is particular to the responses received by the hugging
+# face models supported through the Gradio API
+def remove_first_last_three_chars(input_string):
+    """
+    Description
+    -----------
+    Returns a better formatted and more human readable string. The purpose is so
+    when the string is returned and view by the suer in their web client, it is
+    easy to read.
+
+    Parameters
+    ----------
+    input_string : str
+        The string to be reformatted
+
+    Returns
+    -------
+    input_string[4:-3] : str
+        The string with the first three and last three characters removed from it
+    """
+    return input_string[4:-3]
+
+def make_stub_server(backend: LLMBackend, host: str = "127.0.0.1",
+                     port: int = 8001) -> ThreadingHTTPServer:
+    """
+    Description
+    -----------
+    Creates an HTTP server that answers OpenAI style chat completion requests
+    (POST /v1/chat/completions) with the given backend, usually a StubBackend.
+    Together with HttpChatBackend it exercises the full HTTP path of PropScreen
+    without network access or rate limits.
+
+    Parameters
+    ----------
+    backend : LLMBackend
+        The backend that generates the responses
+    host : str
+        The address the server listens on
+    port : int
+        The port the server listens on
+
+    Returns
+    -------
+    server : ThreadingHTTPServer
+        The server, call serve_forever() to start it
+    """
+
+    class StubHandler(BaseHTTPRequestHandler):
+
+        def do_POST(self):
+            if self.path.rstrip('/') != "/v1/chat/completions":
+                self.send_error(404)
+                return
+            length = int(self.headers.get("Content-Length", 0))
+            body = json.loads(self.rfile.read(length) or b"{}")
+            prompt = body.get("messages", [{}])[-1].get("content", "")
+
+            if body.get("stream"):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.end_headers()
+                for chunk in backend.stream(prompt):
+                    event = {"choices": [{"delta": {"content": chunk}}]}
+                    self.wfile.write(f"data: {json.dumps(event)}\n\n".encode('utf-8'))
+                    self.wfile.flush()
+                self.wfile.write(b"data: [DONE]\n\n")
+                return
+
+            response = {"choices": [{"message": {"role": "assistant",
+                                                 "content": backend.generate(prompt)}}]}
+            response = json.dumps(response).encode('utf-8')
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(response)))
+            self.end_headers()
+            self.wfile.write(response)
+
+        def log_message(self, format, *args):
+            pass
+
+    return ThreadingHTTPServer((host, port), StubHandler)
+
+if __name__ == "__main__":
+    # python -m propscreen.llmbackends --port 8001 --latency-ms 500
+    parser = argparse.ArgumentParser(description="Run the stub LLM server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--corpus")
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--chunk-latency-ms", type=float, default=0)
+    args = parser.parse_args()
+
+    stub = StubBackend(args.corpus, args.latency_ms, args.chunk_latency_ms)
+    server = make_stub_server(stub, args.host, args.port)
+    print(f"Stub LLM server listening on http://{args.host}:{args.port}\
+/v1/chat/completions", flush=True)
+    server.serve_forever()
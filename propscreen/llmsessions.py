@@ -0,0 +1,132 @@
+from contextlib import contextmanager
+import hashlib
+import os
+import threading
+import time
+from gradio_client import Client, handle_file
+
+###############
+# LLMSESSIONS #
+###############
+"""
+llmsessions keeps a pool of Gradio API sessions of the RAG that have already
+been initialized, i.e. the documents have been uploaded to the vector database
+and the LLM has been loaded. A request borrows one of these sessions and only
+has to send its prompt, instead of repeating both setup calls first.
+"""
+
+class GradioSessionPool:
+    """
+    Description
+    -----------
+    Pool of initialized Gradio clients. Sessions are grouped by the hash of the
+    documents they were initialized with and by the model configuration, so a
+    session is only ever reused for the same documents and model. A session is
+    used by one request at a time, broken sessions are discarded and sessions
+    older than max_age seconds are replaced.
+
+    Parameters
+    ----------
+    space : str
+        The name of the HuggingFace Space that hosts the RAG
+    max_idle : int
+        The maximum number of idle sessions kept per documents and model
+    max_age : float
+        The number of seconds after which a session is initialized again, 0
+        keeps sessions forever
+    """
+
+    def __init__(self, space: str, max_idle: int = 4, max_age: float = 3600):
+        self.space = space
+        self.max_idle = max_idle
+        self.max_age = max_age
+        self._idle = {}
+        self._lock = threading.Lock()
+        self._document_hashes = {}
+
+    def document_hash(self, documents: tuple) -> str:
+        """
+        Returns the SHA-256 hash of the contents of the documents, the hash is
+        cached per file path and modification time.
+        """
+        document_hash = hashlib.sha256()
+        for document in documents:
+            key = (document, os.path.getmtime(document))
+            file_hash = self._document_hashes.get(key)
+            if file_hash is None:
+                with open(document, 'rb') as f:
+                    file_hash = hashlib.sha256(f.read()).hexdigest()
+                self._document_hashes[key] = file_hash
+            document_hash.update(file_hash.encode('utf-8'))
+        return document_hash.hexdigest()
+
+    def _create_session(self, documents: tuple, rag_config: tuple,
+                        llm_config: tuple) -> Client:
+        client = Client(self.space)
+        resultRag = client.predict(
+                list_file_obj=[handle_file(document) for document in documents],
+                api_name="/initialize_database",
+                **dict(rag_config)
+        )
+        print(resultRag)
+
+        resultBaseModel = client.predict(
+                api_name="/initialize_LLM",
+                **dict(llm_config)
+        )
+        print(resultBaseModel)
+        return client
+
+    @contextmanager
+    def borrow(self, documents: tuple, rag_config: dict, llm_config: dict):
+        """
+        Description
+        -----------
+        Borrows an initialized session for the documents and model, creating a
+        new one if there is no idle session. The session is returned to the
+        pool when the with block ends, unless the block raised an exception.
+
+        Parameters
+        ----------
+        documents : tuple
+            The paths of the PDF documents the vector database is built from
+        rag_config : dict
+            The arguments of the /initialize_database call (chunk_size, ...)
+        llm_config : dict
+            The arguments of the /initialize_LLM call (llm_option, ...)
+
+        Yields
+        ------
+        client : Client
+            A Gradio client whose database and LLM are initialized
+        """
+        rag_config = tuple(sorted(rag_config.items()))
+        llm_config = tuple(sorted(llm_config.items()))
+        key = (self.document_hash(documents), rag_config, llm_config)
+
+        client = None
+        with self._lock:
+            idle = self._idle.get(key, [])
+            while idle and client is None:
+                client, created_at = idle.pop()
+                if self.max_age and time.monotonic() - created_at > self.max_age:
+                    client = None
+        if client is None:
+            print("DEBUG: Initializing a new Gradio session", flush=True)
+            client = self._create_session(documents, rag_config, llm_config)
+            created_at = time.monotonic()
+
+        # A session that raised is not put back, it may be in a broken state
+        yield client
+
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.max_idle:
+                idle.append((client, created_at))
+
+    def stats(self) -> dict:
+        """
+        Returns the number of idle sessions in the pool
+        """
+        with self._lock:
+            return {"idle_sessions": sum(len(idle) for idle in self._idle.values())}
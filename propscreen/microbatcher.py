@@ -0,0 +1,226 @@
+import queue
+import threading
+import time
+
+################
+# MICROBATCHER #
+################
+"""
+microbatcher collects the work items of concurrent requests into small batches
+so that an expensive model can process them with one call instead of one call
+per request.
+"""
+
+class _BatchItem:
+    """
+    A single submitted item, the caller waits on done until the worker has set
+    either result or error.
+    """
+
+    def __init__(self, item):
+        self.item = item
+        self.enqueued_at = time.monotonic()
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class MicroBatcher:
+    """
+    Description
+    -----------
+    Dynamic micro-batching scheduler. Callers submit() one item and block until
+    its result is ready. A background worker takes the first waiting item, keeps
+    collecting items for at most max_wait_ms or until max_batch_size items are
+    collected, runs batch_fn once on the whole batch and hands every caller its
+    own result.
+
+    Parameters
+    ----------
+    batch_fn : callable
+        Function that takes a list of items and returns a list with one result
+        per item, in the same order
+    max_batch_size : int
+        The maximum number of items processed by one call of batch_fn
+    max_wait_ms : float
+        How long the worker waits for more items after the first item of a
+        batch has arrived
+    name : str
+        The name of the worker thread
+    """
+
+    def __init__(self, batch_fn, max_batch_size: int = 8, max_wait_ms: float = 5,
+                 name: str = "microbatcher"):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000
+        self.name = name
+        self._queue = queue.Queue()
+        self._worker = None
+        self._worker_lock = threading.Lock()
+
+        # Metrics, see stats()
+        self._stats_lock = threading.Lock()
+        self._batches = 0
+        self._items = 0
+        self._queue_wait_total = 0.0
+        self._queue_wait_max = 0.0
+        self._batch_time_total = 0.0
+
+    def submit(self, item):
+        """
+        Description
+        -----------
+        Queues an item for the next batch and waits for its result.
+
+        Parameters
+        ----------
+        item : object
+            The work item, passed to batch_fn as part of a list
+
+        Returns
+        -------
+        result : object
+            The result batch_fn returned for the item
+
+        Raises
+        ------
+        Any exception raised by batch_fn is raised again in every caller of the
+        failed batch.
+        """
+        self._ensure_worker()
+        batch_item = _BatchItem(item)
+        self._queue.put(batch_item)
+        batch_item.done.wait()
+        if batch_item.error is not None:
+            raise batch_item.error
+        return batch_item.result
+
+    def submit_many(self, items: list) -> list:
+        """
+        Description
+        -----------
+        Queues several items at once and waits for all of their results, the
+        items can end up in the same batch or in consecutive batches.
+
+        Parameters
+        ----------
+        items : list
+            The work items
+
+        Returns
+        -------
+        results : list
+            The result of each item, in the same order
+
+        Raises
+        ------
+        The first exception raised by batch_fn for one of the items.
+        """
+        self._ensure_worker()
+        batch_items = [_BatchItem(item) for item in items]
+        for batch_item in batch_items:
+            self._queue.put(batch_item)
+        for batch_item in batch_items:
+            batch_item.done.wait()
+        for batch_item in batch_items:
+            if batch_item.error is not None:
+                raise batch_item.error
+        return [batch_item.result for batch_item in batch_items]
+
+    def _ensure_worker(self):
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._worker_lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name=self.name,
+                                                daemon=True)
+                self._worker.start()
+
+    def _collect_batch(self) -> list:
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0:
+                    batch.append(self._queue.get(timeout=remaining))
+                else:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+            started_at = time.monotonic()
+            completed = False
+            try:
+                results = self.batch_fn([batch_item.item for batch_item in batch])
+                if len(results) != len(batch):
+                    raise RuntimeError(f"{self.name}: batch_fn returned \
+{len(results)} results for {len(batch)} items")
+                for batch_item, result in zip(batch, results):
+                    batch_item.result = result
+                completed = True
+            except Exception as e:
+                for batch_item in batch:
+                    batch_item.error = e
+                completed = True
+            finally:
+                # A BaseException stops the worker, the callers of the batch
+                # must still be released. The next submit() starts a new worker
+                if not completed:
+                    with self._worker_lock:
+                        self._worker = None
+                    error = RuntimeError(f"{self.name}: the worker stopped")
+                    for batch_item in batch:
+                        batch_item.error = error
+                finished_at = time.monotonic()
+
+                self._record_batch(batch, started_at, finished_at)
+                for batch_item in batch:
+                    batch_item.done.set()
+
+    def _record_batch(self, batch: list, started_at: float, finished_at: float):
+        with self._stats_lock:
+            self._batches += 1
+            self._items += len(batch)
+            self._batch_time_total += finished_at - started_at
+            for batch_item in batch:
+                queue_wait = started_at - batch_item.enqueued_at
+                self._queue_wait_total += queue_wait
+                self._queue_wait_max = max(self._queue_wait_max, queue_wait)
+
+    def stats(self) -> dict:
+        """
+        Description
+        -----------
+        Returns the batching metrics collected since the batcher was created.
+
+        Returns
+        -------
+        stats : dict
+            batches and items processed, the average batch fill (items per
+            batch as a fraction of max_batch_size), the average and maximum
+            time an item waited in the queue before its batch started, the
+            average time a batch took and the number of items currently queued
+        """
+        with self._stats_lock:
+            batches = self._batches
+            items = self._items
+            return {
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000,
+                "batches": batches,
+                "items": items,
+                "avg_batch_size": items / batches if batches else 0.0,
+                "avg_batch_fill": (items / batches / self.max_batch_size
+                                   if batches else 0.0),
+                "avg_queue_wait_ms": (self._queue_wait_total / items * 1000
+                                      if items else 0.0),
+                "max_queue_wait_ms": self._queue_wait_max * 1000,
+                "avg_batch_time_ms": (self._batch_time_total / batches * 1000
+                                      if batches else 0.0),
+                "queue_depth": self._queue.qsize(),
+            }
@@ -0,0 +1,187 @@
+from array import array
+import hashlib
+import os
+import struct
+import sys
+
+#################
+# PHRASEMATCHER #
+#################
+"""
+phrasematcher finds the windows of three or more tokens of an LLM's response
+that may be one of the longer phrases of organizational sensitive information.
+Every token gets a cheap 64 bit fingerprint once, the fingerprint of a window
+is a polynomial rolling hash (Rabin-Karp) of its tokens' fingerprints computed
+in O(1) from prefix hashes, and only the windows whose fingerprint is one of
+the precomputed fingerprints of the phrases are hashed with SHA-256. The cost
+per window does not depend on the length of the window.
+"""
+
+# The rolling hash is computed modulo the Mersenne prime 2^61 - 1
+MODULUS = (1 << 61) - 1
+BASE = 1000003
+
+# Characters that are stripped from both ends of a token, the same as
+# sihasher.STRIP_CHARS (not imported to avoid a circular import)
+STRIP_CHARS = ",<>./?!'}{][|"
+
+# Header of a saved set of fingerprints: magic, format version, bit mask of the
+# phrase lengths, number of fingerprints and the build id of the hash index
+# file the fingerprints were built for. The fingerprints follow as little
+# endian 64 bit integers
+PHRASES_MAGIC = b"PSPHRASE"
+PHRASES_FORMAT_VERSION = 1
+PHRASES_HEADER = struct.Struct("<8sH6xQQ8s")
+
+def token_key(token: str) -> str:
+    """
+    Description
+    -----------
+    The part of a token that its fingerprint is computed from: the token
+    without quotes and stripped of STRIP_CHARS at both ends. Two windows whose
+    candidates are equal once formatted by sihasher.normalize_phrase have
+    tokens with equal keys, so formatting cannot make a window miss the
+    prefilter.
+    """
+    return token.replace('"', '').strip(STRIP_CHARS)
+
+def token_fingerprint(token: str) -> int:
+    """
+    Returns the 64 bit fingerprint of a token, stable across processes
+    """
+    digest = hashlib.blake2b(token_key(token).encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'little') % MODULUS
+
+def phrase_fingerprint(tokens: list) -> int:
+    """
+    Returns the rolling fingerprint of a window of tokens, the same value that
+    PhraseFingerprints.find computes for the window
+    """
+    fingerprint = 0
+    for token in tokens:
+        fingerprint = (fingerprint * BASE + token_fingerprint(token)) % MODULUS
+    return _mix_length(fingerprint, len(tokens))
+
+def _mix_length(fingerprint: int, length: int) -> int:
+    # Windows of different lengths are kept apart in the same set
+    return (fingerprint * BASE + length) % MODULUS
+
+class PhraseFingerprints:
+    """
+    Description
+    -----------
+    The set of the rolling fingerprints of the phrases of sensitive information
+    that have three or more tokens, together with the lengths of the phrases.
+
+    Parameters
+    ----------
+    fingerprints : iterable
+        The fingerprints, see phrase_fingerprint
+    lengths : iterable
+        The numbers of tokens of the phrases
+    build_id : bytes
+        The build id of the hash index file the phrases belong to
+    """
+
+    def __init__(self, fingerprints=(), lengths=(), build_id: bytes = bytes(8)):
+        self.fingerprints = set(fingerprints)
+        self.lengths = sorted(set(lengths))
+        self.build_id = build_id
+
+    def add(self, tokens: list):
+        """
+        Adds a phrase, given as its list of tokens
+        """
+        self.fingerprints.add(phrase_fingerprint(tokens))
+        if len(tokens) not in self.lengths:
+            self.lengths = sorted(self.lengths + [len(tokens)])
+
+    @property
+    def max_length(self) -> int:
+        return self.lengths[-1] if self.lengths else 0
+
+    def find(self, tokens: list, max_length: int) -> list:
+        """
+        Description
+        -----------
+        Returns the windows of the tokens that may be one of the phrases. A
+        phrase is never missed, a window that is not a phrase is returned with
+        a probability of about len(fingerprints) / 2^61.
+
+        Parameters
+        ----------
+        tokens : list
+            The tokens of the LLM's response
+        max_length : int
+            The maximum number of tokens of a window
+
+        Returns
+        -------
+        windows : list
+            The (start, length) of the windows whose fingerprint matched
+        """
+        lengths = [length for length in self.lengths if length <= max_length]
+        if not lengths or not self.fingerprints:
+            return []
+
+        # prefix[i] is the rolling hash of the first i tokens, so the hash of
+        # tokens[i:i + n] is prefix[i + n] - prefix[i] * BASE^n
+        prefix = [0]
+        for token in tokens:
+            prefix.append((prefix[-1] * BASE + token_fingerprint(token)) % MODULUS)
+
+        fingerprints = self.fingerprints
+        windows = []
+        for length in lengths:
+            power = pow(BASE, length, MODULUS)
+            for start in range(len(tokens) - length + 1):
+                fingerprint = (prefix[start + length] - prefix[start] * power) % MODULUS
+                if _mix_length(fingerprint, length) in fingerprints:
+                    windows.append((start, length))
+        return windows
+
+    def __len__(self) -> int:
+        return len(self.fingerprints)
+
+    def save(self, path: str):
+        """
+        Writes the fingerprints to a file that load() reads back. The file is
+        written next to the destination and then renamed over it.
+        """
+        lengths_mask = 0
+        for length in self.lengths:
+            lengths_mask |= 1 << length
+        temp_path = f"{path}.tmp{os.getpid()}"
+        with open(temp_path, 'wb') as f:
+            f.write(PHRASES_HEADER.pack(PHRASES_MAGIC, PHRASES_FORMAT_VERSION,
+                                        lengths_mask, len(self.fingerprints),
+                                        self.build_id))
+            fingerprints = array('Q', sorted(self.fingerprints))
+            if sys.byteorder == 'big':
+                fingerprints.byteswap()
+            fingerprints.tofile(f)
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path: str):
+        """
+        Reads the fingerprints written by save()
+        """
+        with open(path, 'rb') as f:
+            header = f.read(PHRASES_HEADER.size)
+            if len(header) < PHRASES_HEADER.size:
+                raise ValueError(f"{path} is not a phrases file, it is too short")
+            magic, format_version, lengths_mask, count, build_id = \
+                PHRASES_HEADER.unpack(header)
+            if magic != PHRASES_MAGIC or format_version != PHRASES_FORMAT_VERSION:
+                raise ValueError(f"{path} is not a phrases file of format version \
+{PHRASES_FORMAT_VERSION}")
+            fingerprints = array('Q')
+            fingerprints.frombytes(f.read(count * fingerprints.itemsize))
+            if len(fingerprints) != count:
+                raise ValueError(f"{path} is truncated")
+            if sys.byteorder == 'big':
+                fingerprints.byteswap()
+
+        lengths = [length for length in range(64) if lengths_mask >> length & 1]
+        return cls(fingerprints, lengths, build_id)
@@ -0,0 +1,306 @@
+from llm_guard.output_scanners import Sensitive
+import hashlib
+import re
+import sys
+import threading
+
+# Import for the batching scheduler
+from propscreen.microbatcher import MicroBatcher
+
+# Import for the cache of the scans of the sentences
+from propscreen.decisioncache import DecisionCache
+
+############
+# SCANNERS #
+############
+"""
+scanners is the process-wide registry of the LLM Guard scanners used by
+PropScreen. Building a scanner loads its tokenizer and transformer model, so
+each scanner is built once, on first use or when the server warms it up at
+startup, and is then shared by every request.
+"""
+
+# Keyword arguments the Sensitive scanner is built with, see
+# configure_sensitive_scanner()
+_sensitive_options = {"redact": False}
+_sensitive_scanner = None
+_sensitive_lock = threading.Lock()
+
+# Incremented whenever the options of the Sensitive scanner change, the cached
+# scans of the segments are only used with the options they were made with
+_sensitive_generation = 0
+
+# Batches the Sensitive scans of concurrent requests, None when batching is 
+# disabled, see configure_batching()
+_scan_batcher = None
+
+# Sensitive scan results of the segments of the responses, by digest of the 
+# segment, see configure_segment_cache()
+_segment_cache = DecisionCache(max_entries=0)
+
+# A segment ends after a sentence (at the whitespace that follows ., ! or ?) or
+# at a line break. The separators are kept so that the text can be rebuilt.
+SEGMENT_SEPARATOR = re.compile(r'((?<=[.!?])\s+|\n\s*)')
+
+# Text scanned by warm_up(), it contains sensitive information so that every
+# recognizer of the scanner runs at least once
+WARM_UP_PROMPT = "PropScreen warm up"
+WARM_UP_OUTPUT = "John Smith can be reached at john.smith@example.com"
+
+def configure_sensitive_scanner(**options):
+    """
+    Description
+    -----------
+    Sets the options the Sensitive scanner is built with. If a scanner has
+    already been built with other options it is discarded and the next call to
+    get_sensitive_scanner() builds a new one.
+
+    Parameters
+    ----------
+    options : dict
+        Keyword arguments for llm_guard.output_scanners.Sensitive, options with
+        a value of None are left to the LLM Guard default
+    """
+    global _sensitive_options, _sensitive_scanner, _sensitive_generation
+    options = {key: value for key, value in options.items() if value is not None}
+    with _sensitive_lock:
+        if options != _sensitive_options:
+            _sensitive_options = options
+            _sensitive_scanner = None
+            _sensitive_generation += 1
+
+def get_sensitive_scanner() -> Sensitive:
+    """
+    Description
+    -----------
+    Returns the shared LLM Guard Sensitive scanner, building it on first use.
+    The scanner is only built once even if several threads ask for it at the
+    same time.
+
+    Returns
+    -------
+    scanner : Sensitive
+        The LLM Guard Sensitive output scanner
+    """
+    global _sensitive_scanner
+    scanner = _sensitive_scanner
+    if scanner is None:
+        with _sensitive_lock:
+            if _sensitive_scanner is None:
+                options = dict(_sensitive_options)
+                # Sensitive appends to the list of entity types it is given
+                if options.get("entity_types"):
+                    options["entity_types"] = list(options["entity_types"])
+                print(f"DEBUG: Building LLM Guard Sensitive scanner: {options}",
+                      flush=True)
+                _sensitive_scanner = Sensitive(**options)
+            scanner = _sensitive_scanner
+    return scanner
+
+def configure_batching(max_batch_size: int, max_wait_ms: float):
+    """
+    Description
+    -----------
+    Enables micro-batching of the Sensitive scans of concurrent requests. The 
+    scans are collected for at most max_wait_ms or until max_batch_size scans
+    are waiting and are then run together by one worker thread. A 
+    max_batch_size of 1 or less disables batching and every request scans on
+    its own thread.
+
+    NOTE: see scan_batch, the scans of a batch run one after the other, so
+    batching only pays off for batches with repeated outputs. It is disabled
+    by default (NER_BATCH_SIZE=1).
+
+    Parameters
+    ----------
+    max_batch_size : int
+        The maximum number of scans in a batch
+    max_wait_ms : float
+        How long the first scan of a batch waits for more scans to arrive
+    """
+    global _scan_batcher
+    if max_batch_size > 1:
+        _scan_batcher = MicroBatcher(scan_batch, max_batch_size, max_wait_ms,
+                                     name="sensitive-scan-batcher")
+    else:
+        _scan_batcher = None
+
+def configure_segment_cache(max_entries: int, ttl: float, max_bytes: int):
+    """
+    Description
+    -----------
+    Enables the cache of the Sensitive scans of the segments (sentences and 
+    lines) of the responses. Responses often share sentences, e.g. 
+    disclaimers or the same RAG chunk, and only the segments that are not in
+    the cache are scanned. A max_entries of 0 disables the cache and every 
+    response is scanned as a whole.
+
+    Parameters
+    ----------
+    max_entries : int
+        The maximum number of cached segments
+    ttl : float
+        The number of seconds a segment's result is used
+    max_bytes : int
+        The maximum estimated memory of the cached results
+    """
+    global _segment_cache
+    _segment_cache = DecisionCache(max_entries, ttl, max_bytes)
+
+def split_segments(text: str) -> list:
+    """
+    Description
+    -----------
+    Splits a text into its segments, see SEGMENT_SEPARATOR.
+
+    Parameters
+    ----------
+    text : str
+        The text to split, usually the LLM's response
+
+    Returns
+    -------
+    segments : list
+        The (segment, separator) tuples, joining them gives the text back
+    """
+    parts = SEGMENT_SEPARATOR.split(text)
+    return list(zip(parts[0::2], parts[1::2] + [""]))
+
+def scan_batch(items: list) -> list:
+    """
+    Description
+    -----------
+    Runs the Sensitive scanner on a batch of (prompt, model_output) pairs. 
+    Identical model outputs in the batch are only scanned once, since the 
+    Sensitive scan does not depend on the prompt.
+
+    NOTE: LLM Guard's Sensitive scanner only accepts one text per call, so the
+    unique outputs are scanned one after the other on the batch worker. This is
+    the function to change once the scanner supports batched inference.
+
+    Parameters
+    ----------
+    items : list
+        The list of (prompt, model_output) tuples
+
+    Returns
+    -------
+    results : list
+        The (text, valid, score) tuple of each item, in the same order
+    """
+    scanner = get_sensitive_scanner()
+    results_by_output = {}
+    results = []
+    for prompt, model_output in items:
+        # The scan of an empty output returns the prompt, so it is not shared
+        if not model_output.strip():
+            results.append(scanner.scan(prompt, model_output))
+            continue
+        if model_output not in results_by_output:
+            results_by_output[model_output] = scanner.scan(prompt, model_output)
+        results.append(results_by_output[model_output])
+    return results
+
+def scan_sensitive(prompt: str, model_output: str) -> tuple:
+    """
+    Description
+    -----------
+    Scans a model output with the shared Sensitive scanner, through the batching
+    scheduler when batching is enabled.
+
+    Parameters
+    ----------
+    prompt : str
+        The prompt sent by the user
+    model_output : str
+        The response that the LLM returns
+
+    Returns
+    -------
+    output : tuple
+        The (text, valid, score) tuple returned by Sensitive.scan
+    """
+    segment_cache = _segment_cache
+    if segment_cache.max_entries and model_output.strip():
+        return _scan_segments(prompt, model_output, segment_cache)
+    return _scan_items([(prompt, model_output)])[0]
+
+def _scan_items(items: list) -> list:
+    scan_batcher = _scan_batcher
+    if scan_batcher is None:
+        scanner = get_sensitive_scanner()
+        return [scanner.scan(prompt, model_output) for prompt, model_output in items]
+    return scan_batcher.submit_many(items)
+
+def _scan_segments(prompt: str, model_output: str, segment_cache) -> tuple:
+    """
+    Scans the segments of the model output that are not in the segment cache
+    and combines the results of all the segments into one (text, valid, score)
+    tuple: the texts of the segments are joined back together, the output is
+    valid if every segment is valid and the score is the highest score.
+    """
+    segments = split_segments(model_output)
+    version = _sensitive_generation
+
+    results = {}
+    missing = []
+    for segment, _ in segments:
+        if not segment.strip():
+            continue
+        key = hashlib.sha256(segment.encode('utf-8')).digest()
+        if key in results:
+            continue
+        result = segment_cache.get(key, version)
+        results[key] = result
+        if result is None:
+            missing.append((key, segment))
+
+    if missing:
+        scanned = _scan_items([(prompt, segment) for _, segment in missing])
+        for (key, segment), result in zip(missing, scanned):
+            results[key] = result
+            segment_cache.put(key, result, version,
+                              size=sys.getsizeof(result) + sys.getsizeof(result[0]))
+
+    text = []
+    valid = True
+    scores = []
+    for segment, separator in segments:
+        if segment.strip():
+            segment_text, segment_valid, segment_score = \
+                results[hashlib.sha256(segment.encode('utf-8')).digest()]
+            text.append(segment_text)
+            valid = valid and segment_valid
+            scores.append(segment_score)
+        else:
+            text.append(segment)
+        text.append(separator)
+    return "".join(text), valid, max(scores)
+
+def segment_cache_stats():
+    """
+    Returns the hit and miss counters of the segment cache, None if it is 
+    disabled
+    """
+    segment_cache = _segment_cache
+    return segment_cache.stats() if segment_cache.max_entries else None
+
+def batching_stats():
+    """
+    Returns the metrics of the Sensitive scan batcher, None if batching is 
+    disabled
+    """
+    scan_batcher = _scan_batcher
+    return scan_batcher.stats() if scan_batcher is not None else None
+
+def warm_up():
+    """
+    Description
+    -----------
+    Builds the shared scanners and runs a dummy scan through them, so that the
+    models are loaded and their first (slow) inference has happened before any
+    request is served.
+    """
+    scanner = get_sensitive_scanner()
+    scanner.scan(WARM_UP_PROMPT, WARM_UP_OUTPUT)
+    print("DEBUG: LLM Guard scanners warmed up", flush=True)
@@ -1,8 +1,7 @@
-from llm_guard.output_scanners import Sensitive
 import logging
 import uuid
 import os
-from gradio_client import Client, handle_file
+import threading
 
 # Import for the hashing functions
 import sys
@@ -13,12 +12,58 @@ import propscreen.sihasher as sihasher
 sys.path.insert(0, 'propscreen/awsinterface.py')
 import propscreen.awsinterface as awsinterface
 
+# Import for the context string matcher
+from propscreen.contextmatcher import ContextMatcher
+
+# Import for scanning streamed responses
+from propscreen.sistream import StreamScanner
+
+# Import for the shared LLM Guard scanners
+import propscreen.scanners as scanners
+
+# Import for the decision pipeline
+import propscreen.sipipeline as sipipeline
+from concurrent.futures import ThreadPoolExecutor
+
+# Import for the cache of the decisions
+import hashlib
+from propscreen.decisioncache import DecisionCache
+
+# Import for the LLM backends
+import propscreen.llmbackends as llmbackends
+from propscreen.llmbackends import remove_substring, remove_first_last_three_chars
+
 # Get the environment variables
 CONTEXT_BUCKET = os.environ['CONTEXT_BUCKET']
 CONTEXT_OBJECT = os.environ['CONTEXT_OBJECT']
 ORG_SI_HASH_DB = os.environ['ORG_SI_HASH_DB']
 HASHES_OBJECT = os.environ['HASHES_OBJECT']
 
+# Executor shared by the checks of every request, see sensitive_info_check()
+_stage_executor = ThreadPoolExecutor(
+    max_workers=int(os.environ.get('SI_STAGE_WORKERS', 16)),
+    thread_name_prefix='si-stage',
+)
+
+# Relative cost of each check of the decision pipeline, e.g. 
+# "hash=1,context=2,llm_guard=100", cheaper checks run first. Checks cheaper 
+# than SI_INLINE_COST_LIMIT run on the request's thread, the others run 
+# concurrently on the stage executor.
+SI_STAGE_COSTS = dict(
+    (name.strip(), float(cost)) for name, cost in 
+    (item.split('=') for item in 
+     os.environ.get('SI_STAGE_COSTS', 'hash=1,context=2,llm_guard=100').split(','))
+)
+SI_INLINE_COST_LIMIT = float(os.environ.get('SI_INLINE_COST_LIMIT', 10))
+
+# Decisions of the responses that were already scanned, by digest of the 
+# response, see sensitive_info_check(). SI_DECISION_CACHE_SIZE=0 disables it.
+_decision_cache = DecisionCache(
+    max_entries=int(os.environ.get('SI_DECISION_CACHE_SIZE', 10000)),
+    ttl=float(os.environ.get('SI_DECISION_CACHE_TTL', 300)),
+    max_bytes=int(os.environ.get('SI_DECISION_CACHE_MAX_BYTES', 16 * 1024 * 1024)),
+)
+
 ###########
 # SICHECK #
 ###########
@@ -31,6 +76,63 @@ code represents the core proof of concept of the logical programmatically.
 # NOTE: The following section is notional for the PoC, these are hard coded API 
 # calls meant to represent the connection to the customer LLM
 
+# The documents the RAG answers from and the configuration of its vector 
+# database and LLM, a pooled session is only reused for the same values
+LLM_DOCUMENTS = ('docs/test/20240724_1117AM_Lambda.pdf',)
+LLM_RAG_CONFIG = {"chunk_size": 600, "chunk_overlap": 40}
+LLM_MODEL_CONFIG = {
+    "llm_option": "Mixtral-8x7B-Instruct-v0.1",
+    "llm_temperature": 0.7,
+    "max_tokens": 1024,
+    "top_k": 3,
+}
+
+def create_gradio_backend() -> llmbackends.GradioRagBackend:
+    """
+    Creates the backend of the publicly hosted Gradio RAG with the documents and
+    configuration above
+    """
+    return llmbackends.GradioRagBackend(
+        "cvachet/pdf-chatbot",
+        LLM_DOCUMENTS,
+        LLM_RAG_CONFIG,
+        LLM_MODEL_CONFIG,
+        pool_size=int(os.environ.get('LLM_SESSION_POOL_SIZE', 4)),
+        max_age=float(os.environ.get('LLM_SESSION_MAX_AGE', 3600)),
+    )
+
+# The backend prompts are sent to, the Gradio RAG unless another backend is 
+# selected with configure_llm_backend()
+_llm_backend = create_gradio_backend()
+
+def configure_llm_backend(name: str, **options):
+    """
+    Description
+    -----------
+    Selects the LLM backend that call_to_llm sends prompts to. The "gradio" 
+    backend always uses the documents and configuration above.
+
+    Parameters
+    ----------
+    name : str
+        "gradio", "http" or "stub", see llmbackends.BACKENDS
+    options : dict
+        The keyword arguments of the backend, ignored for "gradio"
+    """
+    global _llm_backend
+    if name == llmbackends.GradioRagBackend.name:
+        if not isinstance(_llm_backend, llmbackends.GradioRagBackend):
+            _llm_backend = create_gradio_backend()
+    else:
+        _llm_backend = llmbackends.create_backend(name, **options)
+    print(f"DEBUG: LLM backend = {name}", flush=True)
+
+def get_llm_backend() -> llmbackends.LLMBackend:
+    """
+    Returns the LLM backend that call_to_llm sends prompts to
+    """
+    return _llm_backend
+
 def call_to_llm(prompt: str) -> str:
     """
     Description
@@ -40,7 +142,11 @@ def call_to_llm(prompt: str) -> str:
     the RAG's service and sends the data in the form of PDF(s) to be read, the 
     second call initializes the base LLM that is going to be used, and the third
     call sends the argument "prompt" to the model which is interpreted as the
-    prompt that the model needs to respond to.
+    prompt that the model needs to respond to. The first two calls are only 
+    made when a new session is added to the backend's session pool, a request 
+    borrows an initialized session and only makes the third call. When another
+    backend has been selected with configure_llm_backend() the prompt is sent 
+    to that backend instead.
 
     Parameters
     ----------
@@ -65,91 +171,64 @@ def call_to_llm(prompt: str) -> str:
     """
     
     try:
-        client = Client("cvachet/pdf-chatbot")
-        resultRag = client.predict(
-                list_file_obj=[handle_file('docs/test/20240724_1117AM_Lambda.pdf')],
-                chunk_size=600,
-                chunk_overlap=40,
-                api_name="/initialize_database"
-        )
-        print(resultRag)
-
-        resultBaseModel = client.predict(
-                llm_option="Mixtral-8x7B-Instruct-v0.1",
-                llm_temperature=0.7,
-                max_tokens=1024,
-                top_k=3,
-                api_name="/initialize_LLM"
-        )
-        print(resultBaseModel)
-
-        resultChat = client.predict(
-                message=prompt,
-                history=[],
-                api_name="/conversation"
-        )
-        
-        # This is just some trivial formatting that is used to better format the
-        # LLM's response to the user. It's purpose is to remove the prompt from 
-        # the response message that the Gradio API sends, and format the 
-        # response for better user readability 
-        prompt = "'" + prompt + "',"
-        response = str(resultChat[1])
-        response = remove_substring(response,prompt)
-        response = remove_first_last_three_chars(response)
-        return str(response)
+        return get_llm_backend().generate(prompt)
     except:
-        print("DEBUG: GRADIO API Call Failure", flush=True)
+        print(f"DEBUG: {get_llm_backend().name} LLM API Call Failure", flush=True)
         return str("ERROR {d98ee0e5f9399db9381014c9f890f896d3fcb272c2a7a52\
         1d0a13aa23085a284} \nPlease retry your input")
 
-def remove_substring(full_response, prompt):
+def stream_llm(prompt: str):
     """
     Description
     -----------
-    Removes the prompt from the gradio API response so that the only text that 
-    will be returned and subsequently scanned is the LLM's response.
+    Streaming version of call_to_llm, yields the LLM's response in chunks as 
+    they arrive from the backend. Backends that cannot stream yield the whole
+    response as one chunk.
 
     Parameters
     ----------
-    full_response : str
-        The string containing both the prompt and response that is received from
-        the Gradio API call
     prompt : str
-        The prompt that was originally sent by the user 
+        A string of characters that has been forwarded from the webclient or 
+        organizational LLM application. 
 
-    Returns
-    -------
-    full_response : str
-        A modified version of full response that now contains only the model 
-        response
+    Yields
+    ------
+    chunk : str
+        The next part of the response, the same error message as call_to_llm
+        is yielded if the backend fails
     """
-    if prompt in full_response:
-        print(full_response,"|",prompt)
-        full_response = full_response.replace(prompt, '')
-    return full_response
+    try:
+        for chunk in get_llm_backend().stream(prompt):
+            yield chunk
+    except Exception:
+        print(f"DEBUG: {get_llm_backend().name} LLM API Call Failure", flush=True)
+        yield str("ERROR {d98ee0e5f9399db9381014c9f890f896d3fcb272c2a7a52\
+        1d0a13aa23085a284} \nPlease retry your input")
 
-# NOTE: This formatting is particular to the responses received by the hugging
-# face models supported through the Gradio API
-def remove_first_last_three_chars(input_string):
+def create_stream_scanner(prompt: str) -> StreamScanner:
     """
     Description
     -----------
-    Returns a better formatted and more human readable string. The purpose is so
-    when the string is returned and view by the suer in their web client, it is
-    easy to read.
-    
+    Creates the StreamScanner that scans a streamed response to the prompt with
+    the same hashes, context strings and LLM Guard scanner as 
+    sensitive_info_check.
+
     Parameters
     ----------
-    input_string : str
-        The string to be reformatted
-    
+    prompt : str
+        The prompt that was sent to the LLM
+
     Returns
     -------
-    input_string[4:-3] : str
-        The string with the first three and last three characters removed from it
+    stream_scanner : StreamScanner
+        The scanner to feed the chunks of the response to
     """
-    return input_string[4:-3]
+    return StreamScanner(
+        lambda tokens: sihasher.find_hash_hits(tokens, ORG_SI_HASH_DB, HASHES_OBJECT),
+        get_context_matcher(),
+        lambda text: llm_guard_si_check(prompt, text),
+        carried_tokens=sihasher.max_phrase_length(ORG_SI_HASH_DB, HASHES_OBJECT) - 1,
+    )
 
 def llm_guard_si_check(prompt: str, model_output: str):
     """
@@ -178,9 +257,9 @@ def llm_guard_si_check(prompt: str, model_output: str):
         in the form of a floating point number ranging from 0.0 to 1.0.
     """
     
-    # Initialize the LLM Guard Scanner and scan the model's response
-    scanner = Sensitive(redact=False)
-    output = scanner.scan(prompt, model_output)
+    # Scan the model's response with the shared LLM Guard Scanner, batched with
+    # the scans of concurrent requests
+    output = scanners.scan_sensitive(prompt, model_output)
     print("LLM Guard Output[1]", output[1], flush=True)
     return output
 
@@ -211,16 +290,56 @@ def context_strings_check(model_output: str):
     # NOTE:the line below is a check against a DB, but in theory could be a more
     # efficient method such as a RAG trained to recognize words that would be in
     # the set of context words
-    # NOTE: a more efficient approach is to query the DB instead of pulling the 
-    # data to be searched in the script, in future implementations the DB query
-    # would be the approach that is implemented
-    print(f"DEBUG Context Strings: Bucket = {CONTEXT_BUCKET} | Object = {CONTEXT_OBJECT}")
-    
-    # Get the context strings form the AWS S3 Bucket
-    context_strings = awsinterface.clean_s3_object_contents(CONTEXT_BUCKET, CONTEXT_OBJECT)
-    context_string_found = [con_str.lower() in model_output.lower() for con_str in context_strings]
+    # NOTE: the context strings are cached from the S3 bucket and compiled into
+    # a ContextMatcher, so the response is scanned in a single pass no matter 
+    # how many context strings there are
+    context_string_found = get_context_matcher().matches(model_output)
     return context_string_found
 
+_context_matcher = None
+_context_matcher_etag = None
+_context_matcher_lock = threading.Lock()
+
+def get_context_matcher() -> ContextMatcher:
+    """
+    Description
+    -----------
+    Returns the process-wide ContextMatcher built from the context strings in 
+    the AWS S3 bucket. The context strings are served by the awsinterface 
+    S3ObjectCache and the matcher is only rebuilt when the ETag of the context
+    strings object changes.
+
+    Returns
+    -------
+    context_matcher : ContextMatcher
+        The matcher holding all the context strings
+    """
+    global _context_matcher, _context_matcher_etag
+
+    # Get the context strings form the AWS S3 Bucket
+    entry = awsinterface.s3_object_cache.get(CONTEXT_BUCKET, CONTEXT_OBJECT,
+                                             awsinterface.parse_csv_entries)
+    context_matcher = _context_matcher
+    if context_matcher is None or _context_matcher_etag != entry.etag:
+        with _context_matcher_lock:
+            if _context_matcher is None or _context_matcher_etag != entry.etag:
+                print(f"DEBUG Context Strings: Bucket = {CONTEXT_BUCKET} | \
+Object = {CONTEXT_OBJECT} | ETag = {entry.etag}", flush=True)
+                _context_matcher = ContextMatcher(entry.value)
+                _context_matcher_etag = entry.etag
+            context_matcher = _context_matcher
+    return context_matcher
+
+def reload_context_matcher():
+    """
+    Discards the ContextMatcher and the cached context strings, the next check 
+    downloads them from the S3 bucket and rebuilds the matcher.
+    """
+    global _context_matcher
+    awsinterface.s3_object_cache.invalidate(CONTEXT_BUCKET, CONTEXT_OBJECT)
+    with _context_matcher_lock:
+        _context_matcher = None
+
 def hashed_org_si_check(llm_guard_hit: bool, context_string_found : bool, model_output):
     """
     Description
@@ -230,9 +349,9 @@ def hashed_org_si_check(llm_guard_hit: bool, context_string_found : bool, model_
     wants to check and interdict. First determines if the check should be 
     conducted based on its first two parameters. If a check is determined to be
     necessary then through the use of the helper functions found in sihasher.py
-    each token in hashed and checked to see if it matches any of the hashes in 
-    the S3 bucket. A list of boolean values is kept (hit_count) and returned once
-    both checks have completed.
+    each token and each pair of adjacent tokens is hashed and checked in a single
+    batch to see if it matches any of the hashes in the S3 bucket. A list of 
+    boolean values (hit_count) with one entry per checked item is returned.
 
     Parameters
     ----------
@@ -251,17 +370,99 @@ def hashed_org_si_check(llm_guard_hit: bool, context_string_found : bool, model_
     if (llm_guard_hit == False) or (True in context_string_found):
         tokens = model_output.split(' ')
         print("DEBUG: Unformatted Tokens:", tokens, flush=True)
-        hit_count = []
-        for token in tokens:
-            hit_count.append(sihasher.check_hash(token,ORG_SI_HASH_DB,HASHES_OBJECT))
-        concat_tokens = sihasher.concat_tokens(tokens)
-        print(concat_tokens, flush=True)
-        for con_token in concat_tokens:
-            hit_count.append(sihasher.check_hash(con_token, ORG_SI_HASH_DB,\
-                                                  HASHES_OBJECT))
+        hit_count = sihasher.check_hashes(tokens, ORG_SI_HASH_DB, HASHES_OBJECT)
+        print("DEBUG: Hash hits at:", [i for i, hit in enumerate(hit_count) if hit],
+              flush=True)
         return hit_count
 
 
+def hashed_org_si_tokens_check(model_output: str) -> list:
+    """
+    Description
+    -----------
+    The ungated version of hashed_org_si_check used by the decision pipeline, 
+    every token and pair of adjacent tokens of the response is hashed and 
+    checked against the hashes of the organizational sensitive information.
+
+    Parameters
+    ----------
+    model_output : str
+        The response that the LLM returns.
+
+    Returns
+    -------
+    hit_count : list
+        The list of the results of the hash matching checks
+    """
+    tokens = model_output.split(' ')
+    hit_count = sihasher.check_hashes(tokens, ORG_SI_HASH_DB, HASHES_OBJECT)
+    print("DEBUG: Hash hits at:", [i for i, hit in enumerate(hit_count) if hit],
+          flush=True)
+    return hit_count
+
+def reference_data_version():
+    """
+    Description
+    -----------
+    Returns the version of the reference data the decisions depend on, the 
+    version of the hashes and the ETag of the context strings. None if either
+    could not be loaded, so that decisions made without them are not cached.
+    """
+    hashes_version = sihasher.get_hash_index(ORG_SI_HASH_DB, HASHES_OBJECT).version
+    try:
+        context_version = awsinterface.s3_object_cache.get(
+            CONTEXT_BUCKET, CONTEXT_OBJECT, awsinterface.parse_csv_entries).etag
+    except Exception as e:
+        print(f"Error: {str(e)}", flush=True)
+        context_version = None
+    if hashes_version is None or context_version is None:
+        return None
+    return hashes_version, context_version
+
+def decision_cache_stats() -> dict:
+    """
+    Returns the hit and miss counters and the size of the decision cache
+    """
+    return _decision_cache.stats()
+
+def hash_index_stats() -> dict:
+    """
+    Returns the size of the hashes of the organizational sensitive information
+    held by this process and how many lookups stopped at the Bloom filter
+    """
+    return sihasher.get_hash_index(ORG_SI_HASH_DB, HASHES_OBJECT).stats()
+
+_si_pipeline = None
+
+def get_si_pipeline() -> sipipeline.SIPipeline:
+    """
+    Description
+    -----------
+    Returns the decision pipeline, building it on first use. The stages are the
+    three checks of this module with the costs set in SI_STAGE_COSTS.
+
+    Returns
+    -------
+    si_pipeline : SIPipeline
+        The pipeline used by sensitive_info_check
+    """
+    global _si_pipeline
+    if _si_pipeline is None:
+        stage_funcs = {
+            sipipeline.HASH_STAGE: lambda prompt, model_output: 
+                hashed_org_si_tokens_check(model_output),
+            sipipeline.CONTEXT_STAGE: lambda prompt, model_output: 
+                context_strings_check(model_output),
+            sipipeline.LLM_GUARD_STAGE: llm_guard_si_check,
+        }
+        _si_pipeline = sipipeline.SIPipeline(
+            [sipipeline.PipelineStage(name, func, SI_STAGE_COSTS.get(name, 0))
+             for name, func in stage_funcs.items()],
+            _stage_executor,
+            inline_cost_limit=SI_INLINE_COST_LIMIT,
+        )
+    return _si_pipeline
+
 def sensitive_info_check(prompt: str, model_output: str):
     """
     This function uses LLM Guard's sensitive information output scanner to 
@@ -272,7 +473,8 @@ def sensitive_info_check(prompt: str, model_output: str):
     the model response, a final check against a hashed database of sensitive 
     information is conducted. The results of the scans determine the output that
     is returned to the database of event logs and the response that the user 
-    sees. 
+    sees. The checks run through the SIPipeline (see sipipeline.py), which 
+    orders them by cost and skips the ones that cannot change the decision.
 
     Parameters
     ----------
@@ -295,48 +497,53 @@ def sensitive_info_check(prompt: str, model_output: str):
 
     print(f"DEBUG: Response to be scanned: {model_output}")
 
-    # First check, meant to serve as a fast check of the 
-    # LLM's response to ensure that there is no generalized sensitive 
-    # information in the model response. This is achieved by a call to 
-    # LLM Guard's Sensitive Scan
-    llm_guard_output = llm_guard_si_check(prompt, model_output)
-
-    # Save the boolean value separately for later use in other checks
-    # The second item in the tuple is a boolean value that 
-    # represents if sensitive information is was detected in the scan.
-    llm_guard_hit = llm_guard_output[1]
-
-    # Perform the check for context strings and save the results
-    context_string_found = context_strings_check(model_output)
-    print("Context Strings:", context_string_found, flush=True)
-    
-    if (llm_guard_hit == True) and (True not in context_string_found):
+    # The checks are stages of the SIPipeline, they run cheapest first and the
+    # pipeline stops as soon as the decision is certain. The hash and context 
+    # string checks are in-memory lookups, the LLM Guard Sensitive Scan (NER 
+    # and regex for generalized sensitive information) is only run when the 
+    # decision still depends on it.
+    # A response that was already scanned with the same reference data gets 
+    # the cached decision
+    output_digest = hashlib.sha256(model_output.encode('utf-8')).digest()
+    version = reference_data_version()
+    decision = _decision_cache.get(output_digest, version) if version else None
+    if decision is not None:
+        stage_results = {}
+        print("DEBUG: Decision found in the decision cache", flush=True)
+    else:
+        decision, stage_results = get_si_pipeline().run(prompt, model_output)
+        if decision is not None and version is not None:
+            _decision_cache.put(output_digest, decision, version)
+
+    # The second item of the LLM Guard tuple is a boolean value that represents 
+    # if the response passed the scan, None if the scan was not needed
+    llm_guard_output = stage_results.get(sipipeline.LLM_GUARD_STAGE)
+    llm_guard_output = list(llm_guard_output) if llm_guard_output else None
+    print("Context Strings:", stage_results.get(sipipeline.CONTEXT_STAGE), 
+          flush=True)
+    print("Stages run:", list(stage_results), flush=True)
+
+    if decision == sipipeline.TRUE_NEGATIVE:
         print(f"DEBUG: Model Response has passed initial checks, and is\
               therefore assumed to be a True Negative response: {model_output},\
               to user", flush=True)
-        decision = "True Negative"
         return prompt, model_output, decision#, True
     else:
         print("DEBUG: Initial Check Failed", flush=True)
-    
-    llm_guard_output = list(llm_guard_output)
-    hit_count = hashed_org_si_check(llm_guard_hit, context_string_found, model_output)
 
     # Send the response to the user based on if there was Organizational Sensitive 
     # Information detected
-    if True in hit_count:
+    if decision == sipipeline.TRUE_POSITIVE:
         final_report = f"DEBUG: FINAL REPORT \n Decision : True Positive | \
             Prompt : {prompt} | Output: {llm_guard_output}"
         print(f"DEBUG: Policy violation detected, response blocked and logged \
             \n{final_report} saved to logs", flush=True)
-        decision = "True Positive"
         return prompt, model_output, decision#, True
-    elif True not in hit_count:
+    elif decision == sipipeline.FALSE_POSITIVE:
         final_report = f"DEBUG: FINAL REPORT \n Decision : False Positive | \
             Prompt : {prompt} | Output: {llm_guard_output}"
         print(f"DEBUG: Policy violation not detected, response allowed and \
             logged \n{final_report} saved to logs", flush=True)
-        decision = "False Positive"
         return prompt, model_output, decision#, True
     else:
         final_report = f"DEBUG: FINAL REPORT \n Decision : ERROR | \
@@ -1,5 +1,18 @@
 import boto3
 import hashlib
+import numpy as np
+import os
+import sys
+import threading
+
+# Import for the AWS S3 interface
+import propscreen.awsinterface as awsinterface
+
+# Import for the filter checked before the exact store of hashes
+from propscreen.bloomfilter import BloomFilter
+
+# Import for the memory-mapped hash index files
+import propscreen.hashstore as hashstore
 
 ############
 # SIHASHER #
@@ -10,13 +23,35 @@ tokens that are present in the LLM's response and perform a check of those
 tokens against the hashes of the sensitive information.
 """
 
+# Characters that are stripped from both ends of a token before it is hashed
+STRIP_CHARS = ",<>./?!'}{][|"
+
+# Target false positive rate of the Bloom filter in front of the hashes, 0
+# disables the filter
+SI_HASH_BLOOM_FP_RATE = float(os.environ.get('SI_HASH_BLOOM_FP_RATE', 0.001))
+
+# Hashes downloaded from S3 are held in a set, the fastest lookup, when there are
+# at most this many of them (about 107 bytes of memory per hash per worker), and
+# in a sorted array with a Bloom filter in front (about 34 bytes) otherwise
+SI_HASH_SET_MAX_ENTRIES = int(os.environ.get('SI_HASH_SET_MAX_ENTRIES', 1000000))
+
+# Optional path of a hash index file (see hashstore) that is memory-mapped 
+# instead of downloading the hashes from S3
+SI_HASH_INDEX_PATH = os.environ.get('SI_HASH_INDEX_PATH')
+
+# Number of tokens of the longest phrase of sensitive information that is 
+# matched, phrases of three or more tokens need the phrase fingerprints of a 
+# hash index file
+SI_MAX_PHRASE_TOKENS = int(os.environ.get('SI_MAX_PHRASE_TOKENS', 8))
+
 def check_hash(token: str, bucket_name: str, object_key: str) -> bool:
     """
     Description
     -----------
     Hashes the token and checks the hashed token against the array of hashed
-    sensitive information. The function then checks if the hash exists inside 
-    the loaded list of the hashes. 
+    sensitive information. The hashes are held by the process-wide HashIndex
+    for the bucket and object, so the S3 object is only downloaded the first 
+    time it is needed.
     
     Parameters
     ----------
@@ -35,21 +70,538 @@ def check_hash(token: str, bucket_name: str, object_key: str) -> bool:
     """
     
     # Trivial formatting of the token
-    token = token.strip(",<>./?!'}{][|")
-    token = token.replace('"','')
+    token = normalize_token(token)
 
     # Hashes the token 
     encoded_token = bytes(token, 'utf-8')
-    token_hash = hashlib.sha256(encoded_token).hexdigest()
+    token_hash = hashlib.sha256(encoded_token).digest()
+
+    # Get the shared index of the hashed data
+    hash_index = get_hash_index(bucket_name, object_key)
+
+    return hash_index.contains_digest(token_hash)
+
+def check_hashes(tokens: list, bucket_name: str, object_key: str,
+                 max_phrase_tokens: int = None) -> list:
+    """
+    Description
+    -----------
+    Batch version of check_hash for a whole LLM response. Every token and every
+    pair of adjacent tokens (see concat_tokens) is normalized, encoded, hashed
+    and looked up against the shared HashIndex in a single pass. When the hash
+    index has phrase fingerprints (see phrasematcher), the windows of three to
+    max_phrase_tokens tokens that pass the rolling hash prefilter are checked 
+    as well.
+    
+    Parameters
+    ----------
+    tokens : list
+        The tokens of the LLM response
+    bucket_name : str
+        The name of the AWS S3 bucket that will be accessed
+    object_key : 
+        The name of the S3 object that will be accessed, this object should be
+        where the list of hashes is stored
+    max_phrase_tokens : int
+        The number of tokens of the longest window checked, SI_MAX_PHRASE_TOKENS
+        by default
+
+    Returns
+    -------
+    hits : list
+        One boolean per candidate, the first len(tokens) items are the results
+        of the single tokens (in order), the next items are the results of the
+        concatenated tokens, so hits[i] refers to the same candidate that 
+        check_hash would have been called with at that position, and the last
+        items are the results of the longer windows that passed the prefilter
+    """
+    _, hits = check_candidates(tokens, get_hash_index(bucket_name, object_key),
+                               max_phrase_tokens)
+    return hits
+
+def find_hash_hits(tokens: list, bucket_name: str, object_key: str,
+                   max_phrase_tokens: int = None) -> list:
+    """
+    Description
+    -----------
+    Same check as check_hashes, returns where the hits are instead of one
+    boolean per candidate.
+
+    Returns
+    -------
+    hits : list
+        The (start, number of tokens) of every candidate that matched a hash
+    """
+    spans, hits = check_candidates(tokens, get_hash_index(bucket_name, object_key),
+                                   max_phrase_tokens)
+    return [span for span, hit in zip(spans, hits) if hit]
+
+def check_candidates(tokens: list, hash_index, max_phrase_tokens: int = None) -> tuple:
+    """
+    Description
+    -----------
+    Builds the candidates of check_hashes and looks them up in the hash index.
+
+    Returns
+    -------
+    spans, hits : tuple
+        The (start, number of tokens) of every candidate and whether it matched
+        a hash, in the order described in check_hashes
+    """
+    if max_phrase_tokens is None:
+        max_phrase_tokens = SI_MAX_PHRASE_TOKENS
+
+    # Same formatting as check_hash applies, inlined so that there is no 
+    # function call per candidate. The concatenated tokens are formatted twice,
+    # once by concat_tokens and once by check_hash, which is not the same as
+    # formatting them once when a token is wrapped in quotes
+    candidates = [token.strip(STRIP_CHARS).replace('"','') for token in tokens]
+    candidates.extend([(first + " " + second).strip(STRIP_CHARS).replace('"','')
+                       .strip(STRIP_CHARS).replace('"','')
+                       for first, second in zip(tokens, tokens[1:])])
+    spans = [(start, 1) for start in range(len(tokens))]
+    spans.extend((start, 2) for start in range(len(tokens) - 1))
+
+    # Only the longer windows whose rolling hash matches a phrase are hashed
+    phrase_fingerprints = hash_index.phrase_fingerprints \
+        if max_phrase_tokens > 2 else None
+    if phrase_fingerprints is not None:
+        windows = [window for window in phrase_fingerprints.find(tokens,
+                                                                 max_phrase_tokens)
+                   if window[1] > 2]
+        candidates.extend(normalize_phrase(' '.join(tokens[start:start + length]))
+                          for start, length in windows)
+        spans.extend(windows)
+
+    sha256 = hashlib.sha256
+    digests = [sha256(candidate.encode('utf-8')).digest() 
+               for candidate in candidates]
+
+    return spans, hash_index.contains_digests(digests)
+
+def max_phrase_length(bucket_name: str, object_key: str) -> int:
+    """
+    Returns the number of tokens of the longest candidate that check_hashes 
+    can match for the hash index, at least 2 (the pairs of tokens)
+    """
+    phrase_fingerprints = get_hash_index(bucket_name, object_key).phrase_fingerprints
+    if phrase_fingerprints is None:
+        return 2
+    return max(2, min(SI_MAX_PHRASE_TOKENS, phrase_fingerprints.max_length))
+
+def normalize_token(token: str) -> str:
+    """
+    Description
+    -----------
+    Applies the trivial formatting that every token (or concatenated token) 
+    receives before it is hashed. The same formatting has to be applied to the
+    sensitive information when its hashes are generated, otherwise no match 
+    will be found.
+
+    Parameters
+    ----------
+    token : str
+        A token, or a set of tokens joined by a space, from the LLM response
+
+    Returns
+    -------
+    token : str
+        The formatted token
+    """
+    token = token.strip(STRIP_CHARS)
+    token = token.replace('"','')
+    return token
+
+def normalize_phrase(phrase: str) -> str:
+    """
+    Description
+    -----------
+    Applies the formatting that a candidate of the LLM's response equal to the
+    phrase receives in check_hashes: a single token is formatted once, a pair 
+    of tokens is formatted twice (once by concat_tokens and once by 
+    check_hash). Used to hash the sensitive information, so that its hashes 
+    match the hashes of the response.
+
+    Parameters
+    ----------
+    phrase : str
+        A piece of sensitive information, one token or tokens separated by 
+        spaces
+
+    Returns
+    -------
+    phrase : str
+        The formatted phrase
+    """
+    candidate = normalize_token(phrase)
+    if ' ' in phrase:
+        candidate = normalize_token(candidate)
+    return candidate
+
+class HashIndex:
+    """
+    Description
+    -----------
+    A long lived, in-memory index of the hashed organizational sensitive 
+    information stored in an S3 object. The hashes are downloaded once, 
+    converted to their raw 32 byte digests and stored in a HashStore, a set
+    of the digests or, for large databases, a Bloom filter in front of a
+    compact sorted array of the digests, so that most lookups stop at the
+    filter. The store is held by the 
+    awsinterface S3ObjectCache, so it is revalidated against the object's ETag 
+    once the cache TTL has passed and rebuilt only when the object changed. One
+    index is shared by every request in the process, use get_hash_index() to 
+    obtain it.
+
+    When index_path is set the hashes are read from that hash index file 
+    instead of the S3 object (see hashstore). The file is memory-mapped and 
+    searched in place, and it is mapped again when it is replaced.
+
+    Parameters
+    ----------
+    bucket_name : str
+        The name of the AWS S3 bucket that holds the hashes
+    object_key : str
+        The name of the S3 object that holds the hashes
+    index_path : str
+        Optional path of a hash index file that is used instead of the S3 object
+    """
+
+    def __init__(self, bucket_name: str, object_key: str, index_path: str = None):
+        self.bucket_name = bucket_name
+        self.object_key = object_key
+        self.index_path = index_path
+        self._mapped_store = None
+
+    def _get_entry(self) -> tuple:
+        """
+        Returns the HashStore and the version (the S3 object's ETag or the hash
+        index file's version) it was loaded from, (None, None) if the hashes 
+        could not be loaded. A failed load is not remembered so that the next
+        lookup tries again.
+        """
+        try:
+            if self.index_path:
+                return self._get_mapped_entry()
+            entry = awsinterface.s3_object_cache.get(self.bucket_name, 
+                                                     self.object_key, 
+                                                     parse_hash_store)
+            return entry.value, entry.etag
+        except Exception as e:
+            print(f"Error: {str(e)}", flush=True)
+            return None, None
+
+    def _get_mapped_entry(self) -> tuple:
+        mapped_digests = hashstore.open_hash_index(self.index_path)
+        hash_store = self._mapped_store
+        if hash_store is None or hash_store.exact is not mapped_digests:
+            hash_store = HashStore(mapped_digests, mapped_digests.bloom_filter,
+                                   mapped_digests.phrase_fingerprints)
+            self._mapped_store = hash_store
+        return hash_store, mapped_digests.version
+
+    def _get_digests(self):
+        hash_store, _ = self._get_entry()
+        return hash_store if hash_store is not None else HashStore.from_digests(set())
 
-    # Call helper function to get the hashed data
-    hash_si_list = list_s3_objects(bucket_name, object_key) 
+    @property
+    def version(self):
+        """
+        The version of the hashes that are currently loaded, None if the 
+        hashes could not be loaded
+        """
+        _, version = self._get_entry()
+        return version
 
+    @property
+    def phrase_fingerprints(self):
+        """
+        The PhraseFingerprints of the phrases of three or more tokens, None if
+        the hashes have none
+        """
+        return self._get_digests().phrase_fingerprints
+
+    def reload(self):
+        """
+        Discards the loaded hashes, the next lookup downloads them again.
+        """
+        self._mapped_store = None
+        awsinterface.s3_object_cache.invalidate(self.bucket_name, self.object_key)
+
+    def contains_digest(self, digest: bytes) -> bool:
+        """
+        Returns True if the raw SHA-256 digest is one of the hashed sensitive
+        information entries.
+        """
+        return digest in self._get_digests()
+
+    def contains_digests(self, digests: list) -> list:
+        """
+        Returns a list of booleans, one per raw SHA-256 digest, that are True 
+        where the digest is one of the hashed sensitive information entries.
+        """
+        return self._get_digests().contains_many(digests)
+
+    def stats(self) -> dict:
+        """
+        Returns the size of the loaded store and how many lookups stopped at
+        the Bloom filter
+        """
+        return self._get_digests().stats()
+
+    def __contains__(self, token_hash: str) -> bool:
+        digest = hex_to_digest(token_hash)
+        return digest is not None and self.contains_digest(digest)
+
+    def __len__(self) -> int:
+        return len(self._get_digests())
+
+def parse_hash_digests(body: bytes) -> set:
+    """
+    Description
+    -----------
+    Parses the bytes of the CSV S3 object of hashes into the set of raw SHA-256
+    digests held by a HashIndex. The CSV is cleaned the same way as in 
+    list_s3_objects and entries that are not valid SHA-256 hashes are skipped.
+
+    Parameters
+    ----------
+    body : bytes
+        The contents of the S3 object
+
+    Returns
+    -------
+    digests : set
+        The set of raw 32 byte digests
+    """
+    csv_string = body.decode('utf-8')
+    csv_string = csv_string.replace("\n", "").replace("\r", "").replace("\ufeff", "")
+
+    digests = set()
+    for si_hash in csv_string.split(','):
+        digest = hex_to_digest(si_hash)
+        if digest is not None:
+            digests.add(digest)
+    print(f"DEBUG: Hash index loaded {len(digests)} hashes", flush=True)
+    return digests
+
+def parse_hash_store(body: bytes):
+    """
+    Description
+    -----------
+    Parses the bytes of the CSV S3 object of hashes into the HashStore held by
+    a HashIndex: a set of up to SI_HASH_SET_MAX_ENTRIES hashes, otherwise a
+    sorted array with a Bloom filter sized for SI_HASH_BLOOM_FP_RATE.
+
+    Parameters
+    ----------
+    body : bytes
+        The contents of the S3 object
+
+    Returns
+    -------
+    hash_store : HashStore
+        The store of the digests
+    """
+    return HashStore.from_digests(parse_hash_digests(body), SI_HASH_BLOOM_FP_RATE,
+                                  SI_HASH_SET_MAX_ENTRIES)
+
+class SetDigests(frozenset):
+    """
+    Description
+    -----------
+    Exact store of raw SHA-256 digests in a frozenset. A lookup is a single
+    hash table probe, faster than any filter in front of it, but every digest
+    takes about 107 bytes against the 32 bytes of SortedDigests.
+
+    Parameters
+    ----------
+    digests : collection
+        The raw 32 byte digests
+    """
+
+    def contains_many(self, digests: list) -> list:
+        return [digest in self for digest in digests]
+
+    @property
+    def size_in_bytes(self) -> int:
+        return sys.getsizeof(self) + len(self) * sys.getsizeof(bytes(32))
+
+class SortedDigests:
+    """
+    Description
+    -----------
+    Exact store of raw SHA-256 digests kept as one bytes object of the sorted,
+    concatenated digests and searched with a binary search. It takes 32 bytes
+    per digest, a fraction of the memory of a set of bytes objects.
+
+    Parameters
+    ----------
+    digests : collection
+        The raw 32 byte digests, duplicates are removed
+    """
+
+    DIGEST_SIZE = hashlib.sha256().digest_size
+
+    def __init__(self, digests):
+        self._data = b''.join(sorted(set(digests)))
+        self._count = len(self._data) // self.DIGEST_SIZE
+        self._array = np.frombuffer(self._data, dtype=f"S{self.DIGEST_SIZE}")
+
+    def __contains__(self, digest: bytes) -> bool:
+        data = self._data
+        size = self.DIGEST_SIZE
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            entry = data[middle * size:(middle + 1) * size]
+            if entry < digest:
+                low = middle + 1
+            elif entry > digest:
+                high = middle
+            else:
+                return True
+        return False
+
+    def contains_many(self, digests: list) -> list:
+        return hashstore.contains_sorted(self._array, digests)
+
+    def __len__(self) -> int:
+        return self._count
+
+    @property
+    def size_in_bytes(self) -> int:
+        return len(self._data)
+
+class HashStore:
+    """
+    Description
+    -----------
+    The digests of a HashIndex: an optional BloomFilter in front of the exact
+    store, SetDigests, SortedDigests or the MappedDigests of a hash index file.
+    A digest the filter rejects is certainly not in the store, only the 
+    possible hits fall through to the binary search. The digests of a response
+    are probed and searched together, see contains_many.
+
+    Parameters
+    ----------
+    exact : SetDigests, SortedDigests or MappedDigests
+        The exact store of the raw 32 byte digests
+    bloom_filter : BloomFilter
+        The filter of the same digests, None for no filter
+    phrase_fingerprints : PhraseFingerprints
+        The fingerprints of the phrases of three or more tokens, None if there
+        are none
+    """
+
+    def __init__(self, exact, bloom_filter: BloomFilter = None,
+                 phrase_fingerprints=None):
+        self.exact = exact
+        self.bloom_filter = bloom_filter
+        self.phrase_fingerprints = phrase_fingerprints
+        self.lookups = 0
+        self.filter_passes = 0
+
+    @classmethod
+    def from_digests(cls, digests, fp_rate: float = 0, max_set_entries: int = 0):
+        """
+        Creates the store of a collection of digests: a SetDigests when there
+        are at most max_set_entries digests, otherwise a SortedDigests with a
+        Bloom filter of the given false positive rate, 0 for no filter
+        """
+        if len(digests) <= max_set_entries:
+            return cls(SetDigests(digests))
+        exact = SortedDigests(digests)
+        bloom_filter = BloomFilter.from_digests(digests, fp_rate) \
+            if fp_rate and len(exact) else None
+        return cls(exact, bloom_filter)
+
+    def __contains__(self, digest: bytes) -> bool:
+        self.lookups += 1
+        if self.bloom_filter is not None and digest not in self.bloom_filter:
+            return False
+        self.filter_passes += 1
+        return digest in self.exact
+
+    def contains_many(self, digests: list) -> list:
+        """
+        Returns one boolean per raw SHA-256 digest, True where the digest is in
+        the store. The whole batch is probed in the filter at once and only the
+        digests that pass it are looked up in the exact store, together.
+        """
+        exact = self.exact
+        bloom_filter = self.bloom_filter
+        self.lookups += len(digests)
+        if bloom_filter is None:
+            self.filter_passes += len(digests)
+            return exact.contains_many(digests)
+
+        candidates = bloom_filter.contains_many(digests).nonzero()[0].tolist()
+        self.filter_passes += len(candidates)
+        hits = [False] * len(digests)
+        if candidates:
+            found = exact.contains_many([digests[i] for i in candidates])
+            for i, hit in zip(candidates, found):
+                hits[i] = hit
+        return hits
+
+    def __len__(self) -> int:
+        return len(self.exact)
+
+    def stats(self) -> dict:
+        bloom_filter = self.bloom_filter
+        return {
+            "hashes": len(self.exact),
+            "exact_store_bytes": self.exact.size_in_bytes,
+            "bloom_filter_bytes": bloom_filter.size_in_bytes if bloom_filter else 0,
+            "bloom_filter_fp_rate": bloom_filter.fp_rate if bloom_filter else None,
+            "lookups": self.lookups,
+            "bloom_filter_passes": self.filter_passes,
+            "phrases": len(self.phrase_fingerprints) if self.phrase_fingerprints else 0,
+        }
+
+_hash_indexes = {}
+_hash_indexes_lock = threading.Lock()
+
+def get_hash_index(bucket_name: str, object_key: str) -> HashIndex:
+    """
+    Description
+    -----------
+    Returns the process-wide HashIndex for an S3 object, creating it the first
+    time the object is requested.
+
+    Parameters
+    ----------
+    bucket_name : str
+        The name of the AWS S3 bucket that holds the hashes
+    object_key : str
+        The name of the S3 object that holds the hashes
+
+    Returns
+    -------
+    hash_index : HashIndex
+        The shared index for the bucket and object
+    """
+    key = (bucket_name, object_key)
+    hash_index = _hash_indexes.get(key)
+    if hash_index is None:
+        with _hash_indexes_lock:
+            hash_index = _hash_indexes.setdefault(key, HashIndex(
+                bucket_name, object_key, index_path=SI_HASH_INDEX_PATH))
+    return hash_index
+
+def hex_to_digest(si_hash: str):
+    """
+    Converts a hex encoded SHA-256 hash into its raw 32 byte digest, returns 
+    None if the string is not a valid SHA-256 hash.
+    """
     try:
-        #print("DEBUG: hash check findings, ", token_hash in hash_si_list, flush=True)
-        return token_hash in hash_si_list
-    except Exception as e:
-        print(f"Error: {str(e)}")
+        digest = bytes.fromhex(si_hash.strip())
+    except ValueError:
+        return None
+    if len(digest) != hashlib.sha256().digest_size:
+        return None
+    return digest
 
 def list_s3_objects(bucket_name, object_key):
     """
@@ -116,7 +668,6 @@ def concat_tokens(tokens: list) -> list:
         temp = tokens[i] + " " + tokens[i + 1]
         temp = str(temp)
         # Trivial sanitization of the tokens 
-        temp = temp.strip(",<>./?!'}{][|")
-        temp = temp.replace('"','')
+        temp = normalize_token(temp)
         concatenated_list.append(temp)
     return concatenated_list
\ No newline at end of file
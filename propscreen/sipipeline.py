@@ -0,0 +1,169 @@
+from concurrent.futures import FIRST_COMPLETED, wait
+
+##############
+# SIPIPELINE #
+##############
+"""
+sipipeline is the engine that decides if an LLM's response contains
+organizational sensitive information. The checks are stages with a declared
+cost, the engine runs the cheapest stages first and stops as soon as the
+decision cannot change any more, so the expensive LLM Guard scan is skipped
+whenever the cheap checks already settle the outcome.
+"""
+
+TRUE_NEGATIVE = "True Negative"
+TRUE_POSITIVE = "True Positive"
+FALSE_POSITIVE = "False Positive"
+
+# Names of the stages whose results decide() reads
+LLM_GUARD_STAGE = "llm_guard"
+CONTEXT_STAGE = "context"
+HASH_STAGE = "hash"
+
+class PipelineStage:
+    """
+    Description
+    -----------
+    A single check of the pipeline.
+
+    Parameters
+    ----------
+    name : str
+        The name the result of the stage is stored under
+    func : callable
+        The check, it is called with the prompt and the model output
+    cost : float
+        The relative cost of the check, cheaper stages run first
+    """
+
+    def __init__(self, name: str, func, cost: float):
+        self.name = name
+        self.func = func
+        self.cost = cost
+
+    def run(self, prompt: str, model_output: str):
+        return self.func(prompt, model_output)
+
+def decide(results: dict):
+    """
+    Description
+    -----------
+    Decides the outcome of the scan from the results of the stages that have
+    run so far, returns None while the outcome still depends on a stage that
+    has not run. The rules are:
+
+    - LLM Guard found no sensitive information and no context string was
+      found: True Negative
+    - otherwise, a token or pair of tokens matched a hash of the organizational
+      sensitive information: True Positive
+    - otherwise: False Positive
+
+    So a context string hit decides the outcome without LLM Guard, and a hash
+    hit alone does not, since a clean LLM Guard scan without context strings is
+    a True Negative regardless of the hashes.
+
+    Parameters
+    ----------
+    results : dict
+        The results of the stages that have run, by stage name. The LLM Guard
+        result is the (text, valid, score) tuple, the context and hash results
+        are lists of booleans
+
+    Returns
+    -------
+    decision : str
+        TRUE_NEGATIVE, TRUE_POSITIVE, FALSE_POSITIVE or None
+    """
+    llm_guard_output = results.get(LLM_GUARD_STAGE)
+    context_string_found = results.get(CONTEXT_STAGE)
+    hit_count = results.get(HASH_STAGE)
+
+    llm_guard_hit = None if llm_guard_output is None else llm_guard_output[1]
+    context_found = None if context_string_found is None \
+        else True in context_string_found
+    hash_found = None if hit_count is None else True in hit_count
+
+    if llm_guard_hit == True and context_found == False:
+        return TRUE_NEGATIVE
+
+    initial_check_failed = context_found == True or (
+        llm_guard_hit is not None and llm_guard_hit == False)
+    if initial_check_failed and hash_found is not None:
+        return TRUE_POSITIVE if hash_found else FALSE_POSITIVE
+
+    return None
+
+class SIPipeline:
+    """
+    Description
+    -----------
+    Runs the stages in order of cost and stops as soon as the decide function
+    returns a decision. Stages cheaper than inline_cost_limit run one after the
+    other on the calling thread. The remaining, expensive stages are started
+    together on the executor so that they overlap, and the ones that are still
+    waiting are cancelled once the decision is certain.
+
+    Parameters
+    ----------
+    stages : list
+        The list of PipelineStage objects
+    executor : concurrent.futures.Executor
+        The executor the expensive stages run on
+    inline_cost_limit : float
+        Stages with a lower cost run on the calling thread
+    decide : callable
+        Function that takes the dict of results so far and returns the
+        decision or None, decide() by default
+    """
+
+    def __init__(self, stages: list, executor, inline_cost_limit: float = 10,
+                 decide=decide):
+        self.stages = sorted(stages, key=lambda stage: stage.cost)
+        self.executor = executor
+        self.inline_cost_limit = inline_cost_limit
+        self.decide = decide
+
+    def run(self, prompt: str, model_output: str) -> tuple:
+        """
+        Description
+        -----------
+        Runs the pipeline on a model output.
+
+        Parameters
+        ----------
+        prompt : str
+            The prompt that was sent to the LLM
+        model_output : str
+            The response that the LLM has generated
+
+        Returns
+        -------
+        decision, results : tuple
+            The decision (None if the stages did not lead to one) and the
+            results of the stages that ran, by stage name
+        """
+        results = {}
+
+        inline_stages = [stage for stage in self.stages
+                         if stage.cost < self.inline_cost_limit]
+        for stage in inline_stages:
+            results[stage.name] = stage.run(prompt, model_output)
+            decision = self.decide(results)
+            if decision is not None:
+                return decision, results
+
+        futures = {self.executor.submit(stage.run, prompt, model_output): stage
+                   for stage in self.stages if stage not in inline_stages}
+        try:
+            while futures:
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in sorted(done, key=lambda future: futures[future].cost):
+                    results[futures.pop(future).name] = future.result()
+                decision = self.decide(results)
+                if decision is not None:
+                    return decision, results
+        finally:
+            for future in futures:
+                future.cancel()
+
+        return self.decide(results), results
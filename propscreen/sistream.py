@@ -0,0 +1,155 @@
+############
+# SISTREAM #
+############
+"""
+sistream scans an LLM's response while it is being streamed. Every chunk is
+split into tokens the same way sensitive_info_check splits a whole response,
+the complete tokens and windows of tokens are checked against the hashes of 
+the organizational sensitive information and the context strings are matched with
+a resumable ContextMatcher, so hits that span the boundary between two chunks
+are still found. Text is released to the user once every check it takes part
+in has passed, and the stream is cut as soon as a True Positive is certain.
+"""
+
+class StreamScanner:
+    """
+    Description
+    -----------
+    Incremental scanner of a streamed response. feed() takes the next chunk and
+    returns the text that can be released to the user, finish() is called once
+    the stream has ended and the rest of the text, held_text(), is only sent
+    after the final decision. The last carried_tokens complete tokens are held
+    back until the windows they start have been checked with the next tokens.
+    Once a token (or window of tokens) matches a hash, no
+    more text is released until the final decision has been made for the whole
+    response, so a hashed token is never sent before the decision. blocked is
+    set as soon as a True Positive is certain, i.e. a hash matched and either a
+    context string was found or LLM Guard found sensitive information in the
+    text received so far.
+
+    Parameters
+    ----------
+    find_hashes : callable
+        Takes a list of tokens and returns the (start, number of tokens) of the
+        candidates that match a hash, see sihasher.find_hash_hits
+    context_matcher : ContextMatcher
+        The matcher holding the context strings
+    llm_guard_check : callable
+        Takes the text received so far and returns the (text, valid, score)
+        tuple of LLM Guard's Sensitive scan
+    carried_tokens : int
+        The number of tokens of the longest candidate minus one, 1 when only
+        single tokens and pairs are checked
+    """
+
+    def __init__(self, find_hashes, context_matcher, llm_guard_check,
+                 carried_tokens: int = 1):
+        self.find_hashes = find_hashes
+        self.context_matcher = context_matcher
+        self.llm_guard_check = llm_guard_check
+        self.carried_tokens = max(1, carried_tokens)
+
+        self.text = ""
+        self.released = 0
+        self.hash_hit = False
+        self.context_found = bool(context_matcher.find(""))
+        self.blocked = False
+
+        # The last complete tokens and their offsets, they are not released 
+        # until the windows they start have been checked, and the offset of the
+        # incomplete token at the end of the text
+        self._carried = []
+        self._partial_start = 0
+        self._context_state = 0
+
+    def feed(self, chunk: str) -> str:
+        """
+        Description
+        -----------
+        Scans the next chunk of the response.
+
+        Parameters
+        ----------
+        chunk : str
+            The next chunk of the streamed response
+
+        Returns
+        -------
+        text : str
+            The text that has passed the scan and can be sent to the user, empty
+            if nothing can be released yet or the response is blocked
+        """
+        self.text += chunk
+
+        self._context_state, found = self.context_matcher.scan(chunk,
+                                                               self._context_state)
+        if found:
+            self.context_found = True
+            self._update_blocked(new_hash_hit=False)
+
+        # Only the tokens followed by a space are complete, the rest of the
+        # text may still grow with the next chunk
+        last_space = self.text.rfind(' ', self._partial_start)
+        if last_space != -1:
+            self._check_tokens(self.text[self._partial_start:last_space].split(' '))
+            self._partial_start = last_space + 1
+
+        return self._release(self._carried[0][1] if self._carried
+                             else self._partial_start)
+
+    def finish(self):
+        """
+        Description
+        -----------
+        Scans the last token of the response once the stream has ended. Nothing
+        is released, the caller makes the final decision for the whole response
+        and then sends held_text() unless the response is blocked.
+        """
+        self._check_tokens([self.text[self._partial_start:]])
+        self._partial_start = len(self.text)
+
+    def held_text(self) -> str:
+        """
+        Returns the text that has been received but not released
+        """
+        return self.text[self.released:]
+
+    def _check_tokens(self, tokens: list):
+        # The carried tokens are checked again with the new tokens, so that the
+        # windows that span the two are checked. Windows made only of carried
+        # tokens were checked before and are not counted again
+        carried = self._carried
+        offsets = [offset for _, offset in carried]
+        offset = self._partial_start
+        for token in tokens:
+            offsets.append(offset)
+            offset += len(token) + 1
+        tokens = [token for token, _ in carried] + tokens
+
+        new_hit = any(start + length > len(carried)
+                      for start, length in self.find_hashes(tokens))
+        self._carried = list(zip(tokens, offsets))[-self.carried_tokens:]
+
+        if new_hit:
+            self.hash_hit = True
+            self._update_blocked(new_hash_hit=True)
+
+    def _update_blocked(self, new_hash_hit: bool):
+        if self.blocked or not self.hash_hit:
+            return
+        if self.context_found:
+            self.blocked = True
+            return
+        # LLM Guard is only run when a new hash hit has been found, not for 
+        # every chunk that follows it
+        if new_hash_hit:
+            llm_guard_output = self.llm_guard_check(self.text)
+            if llm_guard_output[1] == False:
+                self.blocked = True
+
+    def _release(self, end: int) -> str:
+        if self.blocked or self.hash_hit or end <= self.released:
+            return ""
+        text = self.text[self.released:end]
+        self.released = end
+        return text
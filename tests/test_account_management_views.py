@@ -3,10 +3,16 @@
 # Core Flask imports
 
 # Third-party imports
+from pydantic import ValidationError
+import pytest
 
 # App imports
 from app.models import User
-from app.utils.custom_errors import CouldNotVerifyLogin
+from app.services.account_management_services import (
+    api_v2_gait_llm_check_batch_inner,
+)
+from app.views import account_management_views
+from app.utils.custom_errors import BatchTooLargeError, CouldNotVerifyLogin
 
 
 def test_index(client):
@@ -122,3 +128,31 @@ def test_logout(client, existing_user, user_details):
 
     # check that the path changed
     assert response.request.path == "/"
+
+
+def test_batch_check_rejects_empty_batch(app):
+    with pytest.raises(ValidationError):
+        api_v2_gait_llm_check_batch_inner([])
+
+
+def test_batch_check_rejects_large_batch(app):
+    # Rejected before the items are validated
+    items = [None] * (app.config["BATCH_SCAN_MAX_ITEMS"] + 1)
+
+    with pytest.raises(BatchTooLargeError):
+        api_v2_gait_llm_check_batch_inner(items)
+
+
+def test_batch_check_rejects_large_body(app, monkeypatch):
+    monkeypatch.setitem(app.config, "LOGIN_DISABLED", True)
+    monkeypatch.setitem(app.config, "BATCH_SCAN_MAX_BYTES", 64)
+
+    with app.test_request_context(
+        "/api/v2/gait-llm-check/batch",
+        method="POST",
+        json={"items": [{"prompt": "hello"}] * 10},
+    ):
+        response, status = account_management_views.api_v2_gait_llm_check_batch()
+
+    assert status == 413
+    assert response["errors"]["display_error"] == BatchTooLargeError.message
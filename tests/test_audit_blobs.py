@@ -0,0 +1,197 @@
+# Standard Library imports
+import datetime
+
+# Core Flask imports
+
+# Third-party imports
+from sqlalchemy import delete, insert, text
+
+# App imports
+from app import audit_sink
+import app.audit_blobs as audit_blobs
+from app.models import AuditBlob, AuditLog
+from app.services import audit_log_services
+from app.utils.identifiers import uuid7
+
+
+OLD = datetime.datetime(2001, 1, 1)
+
+
+def test_content_digest_is_sha256_of_utf8():
+    # The same value as sha256(convert_to('abc', 'UTF8')) in Postgres
+    assert audit_blobs.content_digest("abc").hex() == (
+        "ba7816bf8f01cfea414140de5dae2223b00361a396177a9cb410ff61f20015ad"
+    )
+    assert len(audit_blobs.content_digest("é" * 1000)) == 32
+
+
+def test_repeated_contents_are_stored_once(db):
+    rows = [
+        audit_sink._make_row(
+            "blob test prompt",
+            f"blob test answer {i % 2}",
+            "True Negative",
+            str(uuid7()),
+        )
+        for i in range(4)
+    ]
+
+    audit_sink.insert_rows(db.session, rows)
+    audit_sink.insert_rows(db.session, rows[:1])
+
+    digests = {
+        audit_blobs.content_digest(content)
+        for content in ("blob test prompt", "blob test answer 0", "blob test answer 1")
+    }
+    blobs = db.session.query(AuditBlob).filter(AuditBlob.digest.in_(digests)).all()
+    assert len(blobs) == 3
+    assert {blob.size for blob in blobs} == {16, 18}
+    records = (
+        db.session.query(AuditLog)
+        .filter(AuditLog.audit_log_id.in_([row["audit_log_id"] for row in rows]))
+        .all()
+    )
+    assert len(records) == 4
+
+
+def test_audit_records_are_read_with_their_text(db):
+    row = audit_sink._make_row(
+        "blob read prompt", "blob read answer", "True Positive", str(uuid7())
+    )
+    audit_sink.insert_rows(db.session, [row])
+
+    record = (
+        audit_log_services.audit_record_query()
+        .filter(AuditLog.audit_log_id == row["audit_log_id"])
+        .one()
+    )
+    assert record.prompt == "blob read prompt"
+    assert record.llm_response == "blob read answer"
+    model = db.session.get(AuditLog, (row["audit_log_id"], row["created_at"]))
+    assert model.prompt == "blob read prompt"
+    assert model.llm_response == "blob read answer"
+
+
+def test_text_columns_are_written_for_the_previous_release(db, monkeypatch):
+    # The text columns of the 20261018_audit_blob revision, rolled back with
+    # the test
+    db.session.execute(
+        text(
+            "ALTER TABLE audit_log "
+            "ADD COLUMN prompt text, ADD COLUMN llm_response text"
+        )
+    )
+    monkeypatch.setattr(audit_sink, "write_text_columns", True)
+    row = audit_sink._make_row(
+        "blob dual prompt", "blob dual answer", "True Negative", str(uuid7())
+    )
+
+    audit_sink.insert_rows(db.session, [row])
+
+    assert tuple(
+        db.session.execute(
+            text(
+                "SELECT prompt, llm_response FROM audit_log "
+                "WHERE audit_log_id = CAST(:audit_log_id AS uuid)"
+            ),
+            {"audit_log_id": row["audit_log_id"]},
+        ).one()
+    ) == ("blob dual prompt", "blob dual answer")
+    model = db.session.get(AuditLog, (row["audit_log_id"], row["created_at"]))
+    assert model.prompt == "blob dual prompt"
+
+
+def _commit_old_blobs(engine, contents):
+    with engine.begin() as connection:
+        connection.execute(
+            insert(AuditBlob.__table__).values(
+                [
+                    {
+                        "digest": audit_blobs.content_digest(content),
+                        "content": content,
+                        "size": len(content),
+                        "created_at": OLD,
+                    }
+                    for content in contents
+                ]
+            )
+        )
+    return [audit_blobs.content_digest(content) for content in contents]
+
+
+def _delete_committed(engine, digests, audit_log_ids=()):
+    with engine.begin() as connection:
+        connection.execute(
+            delete(AuditLog.__table__).where(
+                AuditLog.audit_log_id.in_(list(audit_log_ids))
+            )
+        )
+        connection.execute(
+            delete(AuditBlob.__table__).where(AuditBlob.digest.in_(digests))
+        )
+
+
+def _stored_digests(engine, digests):
+    with engine.connect() as connection:
+        return set(
+            connection.execute(
+                AuditBlob.__table__.select()
+                .with_only_columns(AuditBlob.digest)
+                .where(AuditBlob.digest.in_(digests))
+            ).scalars()
+        )
+
+
+def test_unreferenced_blobs_are_deleted(db):
+    referenced, unreferenced = _commit_old_blobs(
+        db.engine, ["blob cleanup referenced", "blob cleanup unreferenced"]
+    )
+    audit_log_id = str(uuid7())
+    try:
+        with db.engine.begin() as connection:
+            connection.execute(
+                insert(AuditLog.__table__).values(
+                    audit_log_id=audit_log_id,
+                    created_at=datetime.datetime(2026, 10, 1),
+                    decision="True Negative",
+                    prompt_digest=referenced,
+                    llm_response_digest=referenced,
+                )
+            )
+
+        assert audit_blobs.delete_unreferenced_blobs(db.engine, OLD) == 0
+        assert audit_blobs.delete_unreferenced_blobs(
+            db.engine, OLD + datetime.timedelta(days=1)
+        ) >= 1
+        assert _stored_digests(db.engine, [referenced, unreferenced]) == {referenced}
+    finally:
+        _delete_committed(db.engine, [referenced, unreferenced], [audit_log_id])
+
+
+def test_blobs_being_referenced_are_not_deleted(db):
+    (digest,) = _commit_old_blobs(db.engine, ["blob cleanup reused"])
+    try:
+        # Locks the blob until the end of the transaction
+        audit_blobs.insert_blobs(
+            db.session, AuditBlob.__table__, {digest: "blob cleanup reused"}
+        )
+
+        audit_blobs.delete_unreferenced_blobs(
+            db.engine, OLD + datetime.timedelta(days=1)
+        )
+
+        assert _stored_digests(db.engine, [digest]) == {digest}
+        db.session.execute(
+            insert(AuditLog.__table__).values(
+                audit_log_id=str(uuid7()),
+                created_at=datetime.datetime(2026, 10, 1),
+                decision="True Negative",
+                prompt_digest=digest,
+                llm_response_digest=digest,
+            )
+        )
+        db.session.flush()
+    finally:
+        # Releases the lock
+        db.session.rollback()
+        _delete_committed(db.engine, [digest])
@@ -0,0 +1,85 @@
+# Standard Library imports
+import base64
+import csv
+import datetime
+import gzip
+import io
+import json
+from types import SimpleNamespace
+
+# Core Flask imports
+
+# Third-party imports
+import pytest
+from pydantic import ValidationError
+
+# App imports
+from app.services import audit_log_services
+from app.utils.error_utils import get_validation_error_response
+from app.utils.validators import AuditLogSearchValidator
+
+
+def test_cursor_round_trip():
+    created_at = datetime.datetime(2026, 10, 18, 12, 30, 15, 123456)
+    audit_log_id = "01a14e5a-0f76-767a-9b03-81b74ed26505"
+    cursor = audit_log_services.encode_cursor(created_at, audit_log_id)
+    assert AuditLogSearchValidator(cursor=cursor).cursor == cursor
+    assert audit_log_services.decode_cursor(cursor) == (created_at, audit_log_id)
+
+
+@pytest.mark.parametrize(
+    "position",
+    [
+        ["2026-01-01T00:00:00", "x"],
+        ["2026-01-01T00:00:00", 1],
+        ["2026-01-01T00:00:00", None],
+        ["x", "01a14e5a-0f76-767a-9b03-81b74ed26505"],
+        {"created_at": "2026-01-01T00:00:00"},
+    ],
+)
+def test_tampered_cursor_is_rejected(position):
+    cursor = base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+    with pytest.raises(ValidationError) as e:
+        audit_log_services.search_audit_log(cursor=cursor)
+
+    response, status = get_validation_error_response(e.value, 422)
+    assert status == 422
+    assert response["errors"]["field_errors"][0]["loc"] == ["cursor"]
+    json.dumps(response)
+
+
+def _records(count):
+    return [
+        SimpleNamespace(
+            audit_log_id=f"id-{i}",
+            created_at=datetime.datetime(2026, 10, 1) + datetime.timedelta(seconds=i),
+            prompt=f'prompt, "{i}"',
+            llm_response="line one\nline two",
+            decision="True Negative",
+        )
+        for i in range(count)
+    ]
+
+
+def test_ndjson_export_is_chunked_and_gzipped(monkeypatch):
+    monkeypatch.setattr(audit_log_services, "EXPORT_CHUNK_SIZE", 256)
+    chunks = list(audit_log_services._iter_ndjson_chunks(_records(50)))
+    assert len(chunks) > 1
+    lines = b"".join(chunks).decode().splitlines()
+    assert [json.loads(line)["audit_log_id"] for line in lines] == [
+        f"id-{i}" for i in range(50)
+    ]
+
+    compressed = audit_log_services._iter_gzip_chunks(iter(chunks))
+    assert gzip.decompress(b"".join(compressed)) == b"".join(chunks)
+
+
+def test_csv_export_round_trip(monkeypatch):
+    monkeypatch.setattr(audit_log_services, "EXPORT_CHUNK_SIZE", 256)
+    data = b"".join(audit_log_services._iter_csv_chunks(_records(20))).decode()
+    rows = list(csv.DictReader(io.StringIO(data)))
+    assert len(rows) == 20
+    assert rows[3]["prompt"] == 'prompt, "3"'
+    assert rows[3]["llm_response"] == "line one\nline two"
+    assert rows[3]["created_at"] == "2026-10-01T00:00:03"
@@ -0,0 +1,126 @@
+# Standard Library imports
+import datetime
+import gzip
+import json
+
+# Core Flask imports
+
+# Third-party imports
+from sqlalchemy import delete, text
+
+# App imports
+from app import audit_sink
+import app.audit_blobs as audit_blobs
+import app.audit_partitions as audit_partitions
+from app.models import AuditBlob, AuditDecisionRollup
+from app.utils.identifiers import uuid7
+
+
+def test_add_months_crosses_years():
+    assert audit_partitions.add_months(
+        datetime.date(2026, 11, 1), 3
+    ) == datetime.date(2027, 2, 1)
+    assert audit_partitions.add_months(
+        datetime.date(2026, 1, 1), -13
+    ) == datetime.date(2024, 12, 1)
+
+
+def test_partition_name_round_trip():
+    month = datetime.date(2026, 3, 1)
+    name = audit_partitions.partition_name(month)
+    assert name == "audit_log_p202603"
+    assert audit_partitions.partition_month(name) == month
+    assert audit_partitions.partition_month(audit_partitions.DEFAULT_PARTITION) is None
+
+
+def test_create_partition_sql_covers_one_month():
+    sql = audit_partitions.create_partition_sql(datetime.date(2026, 12, 1))
+    assert "audit_log_p202612 PARTITION OF audit_log" in sql
+    assert "FROM ('2026-12-01') TO ('2027-01-01')" in sql
+
+
+def _partition_names(engine):
+    with engine.connect() as connection:
+        return {name for _, name in audit_partitions.list_partitions(connection)}
+
+
+def test_partitions_are_created_and_archived(db, tmp_path):
+    row = audit_sink._make_row(
+        "partition test prompt", "partition test answer", "partition test", str(uuid7())
+    )
+    # Lands in the default partition, the partition of its month does not exist
+    row["created_at"] = datetime.datetime(2101, 2, 3, 4, 5, 6)
+    names = ["audit_log_p210101", "audit_log_p210102"]
+    try:
+        with db.engine.begin() as connection:
+            audit_sink.insert_rows(connection, [row])
+
+        created = audit_partitions.create_future_partitions(
+            db.engine, 1, today=datetime.date(2101, 1, 15)
+        )
+        assert created == names
+        assert set(names) <= _partition_names(db.engine)
+        with db.engine.connect() as connection:
+            # The row was moved out of the default partition
+            assert connection.execute(
+                text("SELECT audit_log_id::text FROM audit_log_p210102")
+            ).scalars().all() == [row["audit_log_id"]]
+
+        expired = audit_partitions.expired_partitions(
+            db.engine, 12, today=datetime.date(2102, 2, 1)
+        )
+        expired_names = [name for _, name in expired]
+        assert "audit_log_p210101" in expired_names
+        assert "audit_log_p210102" not in expired_names
+
+        archive = audit_partitions.archive_partition(
+            db.engine, "audit_log_p210102", archive_dir=str(tmp_path)
+        )
+
+        assert archive["rows"] == 1
+        assert "audit_log_p210102" not in _partition_names(db.engine)
+        with gzip.open(archive["path"], "rt", encoding="utf-8") as f:
+            archived = [json.loads(line) for line in f]
+        assert archived == [
+            {
+                "audit_log_id": row["audit_log_id"],
+                "created_at": row["created_at"].isoformat(),
+                "prompt": "partition test prompt",
+                "llm_response": "partition test answer",
+                "decision": "partition test",
+            }
+        ]
+    finally:
+        with db.engine.begin() as connection:
+            for name in names:
+                connection.execute(text(f"DROP TABLE IF EXISTS {name}"))
+            connection.execute(
+                delete(AuditDecisionRollup.__table__).where(
+                    AuditDecisionRollup.decision == "partition test"
+                )
+            )
+            connection.execute(
+                delete(AuditBlob.__table__).where(
+                    AuditBlob.digest.in_(
+                        [
+                            audit_blobs.content_digest("partition test prompt"),
+                            audit_blobs.content_digest("partition test answer"),
+                        ]
+                    )
+                )
+            )
+
+
+def test_legacy_partition_months_are_not_created(db):
+    with db.engine.connect() as connection:
+        partitions = audit_partitions.list_partitions(connection)
+    # The test database is migrated from an unpartitioned audit_log
+    (legacy_month,) = [
+        month
+        for month, name in partitions
+        if name == audit_partitions.LEGACY_PARTITION
+    ]
+
+    assert audit_partitions.create_future_partitions(
+        db.engine, 0, today=legacy_month
+    ) == []
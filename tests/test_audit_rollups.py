@@ -0,0 +1,130 @@
+# Standard Library imports
+import datetime
+
+# Core Flask imports
+
+# Third-party imports
+from sqlalchemy import delete
+
+# App imports
+from app import audit_sink
+import app.audit_blobs as audit_blobs
+import app.audit_rollups as audit_rollups
+from app.models import AuditBlob, AuditDecisionRollup, AuditLog
+from app.utils.identifiers import uuid7
+
+
+def test_aggregate_rows_per_hour_and_decision():
+    rows = [
+        (datetime.datetime(2026, 10, 18, 10, 59), "True Positive", 10),
+        (datetime.datetime(2026, 10, 18, 10, 1), "True Positive", 5),
+        (datetime.datetime(2026, 10, 18, 11, 0), "True Positive", 7),
+        (datetime.datetime(2026, 10, 18, 10, 30), "False Positive", 1),
+    ]
+    assert audit_rollups.aggregate_rows(
+        {"created_at": created_at, "decision": decision, "size": size}
+        for created_at, decision, size in rows
+    ) == [
+        {
+            "bucket_start": datetime.datetime(2026, 10, 18, 10),
+            "decision": "False Positive",
+            "count": 1,
+            "total_bytes": 1,
+        },
+        {
+            "bucket_start": datetime.datetime(2026, 10, 18, 10),
+            "decision": "True Positive",
+            "count": 2,
+            "total_bytes": 15,
+        },
+        {
+            "bucket_start": datetime.datetime(2026, 10, 18, 11),
+            "decision": "True Positive",
+            "count": 1,
+            "total_bytes": 7,
+        },
+    ]
+
+
+def test_aggregate_rows_empty():
+    assert audit_rollups.aggregate_rows([]) == []
+
+
+def _make_rows(decision, created_at, count):
+    rows = [
+        audit_sink._make_row("rollup prompt", "rollup answer", decision, str(uuid7()))
+        for _ in range(count)
+    ]
+    for row in rows:
+        row["created_at"] = created_at
+    return rows
+
+
+def _rollup(connection, bucket, decision):
+    return connection.execute(
+        AuditDecisionRollup.__table__.select()
+        .with_only_columns(AuditDecisionRollup.count, AuditDecisionRollup.total_bytes)
+        .where(AuditDecisionRollup.bucket_start == bucket)
+        .where(AuditDecisionRollup.decision == decision)
+    ).first()
+
+
+def test_rollups_are_updated_with_the_audit_insert(db):
+    created_at = datetime.datetime(2001, 1, 1, 10, 30)
+    rows = _make_rows("rollup insert test", created_at, 3)
+
+    audit_sink.insert_rows(db.session, rows)
+    # The records that are already stored are not counted again
+    audit_sink.insert_rows(db.session, rows[:2])
+
+    bucket = datetime.datetime(2001, 1, 1, 10)
+    assert tuple(_rollup(db.session, bucket, "rollup insert test")) == (3, 3 * 26)
+    # Uncommitted, like the records
+    with db.engine.connect() as connection:
+        assert _rollup(connection, bucket, "rollup insert test") is None
+
+
+def test_backfill_recomputes_the_rollups(db):
+    created_at = datetime.datetime(2001, 1, 1, 11, 30)
+    rows = _make_rows("rollup backfill test", created_at, 2)
+    bucket = datetime.datetime(2001, 1, 1, 11)
+    try:
+        with db.engine.begin() as connection:
+            audit_sink.insert_rows(connection, rows)
+            connection.execute(
+                AuditDecisionRollup.__table__.update()
+                .where(AuditDecisionRollup.decision == "rollup backfill test")
+                .values(count=0, total_bytes=0)
+            )
+
+        assert audit_rollups.backfill_rollups(
+            db.engine, bucket, bucket + audit_rollups.BUCKET_SIZE
+        ) >= 1
+
+        with db.engine.connect() as connection:
+            assert tuple(_rollup(connection, bucket, "rollup backfill test")) == (
+                2,
+                2 * 26,
+            )
+    finally:
+        with db.engine.begin() as connection:
+            connection.execute(
+                delete(AuditLog.__table__).where(
+                    AuditLog.audit_log_id.in_([row["audit_log_id"] for row in rows])
+                )
+            )
+            connection.execute(
+                delete(AuditDecisionRollup.__table__).where(
+                    AuditDecisionRollup.decision == "rollup backfill test"
+                )
+            )
+            connection.execute(
+                delete(AuditBlob.__table__).where(
+                    AuditBlob.digest.in_(
+                        [
+                            audit_blobs.content_digest("rollup prompt"),
+                            audit_blobs.content_digest("rollup answer"),
+                        ]
+                    )
+                )
+            )
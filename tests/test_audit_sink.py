@@ -0,0 +1,121 @@
+# Standard Library imports
+import datetime
+import json
+import os
+import time
+
+# Core Flask imports
+
+# Third-party imports
+
+# App imports
+from app.audit_sink import AuditSink
+
+
+class RecordingAuditSink(AuditSink):
+    """Keeps the written rows instead of inserting them."""
+
+    def __init__(self):
+        super().__init__()
+        self.written_rows = []
+
+    def write_rows(self, rows):
+        self.written_rows.extend(rows)
+
+
+class FakeApp:
+    def __init__(self, spool_path):
+        self.config = {
+            "AUDIT_ASYNC": True,
+            "AUDIT_BATCH_SIZE": 10,
+            "AUDIT_FLUSH_INTERVAL_MS": 10,
+            "AUDIT_ENQUEUE_TIMEOUT_MS": 10,
+            "AUDIT_QUEUE_SIZE": 100,
+            "AUDIT_SPOOL_PATH": spool_path,
+            "AUDIT_SPOOL_RETRY_S": 0,
+            "AUDIT_WRITE_TEXT_COLUMNS": False,
+        }
+
+
+def spool_line(audit_log_id):
+    return json.dumps(
+        {
+            "audit_log_id": audit_log_id,
+            "created_at": datetime.datetime(2026, 10, 1).isoformat(),
+            "prompt": "prompt",
+            "llm_response": "response",
+            "decision": "False Positive",
+        }
+    )
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_corrupt_spool_lines_are_quarantined(tmp_path):
+    spool_path = str(tmp_path / "audit_spool.jsonl")
+    with open(spool_path, "w", encoding="utf-8") as f:
+        f.write(spool_line("spooled") + "\n")
+        f.write("not json\n")
+        # Partial last line, as left by a crash
+        f.write(spool_line("partial")[:40])
+
+    sink = RecordingAuditSink()
+    sink.init_app(FakeApp(spool_path), None)
+    sink.start()
+    try:
+        assert wait_for(lambda: sink.stats()["quarantined"] == 2)
+        sink.record("prompt", "response", "False Positive", "recorded")
+        assert wait_for(lambda: len(sink.written_rows) == 2)
+    finally:
+        sink.close()
+
+    assert sink._worker.is_alive() is False
+    assert [row["audit_log_id"] for row in sink.written_rows] == [
+        "spooled",
+        "recorded",
+    ]
+    with open(f"{spool_path}.quarantine", encoding="utf-8") as f:
+        assert len(f.readlines()) == 2
+    assert not os.path.exists(spool_path)
+
+
+def test_orphaned_replay_files_are_written(tmp_path):
+    spool_path = str(tmp_path / "audit_spool.jsonl")
+    # No process has this id, see /proc/sys/kernel/pid_max
+    orphan_path = f"{spool_path}.99999999.replay"
+    with open(orphan_path, "w", encoding="utf-8") as f:
+        f.write(spool_line("orphaned") + "\n")
+
+    sink = RecordingAuditSink()
+    sink.init_app(FakeApp(spool_path), None)
+    sink.start()
+    try:
+        assert wait_for(lambda: len(sink.written_rows) == 1)
+    finally:
+        sink.close()
+
+    assert sink.written_rows[0]["audit_log_id"] == "orphaned"
+    assert not os.path.exists(orphan_path)
+
+
+def test_record_is_written_when_the_worker_is_not_running(tmp_path):
+    sink = RecordingAuditSink()
+    sink.init_app(FakeApp(str(tmp_path / "audit_spool.jsonl")), None)
+    sink.start()
+    sink.close()
+
+    sink.record("prompt", "response", "False Positive", "recorded")
+
+    assert [row["audit_log_id"] for row in sink.written_rows] == ["recorded"]
+
+
+def test_worker_is_not_started_by_init_app(tmp_path):
+    sink = RecordingAuditSink()
+    sink.init_app(FakeApp(str(tmp_path / "audit_spool.jsonl")), None)
+
+    assert sink._worker is None
@@ -0,0 +1,56 @@
+# Standard Library imports
+import time
+
+# Core Flask imports
+
+# Third-party imports
+
+# App imports
+from propscreen.decisioncache import DecisionCache
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = DecisionCache(max_entries=2)
+    cache.put("a", "True Negative", "v1")
+    cache.put("b", "True Positive", "v1")
+
+    assert cache.get("a", "v1") == "True Negative"
+    cache.put("c", "False Positive", "v1")
+
+    assert cache.get("b", "v1") is None
+    assert cache.get("a", "v1") == "True Negative"
+    assert cache.get("c", "v1") == "False Positive"
+    assert cache.stats()["evictions"] == 1
+
+
+def test_new_reference_data_version_invalidates_the_cache():
+    cache = DecisionCache()
+    cache.put("a", "True Positive", ("hashes-1", "context-1"))
+
+    assert cache.get("a", ("hashes-1", "context-2")) is None
+    assert cache.get("a", ("hashes-1", "context-1")) is None
+    assert len(cache) == 0
+
+
+def test_expired_entries_and_counters():
+    cache = DecisionCache(ttl=0.01)
+    cache.put("a", "True Negative", "v1")
+    assert cache.get("a", "v1") == "True Negative"
+
+    time.sleep(0.02)
+
+    assert cache.get("a", "v1") is None
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["expirations"]) == (1, 1, 1)
+
+
+def test_memory_cap_and_disabled_cache():
+    cache = DecisionCache(max_bytes=1000)
+    for i in range(100):
+        cache.put(f"key {i}", "True Negative", "v1")
+    assert 0 < len(cache) < 100
+    assert cache.stats()["bytes"] <= 1000
+
+    disabled = DecisionCache(max_entries=0)
+    disabled.put("a", "True Negative", "v1")
+    assert disabled.get("a", "v1") is None
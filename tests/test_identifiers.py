@@ -0,0 +1,43 @@
+# Standard Library imports
+import uuid
+
+# Core Flask imports
+
+# Third-party imports
+from sqlalchemy import text
+
+# App imports
+from app import audit_sink
+from app.models import AuditLog
+from app.utils.identifiers import uuid7
+
+
+def test_uuid7_version_and_variant():
+    audit_log_id = uuid7()
+    assert audit_log_id.version == 7
+    assert audit_log_id.variant == uuid.RFC_4122
+
+
+def test_uuid7_sorts_by_creation():
+    ids = [uuid7() for _ in range(10000)]
+    assert ids == sorted(ids)
+    assert len(set(ids)) == len(ids)
+    assert [str(i) for i in ids] == sorted(str(i) for i in ids)
+
+
+def test_uuid4_text_ids_are_still_found(db):
+    # The ids written before the migration to the uuid column
+    audit_log_id = str(uuid.uuid4())
+    audit_sink.insert_rows(
+        db.session,
+        [audit_sink._make_row("prompt", "response", "True Negative", audit_log_id)],
+    )
+
+    record = (
+        db.session.query(AuditLog).filter(AuditLog.audit_log_id == audit_log_id).one()
+    )
+    assert record.audit_log_id == audit_log_id
+    assert db.session.execute(
+        text("SELECT audit_log_id::text FROM audit_log WHERE audit_log_id = :id"),
+        {"id": audit_log_id.upper()},
+    ).scalar() == audit_log_id
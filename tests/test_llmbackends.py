@@ -0,0 +1,27 @@
+# Standard Library imports
+
+# Core Flask imports
+
+# Third-party imports
+import pytest
+
+# App imports
+from propscreen.llmbackends import StubBackend
+
+
+def test_stub_responses_are_deterministic(tmp_path):
+    corpus_path = tmp_path / "corpus.txt"
+    corpus_path.write_text("first response\n\n\n\nsecond response\n", encoding="utf-8")
+    backend = StubBackend(corpus_path=str(corpus_path))
+
+    assert backend.responses == ["first response", "second response"]
+    assert backend.generate("prompt") == backend.generate("prompt")
+    assert "".join(backend.stream("prompt")) == backend.generate("prompt")
+
+
+def test_stub_corpus_without_responses_is_rejected(tmp_path):
+    corpus_path = tmp_path / "corpus.txt"
+    corpus_path.write_text("\n\n  \n\n", encoding="utf-8")
+
+    with pytest.raises(ValueError):
+        StubBackend(corpus_path=str(corpus_path))
@@ -0,0 +1,39 @@
+# Standard Library imports
+import threading
+
+# Core Flask imports
+
+# Third-party imports
+import pytest
+
+# App imports
+from propscreen.microbatcher import MicroBatcher
+
+
+class WorkerStopped(BaseException):
+    pass
+
+
+def test_every_item_gets_its_own_result():
+    batcher = MicroBatcher(lambda items: [item * 2 for item in items], 4, 1)
+
+    assert batcher.submit_many([1, 2, 3, 4, 5]) == [2, 4, 6, 8, 10]
+    assert batcher.stats()["items"] == 5
+
+
+def test_callers_are_released_when_the_worker_stops():
+    def stop_worker(items):
+        raise WorkerStopped()
+
+    # The worker thread dies with the BaseException, hide its traceback
+    excepthook = threading.excepthook
+    threading.excepthook = lambda args: None
+    try:
+        batcher = MicroBatcher(stop_worker, 4, 1)
+        with pytest.raises(RuntimeError):
+            batcher.submit("item")
+    finally:
+        threading.excepthook = excepthook
+
+    batcher.batch_fn = lambda items: items
+    assert batcher.submit("item") == "item"
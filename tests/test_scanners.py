@@ -0,0 +1,65 @@
+# Standard Library imports
+
+# Core Flask imports
+
+# Third-party imports
+import pytest
+
+# App imports
+import propscreen.scanners as scanners
+
+
+class FakeSensitiveScanner:
+    def __init__(self):
+        self.scanned = []
+
+    def scan(self, prompt, model_output):
+        self.scanned.append(model_output)
+        if "john.smith@example.com" in model_output:
+            return model_output, False, 0.9
+        return model_output, True, 0.0
+
+
+@pytest.fixture
+def fake_scanner(monkeypatch):
+    fake_scanner = FakeSensitiveScanner()
+    monkeypatch.setattr(scanners, "get_sensitive_scanner", lambda: fake_scanner)
+    monkeypatch.setattr(scanners, "_scan_batcher", None)
+    scanners.configure_segment_cache(100, 60, 1024 * 1024)
+    yield fake_scanner
+    scanners.configure_segment_cache(0, 0, 0)
+
+
+def test_split_segments_keeps_the_text():
+    text = "Hi there. How are you?\nFine!  Mail john.smith@example.com"
+
+    segments = scanners.split_segments(text)
+
+    assert [segment for segment, _ in segments] == [
+        "Hi there.",
+        "How are you?",
+        "Fine!",
+        "Mail john.smith@example.com",
+    ]
+    assert "".join(segment + separator for segment, separator in segments) == text
+
+
+def test_only_uncached_segments_are_scanned(fake_scanner):
+    disclaimer = "This answer was generated from internal documents."
+
+    first = scanners.scan_sensitive("prompt", f"{disclaimer} Lambda is serverless.")
+    second = scanners.scan_sensitive(
+        "prompt", f"{disclaimer} Contact john.smith@example.com today."
+    )
+
+    assert first == (f"{disclaimer} Lambda is serverless.", True, 0.0)
+    assert second == (
+        f"{disclaimer} Contact john.smith@example.com today.",
+        False,
+        0.9,
+    )
+    assert fake_scanner.scanned == [
+        disclaimer,
+        "Lambda is serverless.",
+        "Contact john.smith@example.com today.",
+    ]
@@ -0,0 +1,38 @@
+# Standard Library imports
+
+# Core Flask imports
+
+# Third-party imports
+import click
+
+# App imports
+from app import serves_requests
+
+
+def cli_context(name, **params):
+    context = click.Context(click.Command(name), info_name=name)
+    context.params = params
+    return context
+
+
+def test_wsgi_server_serves_requests():
+    assert serves_requests() is True
+
+
+def test_cli_commands_do_not_serve_requests():
+    for name in ["audit-log", "hash-index", "shell", "routes"]:
+        with cli_context(name):
+            assert serves_requests() is False
+
+
+def test_flask_run_serves_requests(monkeypatch):
+    monkeypatch.delenv("WERKZEUG_RUN_MAIN", raising=False)
+    with cli_context("run", reload=False):
+        assert serves_requests() is True
+
+    # The reloader's own process only restarts the server process
+    with cli_context("run", reload=True):
+        assert serves_requests() is False
+    monkeypatch.setenv("WERKZEUG_RUN_MAIN", "true")
+    with cli_context("run", reload=True):
+        assert serves_requests() is True
@@ -0,0 +1,153 @@
+# Standard Library imports
+import hashlib
+
+# Core Flask imports
+
+# Third-party imports
+import pytest
+
+# App imports
+from propscreen import hashindexbuilder, hashstore, sihasher
+from propscreen.bloomfilter import BloomFilter
+from propscreen.sihasher import HashIndex, HashStore
+
+
+def digest(value):
+    return hashlib.sha256(value.encode("utf-8")).digest()
+
+
+@pytest.mark.parametrize("fp_rate, max_set_entries", [(0, 0), (0.01, 0), (0.01, 1000)])
+def test_hash_store_matches_a_set(fp_rate, max_set_entries):
+    stored = {digest(f"secret {i}") for i in range(1000)}
+    hash_store = HashStore.from_digests(stored, fp_rate, max_set_entries)
+
+    candidates = list(stored) + [digest(f"word {i}") for i in range(1000)]
+
+    assert hash_store.contains_many(candidates) == [
+        candidate in stored for candidate in candidates
+    ]
+    assert [candidate in hash_store for candidate in candidates] == [
+        candidate in stored for candidate in candidates
+    ]
+    assert len(hash_store) == len(stored)
+
+
+def test_bloom_filter_has_no_false_negatives_and_bounded_false_positives():
+    stored = [digest(f"secret {i}") for i in range(5000)]
+    bloom_filter = BloomFilter.from_digests(stored, 0.01)
+
+    assert all(stored_digest in bloom_filter for stored_digest in stored)
+
+    false_positives = sum(
+        digest(f"word {i}") in bloom_filter for i in range(20000)
+    )
+    assert false_positives < 20000 * 0.02
+
+
+def test_bloom_filter_batch_probe_matches_single_probes(tmp_path):
+    stored = [digest(f"secret {i}") for i in range(5000)]
+    bloom_filter = BloomFilter.from_digests(stored, 0.01)
+    candidates = stored + [digest(f"word {i}") for i in range(20000)]
+
+    expected = [candidate in bloom_filter for candidate in candidates]
+    assert bloom_filter.contains_many(candidates).tolist() == expected
+
+    bloom_filter.save(str(tmp_path / "hashes.bloom"))
+    loaded = BloomFilter.load(str(tmp_path / "hashes.bloom"))
+    assert loaded.contains_many(candidates).tolist() == expected
+
+
+def test_empty_hash_store():
+    hash_store = HashStore.from_digests(set(), 0.01)
+
+    assert hash_store.contains_many([digest("word")]) == [False]
+    assert len(hash_store) == 0
+
+
+def test_mapped_hash_index_matches_a_set(tmp_path):
+    stored = {digest(f"secret {i}") for i in range(1000)}
+    index_path = str(tmp_path / "hashes.idx")
+    assert hashstore.write_hash_index(index_path, stored) == len(stored)
+
+    hash_index = HashIndex("bucket", "object", index_path=index_path)
+    candidates = list(stored) + [digest(f"word {i}") for i in range(1000)]
+
+    assert hash_index.contains_digests(candidates) == [
+        candidate in stored for candidate in candidates
+    ]
+    assert len(hash_index) == len(stored)
+
+    # a replaced file is mapped again
+    version = hash_index.version
+    hashstore.write_hash_index(index_path, [digest("word 1")])
+    assert hash_index.version != version
+    assert hash_index.contains_digests([digest("word 1"), digest("secret 1")]) == [
+        True,
+        False,
+    ]
+
+
+def test_mapped_hash_index_rejects_other_files(tmp_path):
+    index_path = tmp_path / "hashes.csv"
+    index_path.write_bytes(b"0" * 64 + b"," + b"1" * 64)
+
+    with pytest.raises(ValueError):
+        hashstore.MappedDigests(str(index_path))
+
+
+def test_built_hash_index_matches_response_tokens(tmp_path, monkeypatch):
+    plaintext_path = tmp_path / "si.txt"
+    plaintext_path.write_text('Zeus\n"Acme," Corp.\n...\n', encoding="utf-8")
+    hashes_path = tmp_path / "hashes.csv"
+    hashes_path.write_text(
+        hashlib.sha256(b"Michael Smith").hexdigest() + ",not a hash\n",
+        encoding="utf-8",
+    )
+    index_path = str(tmp_path / "hashes.idx")
+
+    manifest = hashindexbuilder.build_hash_index(
+        index_path,
+        plaintext_paths=[str(plaintext_path)],
+        hash_csv_paths=[str(hashes_path)],
+        fp_rate=0.01,
+        run_size=1,
+    )
+
+    assert manifest["hashes"] == 3
+    assert manifest["inputs"][0]["counts"]["skipped"] == 1
+    assert manifest["inputs"][1]["counts"]["invalid"] == 1
+    assert manifest["bloom_filter"] is not None
+
+    hash_index = HashIndex("bucket", "object", index_path=index_path)
+    assert hash_index.stats()["bloom_filter_bytes"] > 0
+    monkeypatch.setitem(sihasher._hash_indexes, ("bucket", "object"), hash_index)
+
+    tokens = 'Zeus said "Acme," Corp. Michael Smith'.split(" ")
+    hits = sihasher.check_hashes(tokens, "bucket", "object")
+
+    assert [i for i, hit in enumerate(hits) if hit] == [0, 8, 10]
+
+
+def test_long_phrases_are_matched_through_the_rolling_hash(tmp_path, monkeypatch):
+    plaintext_path = tmp_path / "si.txt"
+    plaintext_path.write_text(
+        "the acme merger closes in march\nproject zeus\n", encoding="utf-8"
+    )
+    index_path = str(tmp_path / "hashes.idx")
+    manifest = hashindexbuilder.build_hash_index(
+        index_path, plaintext_paths=[str(plaintext_path)], max_phrase_tokens=8
+    )
+    assert manifest["phrases"]["lengths"] == [6]
+
+    hash_index = HashIndex("bucket", "object", index_path=index_path)
+    monkeypatch.setitem(sihasher._hash_indexes, ("bucket", "object"), hash_index)
+
+    tokens = 'We heard "the acme merger closes in March." today'.split(" ")
+    assert sihasher.find_hash_hits(tokens, "bucket", "object") == []
+
+    tokens = 'We heard "the acme merger closes in march." today'.split(" ")
+    assert sihasher.find_hash_hits(tokens, "bucket", "object") == [(2, 6)]
+    assert sihasher.find_hash_hits(
+        tokens, "bucket", "object", max_phrase_tokens=2
+    ) == []
+    assert sihasher.max_phrase_length("bucket", "object") == 6
@@ -0,0 +1,108 @@
+# Standard Library imports
+from concurrent.futures import ThreadPoolExecutor
+import itertools
+
+# Core Flask imports
+
+# Third-party imports
+import pytest
+
+# App imports
+from propscreen import sipipeline
+
+
+def original_decision(llm_guard_hit, context_string_found, hit_count):
+    """The decision sensitive_info_check made before the pipeline existed."""
+    # Was `llm_guard_hit == True`, the same for the bools the scanner returns
+    if (llm_guard_hit is True) and (True not in context_string_found):
+        return "True Negative"
+    if True in hit_count:
+        return "True Positive"
+    return "False Positive"
+
+
+def make_pipeline(llm_guard_hit, context_string_found, hit_count, calls):
+    def stage(name, result):
+        def func(prompt, model_output):
+            calls.append(name)
+            return result
+
+        return func
+
+    stages = [
+        sipipeline.PipelineStage(
+            sipipeline.LLM_GUARD_STAGE,
+            stage("llm_guard", ("output", llm_guard_hit, 0.0)),
+            100,
+        ),
+        sipipeline.PipelineStage(
+            sipipeline.CONTEXT_STAGE, stage("context", context_string_found), 2
+        ),
+        sipipeline.PipelineStage(
+            sipipeline.HASH_STAGE, stage("hash", hit_count), 1
+        ),
+    ]
+    return sipipeline.SIPipeline(stages, ThreadPoolExecutor(max_workers=2))
+
+
+@pytest.mark.parametrize(
+    "llm_guard_hit,context_string_found,hit_count",
+    list(
+        itertools.product(
+            [True, False],
+            [[False, False], [True, False]],
+            [[False, False, False], [False, True, False]],
+        )
+    ),
+)
+def test_pipeline_preserves_decisions(llm_guard_hit, context_string_found, hit_count):
+    calls = []
+    pipeline = make_pipeline(llm_guard_hit, context_string_found, hit_count, calls)
+
+    decision, results = pipeline.run("prompt", "output")
+
+    assert decision == original_decision(
+        llm_guard_hit, context_string_found, hit_count
+    )
+    assert decision in (
+        sipipeline.TRUE_NEGATIVE,
+        sipipeline.TRUE_POSITIVE,
+        sipipeline.FALSE_POSITIVE,
+    )
+
+
+def test_pipeline_runs_cheapest_stages_first():
+    calls = []
+    pipeline = make_pipeline(True, [False], [False], calls)
+
+    pipeline.run("prompt", "output")
+
+    assert calls == ["hash", "context", "llm_guard"]
+
+
+def test_pipeline_skips_llm_guard_when_context_string_found():
+    calls = []
+    pipeline = make_pipeline(True, [True], [True], calls)
+
+    decision, results = pipeline.run("prompt", "output")
+
+    # a context string hit decides the outcome whatever LLM Guard finds
+    assert decision == sipipeline.TRUE_POSITIVE
+    assert "llm_guard" not in calls
+    assert sipipeline.LLM_GUARD_STAGE not in results
+
+
+def test_hash_hit_alone_is_not_certain():
+    # without context strings a clean LLM Guard scan is a True Negative even
+    # if a hash matched, so the hash result alone must not decide
+    assert sipipeline.decide({sipipeline.HASH_STAGE: [True]}) is None
+    assert (
+        sipipeline.decide(
+            {
+                sipipeline.HASH_STAGE: [True],
+                sipipeline.CONTEXT_STAGE: [False],
+                sipipeline.LLM_GUARD_STAGE: ("output", True, 0.0),
+            }
+        )
+        == sipipeline.TRUE_NEGATIVE
+    )